@@ -0,0 +1,121 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Local stand-in for the client.amplifi.com deviceToken API.
+
+Implements mlRequestClientAccess, mlIceConfig and mlClientConnect over plain
+HTTP/1.1 with keep-alive, and counts connections and requests so benchmarks
+can see how many connection setups a client actually paid for.
+`handshake_delay` is charged once per new connection to stand in for the
+TCP + TLS round trips of the real service.
+"""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PATH = "/api/deviceToken/"
+
+class AmplifiStub:
+    def __init__(self, handshake_delay=0.0, request_delay=0.0, answer_factory=None,
+                 ice_servers=None, ice_ttl=None):
+        self.handshake_delay = handshake_delay
+        self.request_delay = request_delay
+        self.answer_factory = answer_factory or (lambda offer: "v=0\r\n")
+        self.ice_servers = ice_servers if ice_servers is not None else []
+        self.ice_ttl = ice_ttl
+        self.connections = 0
+        self.requests = {}
+        self.fail_next = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def url(self, endpoint):
+        return self.base_url + endpoint
+
+    def reset_counters(self):
+        with self._lock:
+            self.connections = 0
+            self.requests = {}
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                if stub.handshake_delay:
+                    time.sleep(stub.handshake_delay)
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                endpoint = self.path[len(API_PATH):] if self.path.startswith(API_PATH) else self.path
+                with stub._lock:
+                    stub.requests[endpoint] = stub.requests.get(endpoint, 0) + 1
+                    failure = stub.fail_next.pop(endpoint, None)
+                if stub.request_delay:
+                    time.sleep(stub.request_delay)
+
+                payload = json.loads(body) if body else {}
+                if failure:
+                    result = {"success": False, "error": failure}
+                else:
+                    result = stub.handle(endpoint, payload, self.headers)
+
+                data = json.dumps(result).encode("utf8")
+                self.send_response(200 if result is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on this request (e.g. a phase timed out)
+                    self.close_connection = True
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="amplifi-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle(self, endpoint, payload, headers):
+        if endpoint == "mlRequestClientAccess":
+            return {"success": True, "client_id": "stub-" + uuid.uuid4().hex}
+        if endpoint == "mlIceConfig":
+            result = {"success": True, "servers": self.ice_servers}
+            if self.ice_ttl is not None:
+                result["ttl"] = self.ice_ttl
+            return result
+        if endpoint == "mlClientConnect":
+            return {"success": True, "answer": self.answer_factory(payload.get("offer", ""))}
+        return {"success": False, "error": "unknown endpoint"}
+
+    def patch_teleport(self, teleport):
+        """Point the teleport module's API URLs at this stub."""
+        teleport.REQUEST_DEVICE_TOKEN_URL = self.url("mlRequestClientAccess")
+        teleport.ICE_CONFIG_URL = self.url("mlIceConfig")
+        teleport.SIGNALING_URL = self.url("mlClientConnect")
@@ -0,0 +1,107 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Run connects against a local aiortc router stand-in and show the candidate pair selection.
+
+Both peers run on this machine. Only pairs whose ICE check succeeded are
+RTT-probed; aioice drops the remaining checks once a pair is nominated, so
+here that is usually the nominated pair alone. `--delay-ipv6 MS` adds an
+artificial delay to STUN answers sent over IPv6 so the slower path is not
+picked; `--delay-ipv4 MS` does the same for IPv4 so an IPv6 pair gets picked.
+Every Endpoint line is checked to be one WireGuard accepts (IPv6 in brackets);
+the script exits with status 1 if one is not.
+
+Usage: python benchmarks/bench_candidates.py [--connects N] [--delay-ipv6 MS] [--delay-ipv4 MS] [--output FILE]
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aioice.ice import StunProtocol
+
+import teleport
+from amplifi_stub import AmplifiStub
+from benchutil import arg_value, save_results, summarize
+from router_stub import RouterStub
+
+def _delay_answers(router, delay, ipv6=True):
+    """Make the router stub answer STUN requests over IPv6 (or IPv4) `delay` seconds late."""
+    send_stun = StunProtocol.send_stun
+
+    def delayed_send_stun(self, message, addr):
+        loop = asyncio.get_running_loop()
+        if loop is router.loop and (":" in addr[0]) == ipv6:
+            loop.call_later(delay, send_stun, self, message, addr)
+        else:
+            send_stun(self, message, addr)
+
+    StunProtocol.send_stun = delayed_send_stun
+
+def valid_endpoint(line):
+    """Whether an `Endpoint = host:port` line is one WireGuard parses."""
+    value = line.split("=", 1)[1].strip()
+    host, _, port = value.rpartition(":")
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+        version = 6
+    else:
+        version = 4
+    try:
+        return ipaddress.ip_address(host).version == version and 0 < int(port) < 65536
+    except ValueError:
+        return False
+
+def main():
+    connects = arg_value("--connects", 5, int)
+    delay_ipv6 = arg_value("--delay-ipv6", 0.0, float) / 1000
+    delay_ipv4 = arg_value("--delay-ipv4", 0.0, float) / 1000
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger("AmpliFi Teleport for Desktop").setLevel(logging.INFO)
+
+    router = RouterStub().start()
+    stub = AmplifiStub(answer_factory=router.answer).start()
+    stub.patch_teleport(teleport)
+    teleport.ICE_STUN_SERVER = None
+
+    if delay_ipv6:
+        _delay_answers(router, delay_ipv6, ipv6=True)
+    if delay_ipv4:
+        _delay_answers(router, delay_ipv4, ipv6=False)
+
+    durations = []
+    endpoints = []
+    invalid = []
+    try:
+        for _ in range(connects):
+            start = time.perf_counter()
+            config = teleport.connect_device("bench-token")
+            durations.append(time.perf_counter() - start)
+            endpoint = [line for line in config.splitlines() if line.startswith("Endpoint")][0]
+            print(endpoint)
+            endpoints.append(endpoint.split("=", 1)[1].strip())
+            if not valid_endpoint(endpoint):
+                invalid.append(endpoint)
+    finally:
+        # Closes the pooled HTTP session and stops the network runtime
+        teleport.shutdown()
+        stub.stop()
+        router.stop()
+
+    print("connect p50 %.0fms" % (statistics.median(durations) * 1000))
+    settings = {"connects": connects, "delay_ipv6_ms": delay_ipv6 * 1000, "delay_ipv4_ms": delay_ipv4 * 1000,
+                "endpoints": endpoints, "invalid": invalid}
+    save_results("candidates", {"connect": summarize(durations)}, settings, arg_value("--output"))
+    if invalid:
+        print("INVALID endpoints: %s" % ", ".join(invalid))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
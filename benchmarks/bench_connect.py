@@ -0,0 +1,95 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Offline end-to-end connect benchmark.
+
+Stands up the three stand-ins (the AmpliFi deviceToken API, an aiortc peer
+answering like the router, and the fake tunnel backend), then drives
+get_device_token, connect_device, tunnel.generate_config and
+tunnel.activate_tunnel and reports p50/p95/p99 per phase. Results are saved
+as JSON so runs can be compared across commits.
+
+Usage:
+    python benchmarks/bench_connect.py [--iterations N] [--rtt MS] [--activate-ms MS]
+                                       [--output FILE] [--compare FILE]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import teleport
+import tunnel
+from amplifi_stub import AmplifiStub
+from benchutil import arg_value, compare_results, print_table, save_results, summarize
+from profiles import ProfileStore, set_profile_store
+from router_stub import RouterStub
+from tunnel_backends import FakeBackend, set_backend
+
+CONNECT_PHASES = ("offer", "keygen", "ice_config", "prepare", "signaling", "ice")
+
+def _timed(samples, phase, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples.setdefault(phase, []).append(time.perf_counter() - start)
+    return result
+
+def run(iterations, rtt, activate_delay):
+    samples = {}
+    work_dir = tempfile.mkdtemp(prefix="teleport-bench-")
+    tunnel.ACTIVE_CONFIG_PATH = os.path.join(work_dir, "teleport.active.conf")
+    profile = set_profile_store(ProfileStore(os.path.join(work_dir, "profiles"))).active()
+
+    router = RouterStub().start()
+    stub = AmplifiStub(handshake_delay=rtt * 2, request_delay=rtt, answer_factory=router.answer).start()
+    stub.patch_teleport(teleport)
+    teleport.ICE_STUN_SERVER = None
+    set_backend(FakeBackend(install_delay=activate_delay, uninstall_delay=activate_delay))
+
+    try:
+        for _ in range(iterations):
+            token = _timed(samples, "token", teleport.get_device_token, teleport.generate_client_hint(), "12345")
+
+            _timed(samples, "connect_device", teleport.connect_device, token)
+            for phase in CONNECT_PHASES:
+                if phase in teleport.lastConnectTimings:
+                    samples.setdefault(phase, []).append(teleport.lastConnectTimings[phase])
+
+            profile.set("device_token", token)
+            success, message = _timed(samples, "generate_config", tunnel.generate_config)
+            if not success:
+                raise Exception("generate_config failed: %s" % message)
+
+            success, message = _timed(samples, "activate", tunnel.activate_tunnel)
+            if not success:
+                raise Exception("activate_tunnel failed: %s" % message)
+    finally:
+        teleport.shutdown()
+        stub.stop()
+        router.stop()
+
+    return {phase: summarize(values) for phase, values in samples.items()}
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+
+    iterations = arg_value("--iterations", 20, int)
+    rtt = arg_value("--rtt", 0.0, float) / 1000
+    activate_delay = arg_value("--activate-ms", 0.0, float) / 1000
+
+    phases = run(iterations, rtt, activate_delay)
+    print_table(phases)
+
+    settings = {"iterations": iterations, "rtt_ms": rtt * 1000, "activate_ms": activate_delay * 1000}
+    save_results("connect", phases, settings, arg_value("--output"))
+
+    baseline = arg_value("--compare")
+    if baseline:
+        compare_results(baseline, phases)
+
+if __name__ == "__main__":
+    main()
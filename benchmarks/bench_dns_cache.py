@@ -0,0 +1,367 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Local DNS cache against a stand-in for the router's resolver.
+
+The stand-in answers over UDP and TCP on loopback after --delay ms (the
+tunnel round trip) and counts the queries it gets. First a set of checks,
+on a forwarder with a settable clock:
+  ttl        cached answers count their TTLs down
+  stale      expired answers are served with a short TTL while one query
+             refreshes them, also while the resolver is down, until max_stale
+  collapse   concurrent identical queries cost one upstream query
+  negative   NXDOMAIN is cached for the SOA minimum
+  case       names differing only in case share an entry, each client gets
+             its own spelling back
+  evict      entry and byte budgets hold
+  truncate   answers too large for UDP come back truncated, and in full over TCP
+Any failure is printed and the script exits with status 1.
+
+Then --queries queries for --names names with Zipf-like popularity are
+sent by --clients concurrent clients, once straight to the resolver and
+once through the cache. Reports hit rate, upstream queries and p50/p95/p99.
+
+Usage:
+    python benchmarks/bench_dns_cache.py [--queries N] [--names N] [--clients N]
+                                         [--delay MS] [--zipf S] [--seed S] [--output FILE]
+"""
+
+import asyncio
+import os
+import random
+import struct
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import arg_value, save_results, summarize
+from dnscache import FLAG_TC, HEADER, RCODE_MASK, RCODE_SERVFAIL, STALE_TTL, DnsForwarder, _read_question, _records
+from tracing import metrics
+
+LOCALHOST = "127.0.0.1"
+NEGATIVE_TTL = 60
+BIG_RECORDS = 40
+
+def encode_name(name):
+    return b"".join(bytes([len(label)]) + label.encode("ascii") for label in name.split(".")) + b"\0"
+
+def build_query(query_id, name, qtype=1, edns=None):
+    message = HEADER.pack(query_id, 0x0100, 1, 0, 0, 1 if edns else 0) + encode_name(name) + struct.pack("!HH", qtype, 1)
+    if edns:
+        message += b"\0" + struct.pack("!HHIH", 41, edns, 0, 0)
+    return message
+
+def answer_ttls(message):
+    """(rcode, TC set, [TTLs of the answers]) of a response."""
+    _, flags, _, ancount, _, _ = HEADER.unpack_from(message)
+    _, offset = _read_question(message)
+    answers, _ = _records(message, offset, ancount)
+    return (flags & RCODE_MASK, bool(flags & FLAG_TC),
+            [struct.unpack_from("!I", message, ttl_offset)[0] for _, ttl_offset, _, _ in answers])
+
+class ResolverStandIn:
+    """A DNS server for *.example: A records with the TTL from `ttls` (default 300), NXDOMAIN
+    for nx*, BIG_RECORDS addresses for big*. Answers after `delay`, not at all while `down`."""
+
+    def __init__(self, delay=0.0, ttls=None):
+        self.delay = delay
+        self.ttls = ttls or {}
+        self.down = False
+        self.queries = Counter()
+        self.tcp_queries = 0
+        self._udp = None
+        self._tcp = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        stand_in = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                asyncio.ensure_future(stand_in._answer_udp(self.transport, data, addr))
+
+        self._udp, _ = await loop.create_datagram_endpoint(Protocol, local_addr=(LOCALHOST, 0))
+        self._tcp = await asyncio.start_server(self._serve_tcp, LOCALHOST, self.address[1])
+        return self
+
+    @property
+    def address(self):
+        return self._udp.get_extra_info("sockname")[:2]
+
+    async def stop(self):
+        self._udp.close()
+        self._tcp.close()
+        await self._tcp.wait_closed()
+
+    def respond(self, query):
+        query_id, _, _, _, _, arcount = HEADER.unpack_from(query)
+        question, offset = _read_question(query)
+        name = question[:-4]
+        labels = []
+        position = 0
+        while name[position]:
+            labels.append(name[position + 1:position + 1 + name[position]].decode("ascii").lower())
+            position += 1 + name[position]
+        name = ".".join(labels)
+        self.queries[name] += 1
+
+        flags = 0x8000 | 0x0100 | 0x0080
+        pointer = b"\xc0\x0c"
+        if name.startswith("nx"):
+            soa = encode_name("ns.example") + encode_name("hostmaster.example") + struct.pack("!5I", 1, 3600, 600, 86400, NEGATIVE_TTL)
+            authority = pointer + struct.pack("!HHIH", 6, 1, 300, len(soa)) + soa
+            return HEADER.pack(query_id, flags | 3, 1, 0, 1, 0) + question + authority
+        count = BIG_RECORDS if name.startswith("big") else 1
+        ttl = self.ttls.get(name, 300)
+        answers = b"".join(pointer + struct.pack("!HHIH", 1, 1, ttl, 4) + struct.pack("!I", (hash(name) + i) & 0xFFFFFFFF)
+                           for i in range(count))
+        return HEADER.pack(query_id, flags, 1, count, 0, 0) + question + answers
+
+    async def _answer_udp(self, transport, data, addr):
+        if self.down:
+            return
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        response = self.respond(data)
+        if len(response) > 512 and not HEADER.unpack_from(data)[5]:
+            response = HEADER.pack(HEADER.unpack_from(response)[0], 0x8000 | 0x0100 | FLAG_TC, 1, 0, 0, 0) + _read_question(data)[0]
+        transport.sendto(response, addr)
+
+    async def _serve_tcp(self, reader, writer):
+        try:
+            length, = struct.unpack("!H", await reader.readexactly(2))
+            query = await reader.readexactly(length)
+            self.tcp_queries += 1
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            response = self.respond(query)
+            writer.write(struct.pack("!H", len(response)) + response)
+            await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+class Client:
+    """A stub resolver on one UDP socket; queries in flight are matched by ID."""
+
+    def __init__(self, server):
+        self.server = server
+        self._pending = {}
+        self._next_id = random.getrandbits(16)
+        self._transport = None
+
+    async def open(self):
+        client = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                future = client._pending.pop(struct.unpack_from("!H", data)[0], None)
+                if future is not None and not future.done():
+                    future.set_result(data)
+
+        self._transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            Protocol, remote_addr=self.server)
+        return self
+
+    def close(self):
+        self._transport.close()
+
+    async def query(self, name, timeout=5.0, **kwargs):
+        self._next_id = (self._next_id + 1) & 0xFFFF
+        query_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query_id] = future
+        self._transport.sendto(build_query(query_id, name, **kwargs))
+        try:
+            response = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(query_id, None)
+        if struct.unpack_from("!H", response)[0] != query_id:
+            raise Exception("Answer with the wrong ID")
+        return response
+
+async def query_tcp(server, name):
+    reader, writer = await asyncio.open_connection(*server)
+    try:
+        message = build_query(1, name)
+        writer.write(struct.pack("!H", len(message)) + message)
+        await writer.drain()
+        length, = struct.unpack("!H", await reader.readexactly(2))
+        return await reader.readexactly(length)
+    finally:
+        writer.close()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+async def run_checks():
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}{'' if condition else ': ' + detail}")
+        if not condition:
+            failures.append(name)
+
+    upstream = await ResolverStandIn(ttls={"ttl.example": 60}).start()
+    clock = FakeClock()
+    forwarder = await DnsForwarder(upstream.address, (LOCALHOST, 0), max_stale=600, timeout=0.2, clock=clock).start()
+    client = await Client(forwarder.address).open()
+    try:
+        await client.query("ttl.example")
+        clock.now += 10
+        _, _, ttls = answer_ttls(await client.query("ttl.example"))
+        check("ttl", ttls == [50] and upstream.queries["ttl.example"] == 1, f"TTLs {ttls}, {upstream.queries['ttl.example']} upstream queries")
+
+        clock.now += 60
+        _, _, stale = answer_ttls(await client.query("ttl.example"))
+        await asyncio.sleep(0.05)
+        _, _, fresh = answer_ttls(await client.query("ttl.example"))
+        check("stale: served while refreshing", stale == [STALE_TTL] and fresh == [60] and upstream.queries["ttl.example"] == 2,
+              f"stale TTLs {stale}, then {fresh}, {upstream.queries['ttl.example']} upstream queries")
+
+        upstream.down = True
+        clock.now += 100
+        _, _, down = answer_ttls(await client.query("ttl.example"))
+        clock.now += 600
+        rcode, _, _ = answer_ttls(await client.query("ttl.example"))
+        upstream.down = False
+        check("stale: resolver down", down == [STALE_TTL] and rcode == RCODE_SERVFAIL,
+              f"TTLs {down} while down, rcode {rcode} past max_stale")
+
+        upstream.delay = 0.1
+        responses = await asyncio.gather(*(client.query("slow.example") for _ in range(50)))
+        upstream.delay = 0.0
+        check("collapse", upstream.queries["slow.example"] == 1 and all(answer_ttls(r)[2] == [300] for r in responses),
+              f"{upstream.queries['slow.example']} upstream queries for 50 clients")
+
+        first = answer_ttls(await client.query("nx1.example"))
+        clock.now += 30
+        second = answer_ttls(await client.query("nx1.example"))
+        check("negative", first[0] == second[0] == 3 and upstream.queries["nx1.example"] == 1,
+              f"rcodes {first[0]}/{second[0]}, {upstream.queries['nx1.example']} upstream queries")
+        clock.now += NEGATIVE_TTL
+        await client.query("nx1.example")
+        await asyncio.sleep(0.05)
+        check("negative: expires with the SOA minimum", upstream.queries["nx1.example"] == 2,
+              f"{upstream.queries['nx1.example']} upstream queries")
+
+        await client.query("case.example")
+        response = await client.query("CaSe.Example")
+        check("case", upstream.queries["case.example"] == 1 and b"\x04CaSe\x07Example" in response,
+              f"{upstream.queries['case.example']} upstream queries")
+
+        rcode, truncated, ttls = answer_ttls(await client.query("big.example"))
+        full = answer_ttls(await query_tcp(forwarder.address, "big.example"))
+        edns = answer_ttls(await client.query("big.example", edns=4096))
+        check("truncate", truncated and not ttls and len(full[2]) == BIG_RECORDS and len(edns[2]) == BIG_RECORDS
+              and upstream.queries["big.example"] == 2 and upstream.tcp_queries == 1,
+              f"UDP TC={truncated} with {len(ttls)} answers, TCP {len(full[2])} answers, EDNS {len(edns[2])} answers, "
+              f"{upstream.tcp_queries} upstream TCP queries")
+    finally:
+        client.close()
+        await forwarder.stop()
+
+    for max_entries, max_bytes in ((100, 1 << 30), (1 << 30, 20000)):
+        upstream.queries.clear()
+        forwarder = await DnsForwarder(upstream.address, (LOCALHOST, 0), max_entries=max_entries, max_bytes=max_bytes).start()
+        client = await Client(forwarder.address).open()
+        try:
+            for i in range(500):
+                await client.query(f"evict{i}.example")
+            entries, used = len(forwarder._cache), forwarder._bytes
+            await client.query("evict499.example")
+            check(f"evict (max {max_entries if max_entries < 1 << 30 else max_bytes} {'entries' if max_entries < 1 << 30 else 'bytes'})",
+                  0 < entries <= max_entries and used <= max_bytes and upstream.queries["evict499.example"] == 1,
+                  f"{entries} entries, {used} bytes")
+        finally:
+            client.close()
+            await forwarder.stop()
+    await upstream.stop()
+    return failures
+
+async def workload(server, names, clients, rng):
+    samples = []
+    queue = list(names)
+    rng.shuffle(queue)
+
+    async def worker():
+        client = await Client(server).open()
+        try:
+            while queue:
+                name = queue.pop()
+                start = time.perf_counter()
+                await client.query(name)
+                samples.append(time.perf_counter() - start)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return samples, time.perf_counter() - start
+
+async def run_workload(queries, names, clients, delay, zipf, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** zipf for rank in range(names)]
+    workload_names = rng.choices([f"host{rank}.example" for rank in range(names)], weights=weights, k=queries)
+
+    upstream = await ResolverStandIn(delay=delay).start()
+    results = {}
+    print(f"\n{'':<8}{'queries':>9}{'upstream':>10}{'hit rate':>10}{'collapsed':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/s':>9}")
+    for mode in ("direct", "cache"):
+        upstream.queries.clear()
+        metrics.reset()
+        forwarder = None
+        server = upstream.address
+        if mode == "cache":
+            forwarder = await DnsForwarder(upstream.address, (LOCALHOST, 0)).start()
+            server = forwarder.address
+        try:
+            samples, seconds = await workload(server, workload_names, clients, random.Random(seed))
+        finally:
+            if forwarder is not None:
+                await forwarder.stop()
+        sent = sum(upstream.queries.values())
+        stats = summarize(samples)
+        stats.update({
+            "upstream_queries": sent,
+            "hit_rate": round(1 - sent / queries, 4),
+            "hits": metrics.counter("dns_queries", result="hit") + metrics.counter("dns_queries", result="stale"),
+            "collapsed": metrics.counter("dns_collapsed"),
+            "queries_per_second": round(queries / seconds),
+        })
+        results[mode] = stats
+        print(f"{mode:<8}{queries:>9}{sent:>10}{stats['hit_rate']:>10.1%}{stats['collapsed']:>11}"
+              f"{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}{stats['queries_per_second']:>9}")
+    await upstream.stop()
+    return results
+
+def main():
+    queries = arg_value("--queries", 20000, int)
+    names = arg_value("--names", 2000, int)
+    clients = arg_value("--clients", 32, int)
+    delay = arg_value("--delay", 20.0, float) / 1000
+    zipf = arg_value("--zipf", 1.0, float)
+    seed = arg_value("--seed", 1, int)
+
+    print("checks:")
+    failures = asyncio.run(run_checks())
+    results = asyncio.run(run_workload(queries, names, clients, delay, zipf, seed))
+    results["checks"] = {"failures": failures}
+
+    settings = {"queries": queries, "names": names, "clients": clients, "delay_ms": delay * 1000, "zipf": zipf}
+    save_results("dns_cache", results, settings, arg_value("--output"))
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Measure connection setups saved by the pooled signaling client.
+
+Runs the token -> ICE config -> connect request sequence against the local
+AmpliFi stand-in, once with a fresh connection per request (the old
+`requests.post` behaviour) and once through `signaling.SignalingClient`.
+
+Usage: python benchmarks/bench_http_pool.py [--rounds N] [--handshake-ms MS] [--output FILE]
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amplifi_stub import AmplifiStub
+from benchutil import arg_value, save_results
+from signaling import SignalingClient
+
+ENDPOINTS = ["mlRequestClientAccess", "mlIceConfig", "mlClientConnect"]
+
+def _post_fresh_connection(url, payload):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    try:
+        connection.request("POST", parts.path, body=json.dumps(payload),
+                           headers={"Content-Type": "application/json"})
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+def run_unpooled(stub, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for endpoint in ENDPOINTS:
+            _post_fresh_connection(stub.url(endpoint), {"offer": "v=0"})
+    return time.perf_counter() - start
+
+async def run_pooled(stub, rounds):
+    client = SignalingClient()
+    start = time.perf_counter()
+    try:
+        for _ in range(rounds):
+            for endpoint in ENDPOINTS:
+                await client.post_json(stub.url(endpoint), {"offer": "v=0"})
+        return time.perf_counter() - start
+    finally:
+        await client.close()
+
+def main():
+    rounds = arg_value("--rounds", 20, int)
+    handshake_delay = arg_value("--handshake-ms", 30.0, float) / 1000
+
+    results = {}
+    stub = AmplifiStub(handshake_delay=handshake_delay).start()
+    try:
+        for name, label, run in (("fresh", "fresh connections", lambda: run_unpooled(stub, rounds)),
+                                 ("pooled", "pooled client", lambda: asyncio.run(run_pooled(stub, rounds)))):
+            stub.reset_counters()
+            elapsed = run()
+            requests = sum(stub.requests.values())
+            print(f"{label:<19}{elapsed * 1000 / rounds:8.1f} ms/connect   "
+                  f"{stub.connections} connections for {requests} requests")
+            results[name] = {"ms_per_connect": round(elapsed * 1000 / rounds, 3),
+                             "connections": stub.connections, "requests": requests}
+    finally:
+        stub.stop()
+
+    settings = {"rounds": rounds, "handshake_delay_ms": handshake_delay * 1000}
+    save_results("http_pool", results, settings, arg_value("--output"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Idle memory of the app after a connect and after a disconnect, single-process vs worker processes.
+
+Each sample is a fresh tray stand-in process that imports what the tray
+holds in that mode, connects once against the offline stand-ins (AmpliFi
+API stub, aiortc router stub, fake tunnel backend), idles, disconnects and
+idles again, with the settings the app ships:
+
+  single   everything in one process, as with WORKER_PROCESSES = False
+  workers  negotiations run in the negotiator worker, which main.py keeps
+           warm while the tunnel is up (keep_warm on tunnel status) and
+           which exits WORKER_IDLE_TIMEOUT seconds after a disconnect
+
+Reported per state is the resident set size of the tray process, of the
+negotiator worker (while it runs) and their total. pystray, Pillow,
+customtkinter and ui are included where they can be imported. The window
+process is not counted: it only runs while the window is open and for
+WORKER_IDLE_TIMEOUT seconds after it was closed.
+
+Usage: python benchmarks/bench_idle_memory.py [--iterations N] [--idle S] [--idle-timeout S] [--output FILE]
+"""
+
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import arg_value, percentile, rss_bytes, save_results
+from config import KEY_POOL_SIZE, WORKER_IDLE_TIMEOUT
+
+# What the tray process imports in each mode; optional ones are skipped when missing
+TRAY_MODULES = {
+    "single": ("tunnel", "supervisor", "notifications", "logsetup", "runtime", "wgkeys", "teleport",
+               "PIL.Image", "pystray", "customtkinter", "ui"),
+    "workers": ("tunnel", "supervisor", "notifications", "logsetup", "workers", "PIL.Image", "pystray"),
+}
+
+def _use_stub(stub_url, work_dir):
+    """Point teleport and the tunnel paths at the stand-ins (also runs in the negotiator worker)."""
+    import teleport
+    teleport.REQUEST_DEVICE_TOKEN_URL = stub_url + "mlRequestClientAccess"
+    teleport.ICE_CONFIG_URL = stub_url + "mlIceConfig"
+    teleport.SIGNALING_URL = stub_url + "mlClientConnect"
+    teleport.ICE_STUN_SERVER = None
+    _set_paths(work_dir)
+
+def _set_paths(work_dir):
+    import tunnel
+    from profiles import ProfileStore, set_profile_store
+    tunnel.ACTIVE_CONFIG_PATH = os.path.join(work_dir, "teleport.active.conf")
+    tunnel.DISCONNECT_COUNT_PATH = os.path.join(work_dir, "teleport.disconnects")
+    set_profile_store(ProfileStore(os.path.join(work_dir, "profiles")))
+
+def _init_negotiator(stub_url, work_dir):
+    """workers._init_negotiator against the stand-ins."""
+    from wgkeys import start_key_pool
+    _use_stub(stub_url, work_dir)
+    start_key_pool(KEY_POOL_SIZE)
+
+def _rss_mb(pool=None):
+    """RSS of this process, or of the pool's worker (0 when it isn't running)."""
+    if pool is None:
+        return rss_bytes() / (1024 * 1024)
+    return pool.run(rss_bytes) / (1024 * 1024) if pool.alive else 0.0
+
+def child(mode, stub_url, idle, idle_timeout):
+    """Runs as the tray stand-in; prints tray and worker RSS per state and what it skipped."""
+    skipped = []
+    for name in TRAY_MODULES[mode]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            skipped.append(name)
+
+    import tunnel
+    from tunnel_backends import FakeBackend, set_backend
+    from tunnel_status import get_status_service
+    set_backend(FakeBackend())
+    work_dir = tempfile.mkdtemp(prefix="teleport-bench-")
+
+    pool = None
+    if mode == "single":
+        import wgkeys
+        wgkeys.start_key_pool(KEY_POOL_SIZE)
+        _use_stub(stub_url, work_dir)
+    else:
+        from workers import WorkerPool
+        _set_paths(work_dir)
+        pool = WorkerPool("negotiator", idle_timeout=idle_timeout, initializer=_init_negotiator,
+                          initargs=(stub_url, work_dir))
+        tunnel.use_negotiator(pool)
+        # As main.start_worker_mode does
+        get_status_service().subscribe(pool.keep_warm)
+
+    success, message = tunnel.generate_config(pin="12345")
+    if not success:
+        raise Exception("generate_config failed: %s" % message)
+    success, message = tunnel.activate_tunnel()
+    if not success:
+        raise Exception("activate_tunnel failed: %s" % message)
+    time.sleep(idle)
+    connected = (_rss_mb(), _rss_mb(pool) if pool else 0.0)
+
+    success, message = tunnel.deactivate_tunnel()
+    if not success:
+        raise Exception("deactivate_tunnel failed: %s" % message)
+    if pool is not None:
+        deadline = time.monotonic() + idle_timeout + 30
+        while pool.alive and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert "aiortc" not in sys.modules, "the tray process loaded aiortc"
+    time.sleep(idle)
+    disconnected = (_rss_mb(), _rss_mb(pool) if pool else 0.0)
+    print("RSS", *("%.2f" % value for value in connected + disconnected), ",".join(skipped), flush=True)
+
+def run(mode, stub_url, idle, idle_timeout):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, "--stub", stub_url,
+                             "--idle", str(idle), "--idle-timeout", str(idle_timeout)],
+                            capture_output=True, text=True, timeout=idle_timeout + 180)
+    for line in result.stdout.splitlines():
+        if line.startswith("RSS"):
+            fields = line.split(" ")
+            values = [float(value) for value in fields[1:5]]
+            skipped = [name for name in (fields[5] if len(fields) > 5 else "").split(",") if name]
+            return {"connected": values[0:2], "disconnected": values[2:4]}, skipped
+    raise Exception("%s run failed:\n%s" % (mode, result.stderr))
+
+def _stats(samples):
+    return {"samples": len(samples), "p50": round(percentile(samples, 50), 1),
+            "min": round(min(samples), 1), "max": round(max(samples), 1)}
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    iterations = arg_value("--iterations", 3, int)
+    idle = arg_value("--idle", 2.0, float)
+    idle_timeout = arg_value("--idle-timeout", WORKER_IDLE_TIMEOUT, float)
+
+    mode = arg_value("--child")
+    if mode:
+        child(mode, arg_value("--stub"), idle, idle_timeout)
+        return
+
+    from amplifi_stub import AmplifiStub
+    from router_stub import RouterStub
+
+    router = RouterStub().start()
+    stub = AmplifiStub(answer_factory=router.answer).start()
+    results = {}
+    skipped = {}
+    try:
+        for mode in TRAY_MODULES:
+            samples = {}
+            for _ in range(iterations):
+                states, skipped[mode] = run(mode, stub.base_url, idle, idle_timeout)
+                for state, (tray, worker) in states.items():
+                    for part, value in (("tray", tray), ("worker", worker), ("total", tray + worker)):
+                        samples.setdefault(f"{mode}_{state}_{part}", []).append(value)
+            results.update((name, _stats(values)) for name, values in samples.items())
+    finally:
+        stub.stop()
+        router.stop()
+
+    print(f"{'mode':<10}{'state':<15}{'tray MB':>10}{'worker MB':>11}{'total MB':>10}")
+    for mode in TRAY_MODULES:
+        for state in ("connected", "disconnected"):
+            tray, worker, total = (results[f"{mode}_{state}_{part}"]["p50"] for part in ("tray", "worker", "total"))
+            print(f"{mode:<10}{state:<15}{tray:>10.1f}{worker:>11.1f}{total:>10.1f}")
+    print()
+    for state in ("connected", "disconnected"):
+        single = results[f"single_{state}_total"]["p50"]
+        saved = single - results[f"workers_{state}_total"]["p50"]
+        verb = "save" if saved >= 0 else "cost"
+        print(f"{state}: worker processes {verb} {abs(saved):.1f} MB ({abs(saved) / single * 100:.0f}%) of total RSS")
+    for mode, names in skipped.items():
+        if names:
+            print(f"not importable here ({mode}): {', '.join(names)}")
+
+    settings = {"iterations": iterations, "idle": idle, "idle_timeout": idle_timeout, "skipped": skipped,
+                "unit": "MB"}
+    save_results("idle_memory", results, settings, arg_value("--output"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Compare in-process WireGuard keygen (and the key pool) with `wg genkey | wg pubkey`.
+
+Usage: python benchmarks/bench_keygen.py [--iterations N] [--output FILE]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import arg_value, save_results, summarize
+from wgkeys import KeyPool, generate_keypair
+
+def _subprocess_keypair():
+    private_key = subprocess.check_output(["wg", "genkey"], encoding="utf8").strip()
+    public_key = subprocess.run(["wg", "pubkey"], input=private_key, capture_output=True,
+                                encoding="utf8", check=True).stdout.strip()
+    return private_key, public_key
+
+def _measure(name, func, iterations, idle=0.0):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+        if idle:
+            time.sleep(idle)
+    samples.sort()
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6
+    print(f"{name:<22} p50 {p50:10.1f} us   p99 {p99:10.1f} us")
+    return summarize(samples)
+
+def main():
+    iterations = arg_value("--iterations", 200, int)
+
+    phases = {"in_process": _measure("in-process", generate_keypair, iterations)}
+
+    # Connects are spaced out, so give the pool time to refill between gets
+    pool = KeyPool(size=2).start()
+    time.sleep(0.05)
+    phases["key_pool"] = _measure("key pool", pool.get, iterations, idle=0.005)
+    pool.stop()
+
+    if shutil.which("wg"):
+        subprocess_iterations = max(1, iterations // 10)
+        phases["wg_subprocess"] = _measure("wg subprocess", _subprocess_keypair, subprocess_iterations)
+    else:
+        print("wg subprocess          skipped (`wg` not on PATH)")
+
+    save_results("keygen", phases, {"iterations": iterations}, arg_value("--output"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Path MTU / keepalive probing against a loopback path stand-in.
+
+The stand-in is a UDP relay between the client and the "router" that acts
+like the uplink in between: a NAT mapping that expires after a while
+without outbound traffic, a path MTU, a packet-rate limit with a
+small buffer, and random loss. Packets over the MTU are dropped while
+probing (the probe sets DF) and cost two link slots as fragments during a
+transfer, arriving only if both fragments do.
+
+For every simulated path MTU it reports:
+  probe     what pathprobe.probe_path finds over an ICE pair through the
+            stand-in, and the time it adds to a connect
+  transfer  goodput, delivery and one-way delay p50/p95 of a bulk transfer
+            sized for WireGuard's default MTU vs the probed one
+and once, whether the router can still reach the client after an idle
+period longer than the NAT timeout, with and without the probed keepalive
+(time scaled down by --time-scale).
+
+Usage:
+    python benchmarks/bench_path.py [--mtus 1500,1492,1428,1400] [--iterations N] [--megabytes MB]
+                                    [--pps N] [--loss P] [--time-scale S] [--output FILE]
+"""
+
+import asyncio
+import logging
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aioice
+from aioice import Candidate
+
+import pathprobe
+from benchutil import arg_value, percentile, save_results
+
+# What WireGuard uses when the config has no MTU line
+DEFAULT_TUNNEL_MTU = 1420
+# UDP payload of a tunnel packet: inner packet + WireGuard data header and tag
+WIREGUARD_DATA_OVERHEAD = 32
+IP_UDP_OVERHEAD = 28
+# Simulated seconds, before --time-scale: NAT mapping lifetime and the idle period tested
+NAT_TIMEOUT = 30.0
+IDLE = 60.0
+
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, received):
+        self.received = received
+
+    def datagram_received(self, data, addr):
+        self.received(self, data, addr)
+
+async def _udp(received, local_addr=("127.0.0.1", 0)):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(lambda: _Endpoint(received), local_addr=local_addr)
+    return transport, protocol
+
+class PathStandIn:
+    """One client behind a NAT, a path MTU and a rate-limited link, on loopback."""
+
+    def __init__(self, target, path_mtu=1500, oversize="drop", nat_timeout=None, pps=None, loss=0.0,
+                 buffer=0.05, seed=1):
+        self.target = target
+        self.path_mtu = path_mtu
+        self.oversize = oversize
+        self.nat_timeout = nat_timeout
+        self.pps = pps
+        self.loss = loss
+        self.buffer = buffer
+        self.rng = random.Random(seed)
+        self.client = None
+        self.mapping = None
+        self._mapping_endpoint = None
+        self.last_outbound = None
+        self.link_free_at = 0.0
+        self.stats = {"forwarded": 0, "fragmented": 0, "dropped_mtu": 0, "dropped_queue": 0, "lost": 0,
+                      "expired_mappings": 0, "dropped_unmapped": 0}
+        self._closed = []
+
+    async def start(self):
+        self.client_side, _ = await _udp(self._from_client)
+        self.mapping, self._mapping_endpoint = await _udp(self._from_target)
+        return self
+
+    @property
+    def address(self):
+        return self.client_side.get_extra_info("sockname")
+
+    @property
+    def mapped_address(self):
+        return self.mapping.get_extra_info("sockname")
+
+    def close(self):
+        for transport in [self.client_side, self.mapping] + self._closed:
+            if transport is not None:
+                transport.close()
+
+    def _expired(self, now):
+        return self.nat_timeout is not None and self.last_outbound is not None \
+            and now - self.last_outbound > self.nat_timeout
+
+    def _from_client(self, endpoint, data, addr):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.client = addr
+        if self._expired(now):
+            # The old mapping is gone; the client now appears from a new port
+            self.stats["expired_mappings"] += 1
+            self._closed.append(self.mapping)
+            old = self.mapping
+            self.mapping = None
+            loop.create_task(self._remap(old, data))
+            self.last_outbound = now
+            return
+        self.last_outbound = now
+        if self.mapping is None:
+            return
+
+        slots = 1
+        if len(data) + IP_UDP_OVERHEAD > self.path_mtu:
+            if self.oversize == "drop":
+                self.stats["dropped_mtu"] += 1
+                return
+            self.stats["fragmented"] += 1
+            slots = 2
+        for _ in range(slots):
+            if self.loss and self.rng.random() < self.loss:
+                self.stats["lost"] += 1
+                return
+        if not self.pps:
+            self._forward(data)
+            return
+        start = max(now, self.link_free_at)
+        if start - now > self.buffer:
+            self.stats["dropped_queue"] += 1
+            return
+        self.link_free_at = start + slots / self.pps
+        loop.call_at(self.link_free_at, self._forward, data)
+
+    async def _remap(self, old, data):
+        old.close()
+        self.mapping, self._mapping_endpoint = await _udp(self._from_target)
+        self._forward(data)
+
+    def _forward(self, data):
+        if self.mapping is not None:
+            self.stats["forwarded"] += 1
+            self.mapping.sendto(data, self.target)
+
+    def _from_target(self, endpoint, data, addr):
+        if endpoint is not self._mapping_endpoint or self.client is None \
+                or self._expired(asyncio.get_running_loop().time()):
+            self.stats["dropped_unmapped"] += 1
+            return
+        self.client_side.sendto(data, self.client)
+
+async def probe_once(path_mtu):
+    """Negotiate an ICE pair through the stand-in and probe it; returns (PathInfo, seconds)."""
+    client = aioice.Connection(ice_controlling=True, use_ipv6=False)
+    router = aioice.Connection(ice_controlling=False, use_ipv6=False)
+    await asyncio.gather(client.gather_candidates(), router.gather_candidates())
+    router_candidate = router.local_candidates[0]
+    path = await PathStandIn((router_candidate.host, router_candidate.port), path_mtu).start()
+    try:
+        client.remote_username, client.remote_password = router.local_username, router.local_password
+        router.remote_username, router.remote_password = client.local_username, client.local_password
+        # Each side only knows the other through the stand-in, like a client behind a NAT
+        await client.add_remote_candidate(Candidate("1", 1, "udp", 100, *path.address, "host"))
+        await router.add_remote_candidate(Candidate("2", 1, "udp", 100, *path.mapped_address, "host"))
+        await client.add_remote_candidate(None)
+        await router.add_remote_candidate(None)
+        await asyncio.gather(client.connect(), router.connect())
+
+        start = time.perf_counter()
+        info = await pathprobe.probe_path(client, client._nominated[1])
+        return info, time.perf_counter() - start
+    finally:
+        await asyncio.gather(client.close(), router.close())
+        path.close()
+
+async def transfer(tunnel_mtu, path_mtu, total_bytes, pps, loss):
+    """Send `total_bytes` of tunnel traffic in tunnel_mtu-sized packets through a fragmenting path."""
+    loop = asyncio.get_running_loop()
+    arrivals = {}
+
+    def received(endpoint, data, addr):
+        seq, sent = struct.unpack_from("!Id", data)
+        arrivals[seq] = (loop.time(), loop.time() - sent)
+
+    sink, _ = await _udp(received)
+    path = await PathStandIn(sink.get_extra_info("sockname"), path_mtu, "fragment", pps=pps, loss=loss).start()
+    sender, _ = await _udp(lambda *args: None)
+    packets = -(-total_bytes // tunnel_mtu)
+    padding = bytes(tunnel_mtu + WIREGUARD_DATA_OVERHEAD - struct.calcsize("!Id"))
+    start = loop.time()
+    try:
+        # Offered at the rate the link carries unfragmented packets, in 1ms bursts
+        per_burst = max(1, pps // 1000)
+        for seq in range(packets):
+            sender.sendto(struct.pack("!Id", seq, loop.time()) + padding, path.address)
+            if seq % per_burst == per_burst - 1:
+                await asyncio.sleep(max(0.0, start + (seq + 1) / pps - loop.time()))
+        await asyncio.sleep(path.buffer + 0.2)
+    finally:
+        sender.close()
+        path.close()
+        sink.close()
+
+    delays = [delay for _, delay in arrivals.values()]
+    duration = max(at for at, _ in arrivals.values()) - start if arrivals else float("inf")
+    return {
+        "tunnel_mtu": tunnel_mtu,
+        "goodput_mbit": round(len(arrivals) * tunnel_mtu * 8 / duration / 1e6, 2),
+        "delivered_pct": round(len(arrivals) / packets * 100, 1),
+        "fragmented_pct": round(path.stats["fragmented"] / packets * 100, 1),
+        "delay_p50_ms": round(percentile(delays, 50) * 1000, 2) if delays else None,
+        "delay_p95_ms": round(percentile(delays, 95) * 1000, 2) if delays else None,
+    }
+
+async def reachable_after_idle(keepalive, nat_timeout, idle):
+    """Can the router still send to the client after `idle` seconds without client traffic?"""
+    got = []
+    learned = []
+    router, _ = await _udp(lambda endpoint, data, addr: learned.append(addr))
+    path = await PathStandIn(router.get_extra_info("sockname"), nat_timeout=nat_timeout).start()
+    client, _ = await _udp(lambda endpoint, data, addr: got.append(data))
+
+    async def keep_alive():
+        while True:
+            await asyncio.sleep(keepalive)
+            client.sendto(b"keepalive", path.address)
+
+    client.sendto(b"handshake", path.address)
+    task = asyncio.ensure_future(keep_alive()) if keepalive else None
+    try:
+        await asyncio.sleep(idle)
+        # The router answers to where it last heard from the client
+        router.sendto(b"data", learned[-1])
+        await asyncio.sleep(0.2)
+    finally:
+        if task:
+            task.cancel()
+        client.close()
+        path.close()
+        router.close()
+    return b"data" in got
+
+async def run(mtus, iterations, total_bytes, pps, loss, scale):
+    results = {}
+    for path_mtu in mtus:
+        probes = [await probe_once(path_mtu) for _ in range(iterations)]
+        info = probes[-1][0]
+        seconds = [elapsed for _, elapsed in probes]
+        correct = max([size for size in pathprobe.MTU_LADDER if size <= path_mtu], default=None)
+        stats = {
+            "probed_path_mtu": info.path_mtu,
+            "correct": all(found.path_mtu == correct for found, _ in probes),
+            "tunnel_mtu": info.mtu,
+            "keepalive": info.keepalive,
+            "probe_p50_ms": round(percentile(seconds, 50) * 1000, 1),
+            "probe_p95_ms": round(percentile(seconds, 95) * 1000, 1),
+            "default": await transfer(DEFAULT_TUNNEL_MTU, path_mtu, total_bytes, pps, loss),
+        }
+        if info.mtu:
+            stats["probed"] = await transfer(info.mtu, path_mtu, total_bytes, pps, loss)
+        results[str(path_mtu)] = stats
+
+    keepalive = pathprobe.NAT_KEEPALIVE * scale
+    trials = await asyncio.gather(*[reachable_after_idle(value, NAT_TIMEOUT * scale, IDLE * scale)
+                                    for value in (None, keepalive) for _ in range(iterations)])
+    results["idle_reachability"] = {
+        "without_keepalive_pct": round(sum(trials[:iterations]) / iterations * 100),
+        "with_keepalive_pct": round(sum(trials[iterations:]) / iterations * 100),
+    }
+    return results
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    mtus = [int(value) for value in arg_value("--mtus", "1500,1492,1428,1400").split(",")]
+    iterations = arg_value("--iterations", 3, int)
+    total_bytes = int(arg_value("--megabytes", 4.0, float) * 1024 * 1024)
+    pps = arg_value("--pps", 5000, int)
+    loss = arg_value("--loss", 0.005, float)
+    scale = arg_value("--time-scale", 0.04, float)
+
+    results = asyncio.run(run(mtus, iterations, total_bytes, pps, loss, scale))
+
+    print(f"{'path MTU':<10}{'probed':>8}{'ok':>5}{'probe ms':>10}{'tunnel MTU':>16}"
+          f"{'Mbit/s':>9}{'deliv %':>9}{'frag %':>8}{'p95 ms':>9}")
+    for path_mtu, stats in results.items():
+        if path_mtu == "idle_reachability":
+            continue
+        for label in ("default", "probed"):
+            transfer_stats = stats.get(label)
+            if transfer_stats is None:
+                continue
+            probe = (f"{stats['probed_path_mtu']:>8}{'yes' if stats['correct'] else 'NO':>5}"
+                     f"{stats['probe_p50_ms']:>10.1f}") if label == "default" else " " * 23
+            print(f"{path_mtu if label == 'default' else '':<10}{probe}"
+                  f"{'%s %s' % (label, transfer_stats['tunnel_mtu']):>16}{transfer_stats['goodput_mbit']:>9.2f}"
+                  f"{transfer_stats['delivered_pct']:>9.1f}{transfer_stats['fragmented_pct']:>8.1f}"
+                  f"{transfer_stats['delay_p95_ms']:>9.2f}")
+    idle = results["idle_reachability"]
+    print(f"\nrouter reaches the client after {IDLE:.0f}s idle (NAT timeout {NAT_TIMEOUT:.0f}s): "
+          f"{idle['without_keepalive_pct']}% without keepalive, "
+          f"{idle['with_keepalive_pct']}% with PersistentKeepalive = {pathprobe.NAT_KEEPALIVE}")
+
+    settings = {"iterations": iterations, "bytes": total_bytes, "pps": pps, "loss": loss, "time_scale": scale}
+    save_results("path", results, settings, arg_value("--output"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Batch provisioning throughput against the offline stand-ins.
+
+Provisions --jobs device tokens through provision.provision() against the
+AmpliFi API stub and the aiortc router stand-in, once per concurrency level,
+with every --reject-every-th token refused by the API so failures stream
+alongside configs. Reports wall time, jobs per second, time to the first
+result and p50/p95 per job.
+
+Usage:
+    python benchmarks/bench_provision.py [--jobs N] [--concurrency 1,4,8] [--rate R]
+                                         [--rtt MS] [--reject-every N] [--output FILE]
+"""
+
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import teleport
+from amplifi_stub import AmplifiStub
+from benchutil import arg_value, percentile, save_results
+from provision import ProvisionJob, provision
+from router_stub import RouterStub
+
+class RejectingStub(AmplifiStub):
+    """Refuses connects for tokens starting with "revoked", like the API does for removed devices."""
+
+    def handle(self, endpoint, payload, headers):
+        if endpoint == "mlClientConnect" and headers.get("x-devicetoken", "").startswith("revoked"):
+            return {"success": False, "error": "device token revoked"}
+        return super().handle(endpoint, payload, headers)
+
+def run(jobs, concurrency, rate):
+    start = time.perf_counter()
+    first = None
+    durations = []
+    failures = 0
+    for result in provision(jobs, concurrency, rate, timeout=30):
+        if first is None:
+            first = time.perf_counter() - start
+        durations.append(result.seconds)
+        if result.config is None:
+            failures += 1
+    wall = time.perf_counter() - start
+    if len(durations) != len(jobs):
+        raise Exception("got %d results for %d jobs" % (len(durations), len(jobs)))
+    return {
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(len(jobs) / wall, 2),
+        "first_ms": round(first * 1000, 1),
+        "job_p50_ms": round(percentile(durations, 50) * 1000, 1),
+        "job_p95_ms": round(percentile(durations, 95) * 1000, 1),
+        "failures": failures,
+    }
+
+def main():
+    logging.basicConfig(level=logging.CRITICAL)
+    count = arg_value("--jobs", 16, int)
+    levels = [int(level) for level in arg_value("--concurrency", "1,4,8").split(",")]
+    rate = arg_value("--rate", 0.0, float)
+    rtt = arg_value("--rtt", 20.0, float) / 1000
+    reject_every = arg_value("--reject-every", 8, int)
+
+    jobs = []
+    for number in range(count):
+        revoked = reject_every and number % reject_every == reject_every - 1
+        jobs.append(ProvisionJob("router-%d" % number, ("revoked-%d" if revoked else "token-%d") % number))
+    expected_failures = sum(1 for job in jobs if job.device_token.startswith("revoked"))
+
+    router = RouterStub().start()
+    stub = RejectingStub(handshake_delay=rtt * 2, request_delay=rtt, answer_factory=router.answer).start()
+    stub.patch_teleport(teleport)
+    teleport.ICE_STUN_SERVER = None
+    results = {}
+    try:
+        for level in levels:
+            results[str(level)] = stats = run(jobs, level, rate)
+            if stats["failures"] != expected_failures:
+                raise Exception("expected %d failures, got %d" % (expected_failures, stats["failures"]))
+    finally:
+        teleport.shutdown()
+        stub.stop()
+        router.stop()
+
+    print(f"{'concurrency':<13}{'wall s':>9}{'jobs/s':>9}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'failed':>8}")
+    for level, stats in results.items():
+        print(f"{level:<13}{stats['wall_s']:>9.2f}{stats['jobs_per_s']:>9.2f}{stats['first_ms']:>10.1f}"
+              f"{stats['job_p50_ms']:>10.1f}{stats['job_p95_ms']:>10.1f}{stats['failures']:>8}")
+
+    settings = {"jobs": count, "rate": rate, "rtt_ms": rtt * 1000, "reject_every": reject_every}
+    save_results("provision", results, settings, arg_value("--output"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Split-tunnel AllowedIPs: correctness checks and speed on large exclusion lists.
+
+First, --cases random include/exclude/keep sets (IPv4 and IPv6, overlapping,
+nested and adjacent networks) are checked against two properties:
+  same     splittunnel.allowed_ips gives exactly the CIDRs of the stdlib
+           reference (address_exclude per exclusion, then collapse_addresses),
+           which is minimal
+  member   random addresses are inside the result exactly when they are in
+           include and not in exclude, or in keep
+Any failure is printed with its inputs and the script exits with status 1.
+
+Then the full tunnel minus N random networks is timed for each --sizes N,
+against the stdlib reference up to --reference-max networks.
+
+Usage:
+    python benchmarks/bench_split_tunnel.py [--cases N] [--sizes 100,1000,10000,100000]
+                                            [--reference-max N] [--repeat N] [--seed S] [--output FILE]
+"""
+
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import arg_value, percentile, save_results
+from splittunnel import FULL_TUNNEL, allowed_ips
+
+def parse_networks(networks):
+    return [ipaddress.ip_network(network, strict=False) for network in networks]
+
+def reference(include, exclude, keep):
+    """The straightforward stdlib version: one address_exclude per excluded network."""
+    include = parse_networks(include or FULL_TUNNEL)
+    exclude = parse_networks(exclude)
+    keep = parse_networks(keep)
+    entries = []
+    for version in (4, 6):
+        remaining = list(ipaddress.collapse_addresses(n for n in include if n.version == version))
+        for excluded in (n for n in exclude if n.version == version):
+            next_remaining = []
+            for network in remaining:
+                if network.subnet_of(excluded):
+                    continue
+                if excluded.subnet_of(network):
+                    next_remaining.extend(network.address_exclude(excluded))
+                else:
+                    next_remaining.append(network)
+            remaining = next_remaining
+        remaining += [n for n in keep if n.version == version]
+        entries.extend(str(n) for n in ipaddress.collapse_addresses(remaining))
+    return entries
+
+def random_network(rng, version, base=None):
+    bits = 32 if version == 4 else 128
+    if base is not None and rng.random() < 0.7:
+        # Somewhere inside `base`, so networks nest, overlap and touch
+        prefix = rng.randint(base.prefixlen, bits)
+        address = int(base.network_address) + rng.randrange(base.num_addresses)
+    else:
+        prefix = rng.randint(1 if version == 4 else 8, bits)
+        address = rng.getrandbits(bits)
+    return ipaddress.ip_network((address, prefix), strict=False)
+
+def random_case(rng):
+    bases = {4: random_network(rng, 4), 6: random_network(rng, 6)}
+    bases[4] = ipaddress.ip_network((int(bases[4].network_address), min(bases[4].prefixlen, 20)), strict=False)
+    bases[6] = ipaddress.ip_network((int(bases[6].network_address), min(bases[6].prefixlen, 100)), strict=False)
+
+    def networks(count):
+        return [str(random_network(rng, version, bases[version]))
+                for version in (rng.choice((4, 4, 6)) for _ in range(count))]
+
+    include = networks(rng.randint(0, 6)) if rng.random() < 0.7 else []
+    return include, networks(rng.randint(0, 40)), networks(rng.randint(0, 2))
+
+def check_membership(rng, include, exclude, keep, result, samples=200):
+    include_nets = parse_networks(include or FULL_TUNNEL)
+    exclude_nets = parse_networks(exclude)
+    keep_nets = parse_networks(keep)
+    result_nets = parse_networks(result)
+    candidates = include_nets + exclude_nets + keep_nets
+    for _ in range(samples):
+        network = rng.choice(candidates) if candidates and rng.random() < 0.9 else random_network(rng, 4)
+        address = network.network_address + rng.randrange(network.num_addresses)
+        edge = rng.random()
+        if edge < 0.2:
+            address = network.network_address
+        elif edge < 0.4:
+            address = network.broadcast_address
+
+        def inside(nets):
+            return any(address in net for net in nets if net.version == address.version)
+
+        expected = (inside(include_nets) and not inside(exclude_nets)) or inside(keep_nets)
+        if inside(result_nets) != expected:
+            return address
+    return None
+
+def run_checks(cases, rng):
+    failures = []
+    for _ in range(cases):
+        include, exclude, keep = random_case(rng)
+        result = allowed_ips(include, exclude, keep)
+        expected = reference(include, exclude, keep)
+        if result != expected:
+            failures.append(("same", include, exclude, keep, result, expected))
+            continue
+        address = check_membership(rng, include, exclude, keep, result)
+        if address is not None:
+            failures.append(("member", include, exclude, keep, result, str(address)))
+    return failures
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 50), result
+
+def main():
+    cases = arg_value("--cases", 500, int)
+    sizes = [int(size) for size in arg_value("--sizes", "100,1000,10000,100000").split(",")]
+    reference_max = arg_value("--reference-max", 1000, int)
+    repeat = arg_value("--repeat", 3, int)
+    rng = random.Random(arg_value("--seed", 1, int))
+
+    failures = run_checks(cases, rng)
+    for kind, include, exclude, keep, result, expected in failures[:5]:
+        print(f"FAILED ({kind}): include={include} exclude={exclude} keep={keep}\n"
+              f"  got      {result}\n  expected {expected}")
+    print(f"correctness: {cases - len(failures)}/{cases} random cases passed\n")
+
+    results = {"checks": {"cases": cases, "failures": len(failures)}}
+    print(f"{'excluded':>10}{'CIDRs out':>11}{'split ms':>11}{'stdlib ms':>12}{'speedup':>9}")
+    for size in sizes:
+        # Like a geo-IP or corporate block list: mostly small networks all over the address space
+        exclude = [str(ipaddress.ip_network((rng.getrandbits(32), rng.randint(12, 32)), strict=False))
+                   for _ in range(size)]
+        split_seconds, result = timed(lambda: allowed_ips(None, exclude), repeat)
+        stats = {"cidrs": len(result), "split_ms": round(split_seconds * 1000, 2)}
+        if size <= reference_max:
+            reference_seconds, expected = timed(lambda: reference(None, exclude, ()), 1)
+            if expected != result:
+                failures.append(("same", None, exclude, (), result, expected))
+            stats["stdlib_ms"] = round(reference_seconds * 1000, 2)
+            stats["speedup"] = round(reference_seconds / split_seconds, 1)
+        results[str(size)] = stats
+        stdlib = f"{stats['stdlib_ms']:>12.2f}{stats['speedup']:>8.1f}x" if "stdlib_ms" in stats else f"{'-':>12}{'-':>9}"
+        print(f"{size:>10}{stats['cidrs']:>11}{stats['split_ms']:>11.2f}{stdlib}")
+
+    settings = {"cases": cases, "repeat": repeat, "reference_max": reference_max}
+    save_results("split_tunnel", results, settings, arg_value("--output"))
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Startup budget: import time per app module and time to tray icon.
+
+Every sample runs in a fresh interpreter. Import times come from
+`python -X importtime` (cumulative, i.e. including everything the module
+pulls in). Time to tray is measured from spawning the interpreter until
+main.create_tray_icon() has been shown with run_detached(); it needs
+pystray, Pillow and a desktop session and is skipped otherwise. Heavy
+packages already loaded at that point are listed, since anything in
+there delays the tray.
+
+Usage: python benchmarks/bench_startup.py [--iterations N] [--output FILE] [--compare FILE]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchutil import arg_value, compare_results, print_table, save_results, summarize
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("config", "tracing", "logsetup", "notifications", "tunnel_backends", "tunnel_status",
+           "tunnel", "supervisor", "runtime", "wgkeys", "signaling", "teleport", "ui", "main")
+
+# Packages that must not be loaded before the tray icon shows
+HEAVY_PACKAGES = ("aiortc", "aioice", "aiohttp", "cryptography", "customtkinter", "plyer", "requests")
+
+TRAY_PROBE = """
+import sys, time
+import main
+icon = main.create_tray_icon()
+icon.run_detached()
+print("TRAY", flush=True)
+print("LOADED", ",".join(name for name in %r if name in sys.modules), flush=True)
+icon.stop()
+""" % (HEAVY_PACKAGES,)
+
+def import_time(module):
+    """Cumulative import time of `module` in seconds, or None if it can't be imported here."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            capture_output=True, text=True, cwd=APP_DIR)
+    if result.returncode != 0:
+        return None
+    for line in reversed(result.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    return None
+
+def time_to_tray():
+    """Seconds from spawning the interpreter to a visible tray icon, and the heavy packages loaded by then."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", TRAY_PROBE], stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, cwd=APP_DIR)
+    elapsed = None
+    loaded = []
+    for line in process.stdout:
+        if line.startswith("TRAY") and elapsed is None:
+            elapsed = time.perf_counter() - start
+        elif line.startswith("LOADED"):
+            loaded = [name for name in line.split(" ", 1)[1].strip().split(",") if name]
+    process.wait(timeout=30)
+    if elapsed is None:
+        reason = process.stderr.read().strip().splitlines()
+        print(f"time to tray skipped: {reason[-1] if reason else 'no tray'}")
+    return elapsed, loaded
+
+def main():
+    iterations = arg_value("--iterations", 5, int)
+
+    phases = {}
+    unavailable = []
+    for module in MODULES:
+        samples = [import_time(module) for _ in range(iterations)]
+        if None in samples:
+            unavailable.append(module)
+            continue
+        phases[module] = summarize(samples)
+
+    tray_samples = []
+    loaded = []
+    for _ in range(iterations):
+        elapsed, loaded = time_to_tray()
+        if elapsed is None:
+            break
+        tray_samples.append(elapsed)
+    if tray_samples:
+        phases["time_to_tray"] = summarize(tray_samples)
+
+    print_table(phases)
+    if unavailable:
+        print("\nnot importable here: " + ", ".join(unavailable))
+    if tray_samples:
+        print("heavy packages loaded before the tray: " + (", ".join(loaded) or "none"))
+
+    settings = {"iterations": iterations, "unavailable": unavailable, "loaded_before_tray": loaded}
+    save_results("startup", phases, settings, arg_value("--output"))
+
+    baseline = arg_value("--compare")
+    if baseline:
+        compare_results(baseline, phases)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Open-to-interactive latency and memory growth of the control window.
+
+Compares building a new window for every open (the old behaviour) with
+showing the persistent ControlWindow again, in this process
+(WORKER_PROCESSES = False) and in the window process the app ships with
+(WORKER_PROCESSES = True): a cold open starts that process, a warm one
+shows its hidden window again. "Interactive" means the window is mapped
+and Tk has processed all pending events; for the window process, that it
+reported being shown. Needs a desktop session (customtkinter, a display
+and the .ico icon), i.e. Windows.
+
+Usage: python benchmarks/bench_window.py [--opens N] [--cold-opens N] [--output FILE] [--compare FILE]
+"""
+
+import os
+import sys
+import time
+
+# How long a window process may take to come up before the benchmark gives up
+SHOWN_TIMEOUT = 60.0
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ui
+from benchutil import arg_value, compare_results, print_table, rss_bytes, save_results, summarize
+from tunnel_backends import FakeBackend, set_backend
+
+def _wait_interactive(window):
+    window.root.update()
+    while not window.root.winfo_viewable():
+        window.root.update()
+
+def bench_rebuild(opens):
+    samples = []
+    rss_start = rss_bytes()
+    for _ in range(opens):
+        start = time.perf_counter()
+        window = ui.ControlWindow()
+        window.show()
+        _wait_interactive(window)
+        samples.append(time.perf_counter() - start)
+        window.destroy()
+    return samples, rss_bytes() - rss_start
+
+def bench_persistent(opens):
+    samples = []
+    window = ui.ControlWindow()
+    _wait_interactive(window)
+    rss_start = rss_bytes()
+    for _ in range(opens):
+        window.hide()
+        window.root.update()
+        start = time.perf_counter()
+        window.request_show()
+        window._drain_events()
+        _wait_interactive(window)
+        samples.append(time.perf_counter() - start)
+    growth = rss_bytes() - rss_start
+    window.destroy()
+    return samples, growth
+
+def _open_process(window_process):
+    start = time.perf_counter()
+    window_process.show()
+    if not window_process.shown.wait(SHOWN_TIMEOUT):
+        raise Exception("The window process did not show its window")
+    return time.perf_counter() - start
+
+def bench_process(opens, cold_opens):
+    """Open-to-shown through workers.WindowProcess: cold (new process) and warm (hidden window shown again)."""
+    from workers import WindowProcess
+
+    ignore = lambda *args: None
+    handlers = {"toast": ignore, "cancel_supervisor": ignore, "negotiate": ignore, "quit": ignore}
+    cold = []
+    for _ in range(cold_opens):
+        window_process = WindowProcess(handlers)
+        cold.append(_open_process(window_process))
+        window_process.stop()
+
+    warm = []
+    window_process = WindowProcess(handlers)
+    _open_process(window_process)
+    for _ in range(opens):
+        window_process.hide()
+        time.sleep(0.1)
+        warm.append(_open_process(window_process))
+    window_process.stop()
+    return cold, warm
+
+def main():
+    opens = arg_value("--opens", 30, int)
+    cold_opens = arg_value("--cold-opens", 5, int)
+
+    set_backend(FakeBackend())
+
+    rebuild, rebuild_growth = bench_rebuild(opens)
+    persistent, persistent_growth = bench_persistent(opens)
+    process_cold, process_warm = bench_process(opens, cold_opens)
+
+    phases = {"open_rebuild": summarize(rebuild), "open_persistent": summarize(persistent),
+              "open_process_cold": summarize(process_cold), "open_process_warm": summarize(process_warm)}
+    print_table(phases)
+    print(f"RSS growth over {opens} opens: rebuild {rebuild_growth / 1024:.0f} KiB, "
+          f"persistent {persistent_growth / 1024:.0f} KiB")
+
+    settings = {"opens": opens, "cold_opens": cold_opens, "rss_growth_rebuild": rebuild_growth,
+                "rss_growth_persistent": persistent_growth}
+    save_results("window", phases, settings, arg_value("--output"))
+
+    baseline = arg_value("--compare")
+    if baseline:
+        compare_results(baseline, phases)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Shared helpers for the benchmark scripts: percentiles and machine-readable results."""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of `samples`."""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def summarize(samples):
+    """p50/p95/p99/min/max of a list of seconds, in milliseconds."""
+    return {
+        "samples": len(samples),
+        "p50": _ms(percentile(samples, 50)),
+        "p95": _ms(percentile(samples, 95)),
+        "p99": _ms(percentile(samples, 99)),
+        "min": _ms(min(samples)) if samples else None,
+        "max": _ms(max(samples)) if samples else None,
+    }
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+def rss_bytes():
+    """Resident set size of this process (Windows and Linux)."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_table(phases):
+    print(f"{'phase':<18}{'n':>6}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for name, stats in phases.items():
+        print(f"{name:<18}{stats['samples']:>6}{stats['p50']:>11.2f}{stats['p95']:>11.2f}{stats['p99']:>11.2f}")
+
+def save_results(benchmark, phases, settings, output=None):
+    """Write a JSON result file (default: benchmarks/results/<benchmark>-<commit>.json)."""
+    commit = git_commit()
+    result = {
+        "benchmark": benchmark,
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": settings,
+        "phases": phases,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{benchmark}-{commit}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+    return output
+
+def compare_results(baseline_path, phases, metric="p50"):
+    """Print the change of `metric` per phase against an earlier result file."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    print(f"\n{metric} vs {baseline.get('commit', '?')} ({baseline_path})")
+    for name, stats in phases.items():
+        before = baseline.get("phases", {}).get(name, {}).get(metric)
+        now = stats.get(metric)
+        if before is None or now is None:
+            print(f"  {name:<18}{'n/a':>12}")
+            continue
+        change = (now - before) / before * 100 if before else 0.0
+        print(f"  {name:<18}{before:>10.2f} -> {now:>10.2f} ms ({change:+.1f}%)")
+
+def arg_value(flag, default=None, cast=str):
+    if flag in sys.argv:
+        return cast(sys.argv[sys.argv.index(flag) + 1])
+    return default
@@ -0,0 +1,80 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Local aiortc peer standing in for an AmpliFi router.
+
+Answers offers the way the router does, with the `uca_acf5_amplifi_*`
+session attributes teleport.py reads the tunnel settings from. The peer
+runs on its own event loop thread so it can be used as the answer
+factory of AmplifiStub, whose request handlers are synchronous.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
+
+from wgkeys import generate_keypair
+
+class RouterStub:
+    def __init__(self, interface_address="10.255.0.2", dns_address="192.168.1.1", answer_delay=0.0):
+        self.interface_address = interface_address
+        self.dns_address = dns_address
+        self.answer_delay = answer_delay
+        self.private_key, self.public_key = generate_keypair()
+        self.peers = []
+        self.offers = []
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="router-stub", daemon=True)
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.close_peers(), self._loop).result(10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+
+    async def close_peers(self):
+        peers, self.peers = self.peers, []
+        for pc in peers:
+            await pc.close()
+
+    def answer(self, offer, timeout=30):
+        """Answer factory for AmplifiStub: returns the router's answer SDP."""
+        future = asyncio.run_coroutine_threadsafe(self._answer(offer), self._loop)
+        return future.result(timeout)
+
+    async def _answer(self, offer):
+        self.offers.append(offer)
+        if self.answer_delay:
+            await asyncio.sleep(self.answer_delay)
+
+        pc = RTCPeerConnection(RTCConfiguration([]))
+        self.peers.append(pc)
+
+        @pc.on("datachannel")
+        def on_datachannel(channel):
+            pass
+
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=offer, type="offer"))
+        await pc.setLocalDescription(await pc.createAnswer())
+        return self._add_router_info(pc.localDescription.sdp)
+
+    def _add_router_info(self, sdp):
+        parts = sdp.partition("s=-")
+        info = "\r\n".join([
+            "a=uca_acf5_amplifi_ipv4_addr:" + self.interface_address,
+            "a=uca_acf5_amplifi_ipv4_dns_addr0:" + self.dns_address,
+            "a=uca_acf5_amplifi_tunnel_pub_key:" + self.public_key])
+        return parts[0] + parts[1] + "\r\n" + info + parts[2]
@@ -3,6 +3,12 @@
 
 Remove-Item -Recurse -Force build,dist,__pycache__ -ErrorAction SilentlyContinue
 
+# wireguard-nt's wireguard.dll (amd64) lets the app read tunnel stats from the driver;
+# without it every supervisor check runs wg.exe
+$extra = @()
+if (Test-Path wireguard.dll) { $extra += @('--add-binary', 'wireguard.dll;.') }
+else { Write-Warning "wireguard.dll not found, peer stats will fall back to wg.exe" }
+
 pyinstaller --onefile --windowed `
   --name "AmpliFi Teleport for Desktop" `
   --icon tray-icon.ico `
@@ -10,7 +16,27 @@ pyinstaller --onefile --windowed `
   --uac-admin `
   --hidden-import config `
   --hidden-import tunnel `
+  --hidden-import profiles `
+  --hidden-import tunnel_backends `
+  --hidden-import tunnel_status `
+  --hidden-import supervisor `
+  --hidden-import workers `
+  --hidden-import provision `
+  --hidden-import win32service `
+  --hidden-import wgconfig `
   --hidden-import ui `
   --hidden-import notifications `
+  --hidden-import tracing `
+  --hidden-import logsetup `
+  --hidden-import runtime `
+  --hidden-import candidates `
+  --hidden-import pathprobe `
+  --hidden-import splittunnel `
+  --hidden-import dnscache `
+  --hidden-import retry `
+  --hidden-import ice_cache `
+  --hidden-import signaling `
+  --hidden-import wgkeys `
   --hidden-import plyer.platforms.win.notification `
+  @extra `
   main.py
\ No newline at end of file
@@ -0,0 +1,139 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import namedtuple
+
+from aioice import stun
+from aioice.ice import CandidatePair
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# STUN binding requests sent at once to every succeeded pair, and how long to wait for answers
+RTT_SAMPLES = 3
+RTT_PROBE_TIMEOUT = 0.5
+# Once the nominated pair answers, the others get this many times its RTT (at least
+# RTT_MIN_GRACE seconds) to answer too; a silent pair then costs about one RTT, not the timeout
+RTT_GRACE_FACTOR = 3.0
+RTT_MIN_GRACE = 0.05
+
+PairMeasurement = namedtuple("PairMeasurement", ["pair", "rtt", "relayed"])
+
+def is_relayed(pair):
+    return pair.local_candidate.type == "relay" or pair.remote_candidate.type == "relay"
+
+def candidate_pairs(connection, component=1):
+    """The pairs of the ICE check list for `component` whose checks succeeded, nominated pair first.
+
+    Failed and never-checked pairs are left out: probing them would only wait
+    for answers that don't come.
+    """
+    pairs = []
+    nominated = connection._nominated.get(component)
+    if nominated is not None:
+        pairs.append(nominated)
+    for pair in connection._check_list:
+        if pair.component == component and pair.state == CandidatePair.State.SUCCEEDED and pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+async def _probe_rtt(connection, pair):
+    """One STUN round trip over `pair` in seconds, None if it got no answer."""
+    request = connection.build_request(pair, nominate=False)
+    start = time.perf_counter()
+    try:
+        await pair.protocol.request(
+            request,
+            pair.remote_addr,
+            integrity_key=connection.remote_password.encode("utf8"),
+            retransmissions=0)
+    except stun.TransactionError:
+        return None
+    return time.perf_counter() - start
+
+async def measure_pair_rtts(connection, pairs, samples=RTT_SAMPLES, timeout=RTT_PROBE_TIMEOUT, nominated=None):
+    """Median STUN round-trip time of every pair (None if unanswered), all samples sent at once.
+
+    Stops `timeout` seconds after sending, or a short grace period after the
+    `nominated` pair (the first one by default) answered.
+    """
+    nominated = nominated or (pairs[0] if pairs else None)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout
+    tasks = {}
+    for pair in pairs:
+        for _ in range(samples):
+            tasks[asyncio.ensure_future(_probe_rtt(connection, pair))] = pair
+    pending = set(tasks)
+    rtts = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                rtt = task.result()
+                if rtt is None:
+                    continue
+                pair = tasks[task]
+                if pair is nominated and pair not in rtts:
+                    deadline = min(deadline, loop.time() + max(rtt * RTT_GRACE_FACTOR, RTT_MIN_GRACE))
+                rtts.setdefault(pair, []).append(rtt)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [PairMeasurement(pair, statistics.median(rtts[pair]) if pair in rtts else None, is_relayed(pair))
+            for pair in pairs]
+
+def select_best_pair(measurements, nominated=None):
+    """Pick the pair to use as the WireGuard endpoint.
+
+    Pairs that did not answer come last, then direct paths win over relayed
+    ones, then the lowest RTT; the nominated pair breaks ties. Returns (best, rejected).
+    """
+    def rank(measurement):
+        return (
+            measurement.rtt is None,
+            measurement.relayed,
+            measurement.rtt if measurement.rtt is not None else 0.0,
+            measurement.pair is not nominated
+        )
+
+    ordered = sorted(measurements, key=rank)
+    return ordered[0], ordered[1:]
+
+def _describe(measurement):
+    pair = measurement.pair
+    rtt = "no answer" if measurement.rtt is None else "%.1fms" % (measurement.rtt * 1000)
+    return "%s -> %s [%s/%s] %s" % (pair.local_addr, pair.remote_addr,
+                                    pair.local_candidate.type, pair.remote_candidate.type, rtt)
+
+async def select_candidate_pair(connection, component=1, samples=RTT_SAMPLES, timeout=RTT_PROBE_TIMEOUT):
+    """Measure every candidate pair and return the fastest direct one that answers."""
+    nominated = connection._nominated.get(component)
+    if nominated is None:
+        raise Exception("No nominated candidate peer")
+
+    pairs = candidate_pairs(connection, component)
+    if len(pairs) == 1:
+        logger.info("Chosen candidate pair: %s (only candidate pair)", nominated)
+        return nominated
+
+    measurements = await measure_pair_rtts(connection, pairs, samples, timeout, nominated)
+    best, rejected = select_best_pair(measurements, nominated)
+    if best.rtt is None:
+        # Nothing answered the probe, keep what ICE agreed on
+        best = next(measurement for measurement in measurements if measurement.pair is nominated)
+        rejected = [measurement for measurement in measurements if measurement is not best]
+
+    logger.info("Chosen candidate pair: %s", _describe(best))
+    for measurement in rejected:
+        logger.info("Rejected candidate pair: %s", _describe(measurement))
+
+    return best.pair
@@ -7,14 +7,93 @@ import sys
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Config paths
-CONFIG_DIR = os.path.join(os.getenv('APPDATA'), 'AmpliFiTeleport')
+CONFIG_DIR = os.path.join(os.getenv('APPDATA') or os.path.expanduser('~'), 'AmpliFiTeleport')
 os.makedirs(CONFIG_DIR, exist_ok=True)
 UUID_FILE = os.path.join(CONFIG_DIR, 'teleport_uuid')
 TOKEN_FILE = os.path.join(CONFIG_DIR, 'teleport_token_0')
 CONFIG_PATH = os.path.join(CONFIG_DIR, 'teleport.conf')
+# One directory per router profile (client hint, device token, config, endpoint) and an
+# index.json; the three files above are from single-router versions and get moved
+# into the "default" profile on first start
+PROFILES_DIR = os.path.join(CONFIG_DIR, 'profiles')
+# Copy of the config the running tunnel was last brought up or synced with
+ACTIVE_CONFIG_PATH = os.path.join(CONFIG_DIR, 'teleport.active.conf')
+# Held while the tunnel is changed, by whichever process (tray, window) changes it
+TUNNEL_LOCK_PATH = os.path.join(CONFIG_DIR, 'teleport.lock')
+# Number of user disconnects, so a recovery running elsewhere knows it was overtaken
+DISCONNECT_COUNT_PATH = os.path.join(CONFIG_DIR, 'teleport.disconnects')
 
 # WireGuard CLI path
 WG_EXE = r'C:\Program Files\WireGuard\wireguard.exe'
+WG_CLI = r'C:\Program Files\WireGuard\wg.exe'
+# wireguard-nt's wireguard.dll (https://download.wireguard.com/wireguard-nt/), shipped next to the app;
+# the tunnel's peer stats are read from the driver through it instead of running wg.exe
+WG_NT_DLL = os.path.join(APP_DIR, 'wireguard.dll')
+
+# Log file, rotated at LOG_MAX_BYTES with LOG_BACKUP_COUNT old files kept; at most
+# LOG_QUEUE_SIZE records wait for the writer thread before new ones are dropped
+LOG_FILE = "amplifi_teleport.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_QUEUE_SIZE = 10000
+
+# Phase tracing: spans are appended to TRACE_FILE and served at
+# http://127.0.0.1:METRICS_PORT/metrics (0 disables the endpoint)
+TRACING_ENABLED = False
+TRACE_FILE = os.path.join(CONFIG_DIR, 'traces.jsonl')
+METRICS_PORT = 0
+
+# Number of WireGuard keypairs kept ready in the background (0 disables the pool)
+KEY_POOL_SIZE = 2
+
+# Notifications posted within NOTIFY_COALESCE_WINDOW seconds are merged, and
+# toasts are shown at most once every NOTIFY_MIN_INTERVAL seconds
+NOTIFY_COALESCE_WINDOW = 0.5
+NOTIFY_MIN_INTERVAL = 4.0
+
+# Keep the tray process small: the control window and WebRTC negotiations run in
+# their own processes, started on demand. The negotiator (which holds the key
+# pool, HTTP connections and ICE config cache) stays up while the tunnel is, and
+# exits WORKER_IDLE_TIMEOUT seconds after its last job otherwise; the window
+# process exits once the window has been closed for WORKER_IDLE_TIMEOUT seconds
+WORKER_PROCESSES = True
+WORKER_IDLE_TIMEOUT = 60.0
+
+# Tunnel supervisor: a stalled peer is noticed within roughly CHECK_INTERVAL once
+# its last handshake is older than STALE_AFTER seconds; failed recoveries back off
+# (full jitter) from RETRY_BASE up to RETRY_MAX seconds, and BREAKER_THRESHOLD
+# failures in a row pause recovery for BREAKER_COOLDOWN seconds
+SUPERVISOR_ENABLED = True
+SUPERVISOR_CHECK_INTERVAL = 5.0
+# Peer stats that need a process per read (wg.exe without wireguard.dll) are sampled this often instead
+SUPERVISOR_PROCESS_CHECK_INTERVAL = 60.0
+SUPERVISOR_STALE_AFTER = 180
+SUPERVISOR_RETRY_BASE = 2.0
+SUPERVISOR_RETRY_MAX = 60.0
+SUPERVISOR_BREAKER_THRESHOLD = 5
+SUPERVISOR_BREAKER_COOLDOWN = 300.0
+
+# Split tunnel: with SPLIT_TUNNEL = True only SPLIT_TUNNEL_INCLUDE (everything when
+# empty) minus SPLIT_TUNNEL_EXCLUDE goes through the router, e.g. INCLUDE = ["192.168.1.0/24"]
+# for just the home LAN, or EXCLUDE = ["10.0.0.0/8", "172.16.0.0/12"] for all but those.
+# Otherwise all traffic does and untunneled traffic is blocked (kill-switch).
+# Used for configs negotiated after the change
+SPLIT_TUNNEL = False
+SPLIT_TUNNEL_INCLUDE = []
+SPLIT_TUNNEL_EXCLUDE = []
+
+# Local caching DNS forwarder: with DNS_CACHE_ENABLED the tunnel's DNS is DNS_CACHE_ADDRESS,
+# which answers from at most DNS_CACHE_MAX_ENTRIES cached answers (DNS_CACHE_MAX_BYTES in all)
+# and forwards misses to the router. Expired answers are still served for DNS_CACHE_MAX_STALE
+# seconds while they are refreshed. Used for configs negotiated after the change.
+# Only takes effect with SPLIT_TUNNEL routing less than everything: WireGuard for
+# Windows' kill switch (any 0.0.0.0/0 or ::/0 route) lets DNS reach only the
+# config's DNS servers, which would block the cache's own queries to the router
+DNS_CACHE_ENABLED = False
+DNS_CACHE_ADDRESS = "127.53.0.1"
+DNS_CACHE_MAX_ENTRIES = 10000
+DNS_CACHE_MAX_BYTES = 4 * 1024 * 1024
+DNS_CACHE_MAX_STALE = 3600
 
 def get_icon_path():
     """Get path to tray-icon.ico at runtime (bundled or development)."""
@@ -0,0 +1,491 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import ipaddress
+import logging
+import random
+import struct
+import time
+from collections import OrderedDict, namedtuple
+
+from config import DNS_CACHE_ADDRESS, DNS_CACHE_MAX_BYTES, DNS_CACHE_MAX_ENTRIES, DNS_CACHE_MAX_STALE
+from runtime import get_runtime
+from tracing import metrics
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+DNS_PORT = 53
+
+HEADER = struct.Struct("!HHHHHH")
+FLAG_QR = 0x8000
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_CD = 0x0010
+OPCODE_MASK = 0x7800
+RCODE_MASK = 0x000F
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+TYPE_SOA = 6
+TYPE_OPT = 41
+EDNS_DO = 0x8000
+# Largest UDP answer for clients that don't say (no EDNS)
+CLASSIC_UDP_SIZE = 512
+
+# TTL of an answer served after it expired, while it is being refreshed (RFC 8767)
+STALE_TTL = 30
+MAX_TTL = 86400
+# What an entry costs besides its message, counted against max_bytes
+ENTRY_OVERHEAD = 200
+
+# The router is one tunnel round trip away; each attempt gets half the time
+UPSTREAM_TIMEOUT = 2.0
+UPSTREAM_ATTEMPTS = 2
+TCP_IDLE_TIMEOUT = 10.0
+
+class MalformedMessage(Exception):
+    pass
+
+# key: what makes two queries share an answer; question: as the client spelled it
+Query = namedtuple("Query", ["id", "key", "question", "udp_size"])
+
+# message has ID 0; ttls are (offset, TTL) of every record, patched when served
+CacheEntry = namedtuple("CacheEntry", ["message", "ttls", "stored", "ttl"])
+
+def _skip_name(message, offset):
+    while True:
+        if offset >= len(message):
+            raise MalformedMessage("Name runs past the end of the message")
+        length = message[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        if length & 0xC0:
+            raise MalformedMessage("Unknown label type")
+        offset += 1 + length
+
+def _read_question(message):
+    """(question bytes, offset after it) of a message with one question."""
+    end = _skip_name(message, HEADER.size) + 4
+    if end > len(message):
+        raise MalformedMessage("Truncated question")
+    return message[HEADER.size:end], end
+
+def _records(message, offset, count):
+    """[(type, TTL offset, rdata offset, rdata length)] of `count` records at `offset`, and the offset after them."""
+    records = []
+    for _ in range(count):
+        offset = _skip_name(message, offset)
+        if offset + 10 > len(message):
+            raise MalformedMessage("Truncated record")
+        rtype, _, _, rdlength = struct.unpack_from("!HHIH", message, offset)
+        records.append((rtype, offset + 4, offset + 10, rdlength))
+        offset += 10 + rdlength
+        if offset > len(message):
+            raise MalformedMessage("Truncated record data")
+    return records, offset
+
+def parse_query(message):
+    """The Query of a standard single-question query, None for anything else (forwarded uncached)."""
+    if len(message) < HEADER.size:
+        raise MalformedMessage("Shorter than a DNS header")
+    query_id, flags, qdcount, ancount, nscount, arcount = HEADER.unpack_from(message)
+    if flags & (FLAG_QR | OPCODE_MASK) or qdcount != 1:
+        return None
+    question, offset = _read_question(message)
+    records, _ = _records(message, offset, ancount + nscount + arcount)
+
+    udp_size, dnssec_ok = CLASSIC_UDP_SIZE, False
+    for rtype, ttl_offset, _, _ in records:
+        if rtype == TYPE_OPT:
+            # OPT keeps the client's UDP size in CLASS and the DO bit in TTL
+            udp_size = max(CLASSIC_UDP_SIZE, struct.unpack_from("!H", message, ttl_offset - 2)[0])
+            dnssec_ok = bool(struct.unpack_from("!I", message, ttl_offset)[0] & EDNS_DO)
+    # Names compare case-insensitively; type and class bytes must stay as they are
+    key = (question[:-4].lower() + question[-4:], flags & (FLAG_RD | FLAG_CD), dnssec_ok)
+    return Query(query_id, key, question, udp_size)
+
+def cache_entry(message, now):
+    """A CacheEntry for an upstream answer, or None if it must not be cached.
+
+    Positive answers live as long as their shortest TTL, NXDOMAIN/NODATA as
+    long as the SOA allows (RFC 2308); errors and truncated answers are not kept.
+    """
+    _, flags, qdcount, ancount, nscount, arcount = HEADER.unpack_from(message)
+    rcode = flags & RCODE_MASK
+    if not flags & FLAG_QR or flags & FLAG_TC or qdcount != 1 or rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+        return None
+    _, offset = _read_question(message)
+    answers, offset = _records(message, offset, ancount)
+    authority, offset = _records(message, offset, nscount)
+    additional, _ = _records(message, offset, arcount)
+
+    ttls = [(ttl_offset, struct.unpack_from("!I", message, ttl_offset)[0])
+            for rtype, ttl_offset, _, _ in answers + authority + additional if rtype != TYPE_OPT]
+    if rcode == RCODE_NOERROR and answers:
+        ttl = min(value for _, value in ttls)
+    else:
+        soa = next((record for record in authority if record[0] == TYPE_SOA), None)
+        if soa is None:
+            return None
+        _, ttl_offset, rdata_offset, rdlength = soa
+        minimum = struct.unpack_from("!I", message, rdata_offset + rdlength - 4)[0]
+        ttl = min(struct.unpack_from("!I", message, ttl_offset)[0], minimum)
+    ttl = min(ttl, MAX_TTL)
+    if ttl <= 0:
+        return None
+    return CacheEntry(b"\0\0" + message[2:], ttls, now, ttl)
+
+def _reply(message, query):
+    """`message` with the client's ID and spelling of the question."""
+    data = bytearray(message)
+    struct.pack_into("!H", data, 0, query.id)
+    data[HEADER.size:HEADER.size + len(query.question)] = query.question
+    return data
+
+def _render(entry, query, now, stale):
+    data = _reply(entry.message, query)
+    age = int(now - entry.stored)
+    for offset, ttl in entry.ttls:
+        struct.pack_into("!I", data, offset, STALE_TTL if stale else max(0, ttl - age))
+    return bytes(data)
+
+def _servfail(query, message):
+    flags = HEADER.unpack_from(message)[1]
+    return HEADER.pack(query.id, FLAG_QR | (flags & (OPCODE_MASK | FLAG_RD | FLAG_CD)) | RCODE_SERVFAIL,
+                       1, 0, 0, 0) + query.question
+
+def _truncated(message):
+    query_id, flags = HEADER.unpack_from(message)[:2]
+    question, _ = _read_question(message)
+    return HEADER.pack(query_id, flags | FLAG_TC, 1, 0, 0, 0) + question
+
+class _Datagrams(asyncio.DatagramProtocol):
+    def __init__(self, received):
+        self.received = received
+
+    def datagram_received(self, data, addr):
+        self.received(data, addr)
+
+class DnsForwarder:
+    """Caching DNS forwarder for the tunnel's DNS server, listening on UDP and TCP.
+
+    Answers are cached for their TTL in an LRU bounded by entry count and
+    bytes. Expired answers are served for up to `max_stale` more seconds
+    while one background query refreshes them, and identical queries in
+    flight share one upstream query. Runs on an event loop (start/stop are coroutines).
+    """
+
+    def __init__(self, upstream, listen=(DNS_CACHE_ADDRESS, DNS_PORT), max_entries=DNS_CACHE_MAX_ENTRIES,
+                 max_bytes=DNS_CACHE_MAX_BYTES, max_stale=DNS_CACHE_MAX_STALE, timeout=UPSTREAM_TIMEOUT,
+                 clock=time.monotonic):
+        self.upstream = upstream if isinstance(upstream, tuple) else (upstream, DNS_PORT)
+        self.listen = listen
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self._clock = clock
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self._pending = {}
+        self._background = set()
+        self._udp = None
+        self._tcp = None
+        self._upstream_transport = None
+
+    @property
+    def running(self):
+        return self._udp is not None
+
+    @property
+    def address(self):
+        """Where the forwarder listens (the real port when started on port 0)."""
+        return self._udp.get_extra_info("sockname")[:2] if self._udp is not None else self.listen
+
+    async def start(self):
+        if self.running:
+            return self
+        loop = asyncio.get_running_loop()
+        self._udp, _ = await loop.create_datagram_endpoint(
+            lambda: _Datagrams(self._datagram_received), local_addr=self.listen)
+        # TCP on the same port, for answers too large for a client's UDP size
+        self._tcp = await asyncio.start_server(self._serve_tcp, self.address[0], self.address[1])
+        self._upstream_transport, _ = await loop.create_datagram_endpoint(
+            lambda: _Datagrams(self._upstream_received), remote_addr=self.upstream)
+        logger.info("DNS cache listening on %s:%d, forwarding to %s", self.address[0], self.address[1],
+                    self.upstream[0])
+        return self
+
+    async def stop(self):
+        for task in list(self._background) + list(self._inflight.values()):
+            task.cancel()
+        for transport in (self._udp, self._upstream_transport):
+            if transport is not None:
+                transport.close()
+        if self._tcp is not None:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+        self._udp = self._tcp = self._upstream_transport = None
+
+    def clear(self):
+        self._cache.clear()
+        self._bytes = 0
+
+    async def resolve(self, message):
+        """The answer to one DNS message (bytes), or None for garbage that gets no answer; needs start()."""
+        response, _ = await self._resolve(message)
+        return response
+
+    async def _resolve(self, message):
+        try:
+            query = parse_query(message)
+        except MalformedMessage:
+            metrics.increment("dns_queries", result="malformed")
+            return None, None
+        if query is None:
+            # Not a plain query; pass it on as it is
+            metrics.increment("dns_queries", result="passthrough")
+            try:
+                return await self._ask_upstream(message), None
+            except Exception:
+                return None, None
+
+        now = self._clock()
+        entry = self._cache.get(query.key)
+        if entry is not None:
+            age = now - entry.stored
+            if age < entry.ttl:
+                self._cache.move_to_end(query.key)
+                metrics.increment("dns_queries", result="hit")
+                return _render(entry, query, now, stale=False), query
+            if age < entry.ttl + self.max_stale:
+                self._cache.move_to_end(query.key)
+                metrics.increment("dns_queries", result="stale")
+                self._revalidate(query, message)
+                return _render(entry, query, now, stale=True), query
+            self._drop(query.key)
+
+        metrics.increment("dns_queries", result="miss")
+        try:
+            response = await self._fetch(query, message)
+        except Exception as e:
+            logger.debug("DNS query failed upstream: %s", e)
+            metrics.increment("dns_upstream_failures")
+            return _servfail(query, message), query
+        return bytes(_reply(response, query)), query
+
+    def _fetch(self, query, message):
+        """Ask upstream once for all identical queries in flight; the answer is cached as it arrives."""
+        task = self._inflight.get(query.key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(query.key, message))
+            self._inflight[query.key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(query.key, None))
+        else:
+            metrics.increment("dns_collapsed")
+        # One client giving up must not cancel the query for the others
+        return asyncio.shield(task)
+
+    async def _fetch_and_store(self, key, message):
+        response = await self._ask_upstream(message)
+        try:
+            entry = cache_entry(response, self._clock())
+        except MalformedMessage:
+            entry = None
+        if entry is not None:
+            self._store(key, entry)
+        return response
+
+    def _revalidate(self, query, message):
+        if query.key in self._inflight:
+            return
+        task = asyncio.ensure_future(self._fetch(query, message))
+        self._background.add(task)
+        task.add_done_callback(self._revalidated)
+
+    def _revalidated(self, task):
+        self._background.discard(task)
+        # A failed refresh keeps serving the stale answer until max_stale
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug("DNS refresh failed: %s", task.exception())
+
+    def _store(self, key, entry):
+        self._drop(key)
+        self._cache[key] = entry
+        self._bytes += len(entry.message) + ENTRY_OVERHEAD
+        while self._cache and (len(self._cache) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._cache.popitem(last=False)
+            self._bytes -= len(evicted.message) + ENTRY_OVERHEAD
+            metrics.increment("dns_cache_evictions")
+        metrics.set_gauge("dns_cache_entries", len(self._cache))
+        metrics.set_gauge("dns_cache_bytes", self._bytes)
+
+    def _drop(self, key):
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.message) + ENTRY_OVERHEAD
+
+    async def _ask_upstream(self, message):
+        if self._upstream_transport is None:
+            raise Exception("DNS cache is not running")
+        query_id = random.getrandbits(16)
+        while query_id in self._pending:
+            query_id = random.getrandbits(16)
+        request = struct.pack("!H", query_id) + message[2:]
+        future = asyncio.get_running_loop().create_future()
+        self._pending[query_id] = (future, _read_question(message)[0].lower())
+        try:
+            for _ in range(UPSTREAM_ATTEMPTS):
+                self._upstream_transport.sendto(request)
+                try:
+                    response = await asyncio.wait_for(asyncio.shield(future), self.timeout / UPSTREAM_ATTEMPTS)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                raise Exception("DNS server %s did not answer" % self.upstream[0])
+        finally:
+            self._pending.pop(query_id, None)
+            future.cancel()
+
+        if HEADER.unpack_from(response)[1] & FLAG_TC:
+            response = await self._ask_upstream_tcp(message)
+        return response
+
+    def _upstream_received(self, data, addr):
+        if len(data) < HEADER.size:
+            return
+        pending = self._pending.get(struct.unpack_from("!H", data)[0])
+        if pending is None or pending[0].done():
+            return
+        future, question = pending
+        # Only an answer to the question we asked, so a guessed ID alone can't poison the cache
+        try:
+            if _read_question(data)[0].lower() == question:
+                future.set_result(data)
+        except MalformedMessage:
+            pass
+
+    async def _ask_upstream_tcp(self, message):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.upstream), self.timeout)
+        try:
+            writer.write(struct.pack("!H", len(message)) + message)
+            await writer.drain()
+            length, = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), self.timeout))
+            return await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        finally:
+            writer.close()
+
+    def _datagram_received(self, data, addr):
+        asyncio.ensure_future(self._answer_udp(data, addr))
+
+    async def _answer_udp(self, data, addr):
+        response, query = await self._resolve(data)
+        if response is None or self._udp is None:
+            return
+        if len(response) > (query.udp_size if query is not None else CLASSIC_UDP_SIZE):
+            # The client retries over TCP
+            response = _truncated(response)
+        self._udp.sendto(response, addr)
+
+    async def _serve_tcp(self, reader, writer):
+        try:
+            while True:
+                length, = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), TCP_IDLE_TIMEOUT))
+                response = await self.resolve(await reader.readexactly(length))
+                if response is None:
+                    break
+                writer.write(struct.pack("!H", len(response)) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def use_dns_cache(config_str, address=DNS_CACHE_ADDRESS):
+    """Point the config's DNS at the local cache; returns (config, the DNS servers it replaced)."""
+    lines = []
+    servers = []
+    section = None
+    for line in config_str.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped[1:-1].strip().lower()
+        elif section == "interface" and stripped.split("=", 1)[0].strip().lower() == "dns" and "=" in stripped:
+            entries = [entry.strip() for entry in stripped.split("=", 1)[1].split(",") if entry.strip()]
+            servers = [entry for entry in entries if _is_address(entry)]
+            if servers:
+                # Search domains stay as they are
+                line = "DNS = %s" % ", ".join([address] + [entry for entry in entries if not _is_address(entry)])
+        lines.append(line)
+    return "\n".join(lines) + ("\n" if config_str.endswith("\n") else ""), servers
+
+def _is_address(value):
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+class DnsCacheService:
+    """Keeps a DnsForwarder running on the network runtime while the tunnel is up.
+
+    `upstream()` names the DNS server to forward to (None: the running config
+    doesn't use the cache). The cache survives reconnects to the same server.
+    """
+
+    def __init__(self, upstream=None, listen=(DNS_CACHE_ADDRESS, DNS_PORT)):
+        self.upstream = upstream
+        self.listen = listen
+        self.forwarder = None
+
+    def follow(self, status_service, upstream=None):
+        """Start and stop with the tunnel; returns an unsubscribe function."""
+        if upstream is not None:
+            self.upstream = upstream
+        unsubscribe = status_service.subscribe(self._tunnel_changed)
+        if status_service.is_active():
+            self._tunnel_changed(True)
+        return unsubscribe
+
+    def _tunnel_changed(self, active):
+        # Status callbacks may come from any thread, the runtime's own included
+        if active:
+            server = self.upstream() if self.upstream is not None else None
+            if server:
+                get_runtime().submit(self._start(server.strip()))
+        else:
+            get_runtime().submit(self._stop())
+
+    async def _start(self, server):
+        if self.forwarder is not None and self.forwarder.upstream[0] != server:
+            await self.forwarder.stop()
+            self.forwarder = None
+        if self.forwarder is None:
+            self.forwarder = DnsForwarder(server, self.listen)
+        try:
+            await self.forwarder.start()
+        except OSError:
+            logger.error("Can't start the DNS cache on %s:%d, the tunnel has no DNS", *self.listen, exc_info=True)
+
+    async def _stop(self):
+        if self.forwarder is not None and self.forwarder.running:
+            await self.forwarder.stop()
+            logger.info("DNS cache stopped")
+
+    def stop(self, timeout=5.0):
+        """Close the forwarder's sockets (call before stopping the runtime)."""
+        if self.forwarder is not None:
+            get_runtime().run(self._stop(), timeout)
+
+_service = None
+
+def get_dns_cache():
+    global _service
+    if _service is None:
+        _service = DnsCacheService()
+    return _service
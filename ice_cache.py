@@ -0,0 +1,82 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import threading
+import time
+
+# Used when the mlIceConfig response carries no credential lifetime
+DEFAULT_TTL = 60.0
+
+# Stop serving cached credentials this long before they actually expire
+EXPIRY_MARGIN = 30.0
+
+def ice_config_ttl(iceConfig, now=None):
+    """Seconds the ICE servers in an mlIceConfig response stay usable.
+
+    Looks at a top-level `ttl`, per-server `ttl`/`lifetime` fields and
+    TURN REST style usernames (`<unix expiry>:<user>`), and returns the
+    shortest lifetime found, or DEFAULT_TTL if there is none.
+    """
+    now = time.time() if now is None else now
+    lifetimes = []
+
+    def add(value):
+        try:
+            lifetimes.append(float(value))
+        except (TypeError, ValueError):
+            pass
+
+    if "ttl" in iceConfig:
+        add(iceConfig["ttl"])
+
+    for server in iceConfig.get("servers") or []:
+        if not isinstance(server, dict):
+            continue
+        for key in ("ttl", "lifetime"):
+            if key in server:
+                add(server[key])
+        username = server.get("username")
+        if isinstance(username, str) and ":" in username:
+            expiry = username.split(":", 1)[0]
+            if expiry.isdigit():
+                lifetimes.append(int(expiry) - now)
+
+    if not lifetimes:
+        return DEFAULT_TTL
+    return min(lifetimes)
+
+class IceConfigCache:
+    """ICE server lists keyed by device token, dropped shortly before their credentials expire."""
+
+    def __init__(self, margin=EXPIRY_MARGIN, clock=time.monotonic):
+        self.margin = margin
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, deviceToken):
+        with self._lock:
+            entry = self._entries.get(deviceToken)
+            if entry is not None and entry[0] > self.clock():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(deviceToken, None)
+            self.misses += 1
+            return None
+
+    def put(self, deviceToken, iceConfig):
+        ttl = ice_config_ttl(iceConfig) - self.margin
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[deviceToken] = (self.clock() + ttl, iceConfig["servers"])
+
+    def invalidate(self, deviceToken):
+        with self._lock:
+            self._entries.pop(deviceToken, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,148 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import logging
+import multiprocessing
+import queue
+import re
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from tracing import metrics
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+# Everything that must never reach a log file, matched in one pass: device tokens
+# (request header and client access response), WireGuard private keys, TURN
+# credentials and ICE passwords
+SECRET_PATTERN = re.compile(
+    r"""(?P<prefix>x-devicetoken['"]?\s*[:=]\s*['"]?"""
+    r"""|"client_id"\s*:\s*"""
+    r"""|"credential"\s*:\s*"""
+    r"""|PrivateKey\s*=\s*"""
+    r"""|a=ice-pwd:)"""
+    r"""(?P<quote>"?)[^"'\s,}]+""",
+    re.IGNORECASE)
+
+# Argument types that cannot change between logging and formatting on the writer thread
+_IMMUTABLE_ARGS = (str, bytes, int, float, bool, type(None))
+
+def redact(text):
+    return SECRET_PATTERN.sub(r"\g<prefix>\g<quote>[REDACTED]", text)
+
+class RedactingFormatter(logging.Formatter):
+    """Formats as usual, then strips secrets from the whole line (traceback included)."""
+
+    def format(self, record):
+        return redact(super().format(record))
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting them or ever waiting.
+
+    Arguments that are plain values stay unformatted until the writer thread
+    gets to them; anything else is interpolated now, so the line shows the
+    object as it was when it was logged. A full queue drops the record.
+    """
+
+    def prepare(self, record):
+        if record.args and not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in
+                                   (record.args.values() if isinstance(record.args, dict) else record.args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("log_records_dropped")
+
+_listener = None
+_child_queue = None
+_lock = threading.Lock()
+
+def start_logging(log_file, level=logging.DEBUG, max_bytes=5 * 1024 * 1024, backup_count=3,
+                  queue_size=10000, console=False):
+    """Route the app logger through a bounded queue to one writer thread.
+
+    The rotating file (and optional console) handlers, formatting and
+    redaction all run on that thread.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        formatter = RedactingFormatter(LOG_FORMAT)
+        handlers = []
+
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        file_handler.setLevel(level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        logger.addHandler(NonBlockingQueueHandler(log_queue))
+        logger.setLevel(level)
+        # The queue handler is the only way out, don't also hand records to the root logger
+        logger.propagate = False
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+def get_child_log_queue():
+    """A queue worker processes can log into (see forward_logging), or None if logging isn't set up here."""
+    global _child_queue
+    with _lock:
+        if _listener is None:
+            return None
+        if _child_queue is None:
+            _child_queue = multiprocessing.get_context("spawn").Queue()
+            threading.Thread(target=_drain_child_queue, args=(_child_queue,), name="child-logs", daemon=True).start()
+        return _child_queue
+
+def _drain_child_queue(child_queue):
+    while True:
+        try:
+            record = child_queue.get()
+        except (EOFError, OSError):
+            break
+        if record is None:
+            break
+        logger.handle(record)
+
+def forward_logging(child_queue):
+    """In a worker process: send the app logger's records to the parent's writer thread."""
+    if child_queue is None:
+        return
+    logger.handlers.clear()
+    # Formatted (and later redacted) in the parent; a child has no file of its own
+    logger.addHandler(QueueHandler(child_queue))
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+def stop_logging():
+    """Write out whatever is still queued and stop the writer thread."""
+    global _listener, _child_queue
+    with _lock:
+        if _listener is None:
+            return
+        dropped = metrics.counter("log_records_dropped")
+        if dropped:
+            logger.warning("%d log records were dropped because the log queue was full", dropped)
+        if _child_queue is not None:
+            _child_queue.put(None)
+            _child_queue = None
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -1,38 +1,26 @@
 # Copyright (c) 2026 Jeff Nedley
 # Licensed under the MIT License (see LICENSE for details)
 
-import asyncio
+import time
+
+STARTED = time.perf_counter()
+
+import importlib
 import logging
-import os
+import multiprocessing
 import sys
-import subprocess
-import time
+import threading
 import ctypes
-import pystray
-from PIL import Image
-from logging.handlers import RotatingFileHandler
 
-from config import CONFIG_PATH, TOKEN_FILE, UUID_FILE, WG_EXE, ICON_PATH
-from tunnel import generate_config, activate_tunnel, deactivate_tunnel, is_tunnel_active
-from ui import custom_pin_dialog, custom_confirm_dialog, open_options_window
-from notifications import show_toast
+from config import LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, ICON_PATH, KEY_POOL_SIZE, SUPERVISOR_ENABLED, DNS_CACHE_ENABLED, WORKER_PROCESSES, TRACING_ENABLED, TRACE_FILE, METRICS_PORT
+from logsetup import start_logging, stop_logging
+import tracing
 
 logger = logging.getLogger("AmpliFi Teleport for Desktop")
-logger.setLevel(logging.DEBUG)
-
-# File handler
-file_handler = RotatingFileHandler(
-    "amplifi_teleport.log",
-    maxBytes=5 * 1024 * 1024,
-    backupCount=3,
-    encoding='utf-8'
-)
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
-))
-
-logger.addHandler(file_handler)
+
+# Only needed once the user connects; imported in the background after the tray is up
+# (wgkeys also fills the key pool, teleport pulls in aiortc, aioice and aiohttp)
+PREWARM_MODULES = ("wgkeys", "teleport")
 
 def is_admin():
     try:
@@ -45,13 +33,76 @@ def run_elevated():
         ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
         sys.exit(0)
 
-def main():
-    run_elevated()
+# Set while the control window runs in its own process (WORKER_PROCESSES)
+_window_process = None
+_quit = threading.Event()
+
+# In-process window: None until main() starts building it, "pending" while ui
+# loads and the window is built, then "open". Only the main thread builds it.
+_window_lock = threading.Lock()
+_window_state = None
+_quit_requested = False
+
+def open_controls(icon):
+    global _window_state
+    if _window_process is not None:
+        _window_process.show()
+        return
+    with _window_lock:
+        if _window_state != "open":
+            if _window_state is None and threading.current_thread() is threading.main_thread():
+                _window_state = "pending"
+            else:
+                # A tray click while the window is being built: it shows itself once built
+                return
+    from ui import open_options_window
+    open_options_window(icon, on_ready=_window_ready)
+
+def _window_ready(window):
+    """Called on the main thread once the window exists, before its main loop runs."""
+    global _window_state
+    with _window_lock:
+        _window_state = "open"
+        quit_requested = _quit_requested
+    if quit_requested:
+        window.request_quit()
+
+def quit_app(icon):
+    global _quit_requested
+    if _window_process is None:
+        with _window_lock:
+            if _window_state != "open":
+                # The main thread ends the window as soon as it is built
+                _quit_requested = True
+        from ui import quit_application
+        quit_application(icon)
+        return
+    from dnscache import get_dns_cache
+    from notifications import get_dispatcher
+    from runtime import get_runtime
+    from supervisor import get_supervisor
+    from tunnel_status import get_status_service
+    from workers import get_negotiator
+
+    get_supervisor().stop()
+    get_status_service().stop()
+    get_dns_cache().stop()
+    get_runtime().stop()
+    _window_process.stop()
+    get_negotiator().shutdown()
+    get_dispatcher().stop()
+    icon.stop()
+    _quit.set()
+
+def create_tray_icon():
+    # Imported here: worker processes re-import this module and must not load them
+    import pystray
+    from PIL import Image
 
     image = Image.open(ICON_PATH)
 
     menu = pystray.Menu(
-        pystray.MenuItem("Quit", lambda: [sys.exit(0)])
+        pystray.MenuItem("Quit", lambda: quit_app(icon))
     )
 
     icon = pystray.Icon(
@@ -59,16 +110,109 @@ def main():
         image,
         "AmpliFi Teleport for Desktop",
         menu=pystray.Menu(
-            pystray.MenuItem("Open Controls", lambda: open_options_window(icon), default=True, visible=False),
+            pystray.MenuItem("Open Controls", lambda: open_controls(icon), default=True, visible=False),
             *menu.items
         )
     )
-    
+    return icon
+
+def prewarm(modules=PREWARM_MODULES):
+    """Import the heavy modules on a background thread so the first Connect doesn't wait for them."""
+    def run():
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                module = importlib.import_module(name)
+            except Exception:
+                logger.warning("Error while pre-loading %s", name, exc_info=True)
+                continue
+            logger.debug("Pre-loaded %s in %.0fms", name, (time.perf_counter() - start) * 1000)
+            if name == "wgkeys":
+                module.start_key_pool(KEY_POOL_SIZE)
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+def start_worker_mode(icon):
+    """Keep only status, supervision and IPC here; window and negotiations get their own processes."""
+    global _window_process
+    from notifications import show_toast
+    from supervisor import get_supervisor
+    from tunnel import use_negotiator
+    from tunnel_status import get_status_service
+    from workers import WindowProcess, get_negotiator
+
+    use_negotiator(get_negotiator())
+    _window_process = WindowProcess({
+        "toast": lambda title, message: show_toast(title, message),
+        "cancel_supervisor": lambda: get_supervisor().cancel(),
+        "negotiate": negotiate_for_window,
+        "quit": lambda: quit_app(icon),
+    })
+    # Recoveries and refreshes then find keys, HTTP connections and ICE config ready
+    get_status_service().subscribe(get_negotiator().keep_warm)
+
+def negotiate_for_window(request_id, func, args):
+    """Run a negotiation for the window process in the shared negotiator and send back the outcome."""
+    from tunnel import _negotiate_config
+    from workers import get_negotiator
+
+    def done(future):
+        error = future.exception()
+        _window_process.send("negotiated", request_id, None if error else future.result(), error)
+
+    if func is not _negotiate_config:
+        _window_process.send("negotiated", request_id, None, Exception("Not a negotiation: %r" % (func,)))
+        return
+    get_negotiator().submit(func, *args).add_done_callback(done)
+
+def main():
+    run_elevated()
+
+    # The tray runs on its own thread; the main thread keeps Tk (or, with worker
+    # processes, just waits for Quit)
+    icon = create_tray_icon()
+    icon.run_detached()
+    logger.info("Tray icon shown %.0fms after start", (time.perf_counter() - STARTED) * 1000)
+
+    if TRACING_ENABLED:
+        tracing.enable(TRACE_FILE)
+        if METRICS_PORT:
+            tracing.start_metrics_server(METRICS_PORT)
+
+    if WORKER_PROCESSES:
+        start_worker_mode(icon)
+    else:
+        prewarm()
+        from runtime import get_runtime
+        get_runtime().start()
+
+    from tunnel_status import get_status_service
+    from supervisor import get_supervisor
+
+    if DNS_CACHE_ENABLED:
+        # The tunnel's DNS is the local cache, so it runs here for as long as the tunnel does
+        from dnscache import get_dns_cache
+        from tunnel import dns_upstream
+        get_dns_cache().follow(get_status_service(), dns_upstream)
+    get_status_service().start()
+    if SUPERVISOR_ENABLED:
+        get_supervisor().start()
+
     logger.info("Application started!")
-    open_options_window(icon)
-    
-    icon.run()
+
+    open_controls(icon)
+    if WORKER_PROCESSES:
+        # The tray thread and the workers do the rest; stay alive until Quit
+        _quit.wait()
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    main()
\ No newline at end of file
+    # Worker processes of the frozen .exe start through this same entry point
+    multiprocessing.freeze_support()
+    # File writes, rotation and redaction happen on one writer thread
+    start_logging(LOG_FILE, logging.DEBUG, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, console=True)
+    try:
+        main()
+    finally:
+        stop_logging()
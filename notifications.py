@@ -1,22 +1,142 @@
 # Copyright (c) 2026 Jeff Nedley
 # Licensed under the MIT License (see LICENSE for details)
 
-from plyer import notification
 import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
 
-from config import ICON_PATH
+from config import ICON_PATH, NOTIFY_MIN_INTERVAL, NOTIFY_COALESCE_WINDOW
 
 logger = logging.getLogger("AmpliFi Teleport for Desktop")
 
-def show_toast(title, message, icon_path=None):
-    try:
-        notification.notify(
+class PlyerBackend:
+    """Native desktop notifications (Windows toasts) through plyer."""
+
+    def __init__(self, icon_path=ICON_PATH):
+        from plyer import notification
+        self._notification = notification
+        self.icon_path = icon_path
+
+    def notify(self, title, message):
+        self._notification.notify(
             title=title,
             message=message,
             app_name="AmpliFi Teleport for Desktop",
-            app_icon=ICON_PATH,
+            app_icon=self.icon_path,
             timeout=5,
             ticker="Notification"
         )
-    except Exception as e:
-        logger.error("Error while creating Windows 11 Toast Notification", exc_info=True)
\ No newline at end of file
+
+class MemoryBackend:
+    """Keeps shown notifications in a list, for tests and benchmarks."""
+
+    def __init__(self):
+        self.shown = []
+        self._condition = threading.Condition()
+
+    def notify(self, title, message):
+        with self._condition:
+            self.shown.append((title, message))
+            self._condition.notify_all()
+
+    def wait_for(self, count, timeout):
+        """Block until `count` notifications were shown; returns whether that happened in time."""
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self.shown) >= count, timeout)
+
+class NotificationDispatcher:
+    """Shows notifications from a background worker so posting never waits.
+
+    Notifications posted within `coalesce_window` of each other are merged
+    per key (the latest message wins), and batches of toasts are at least
+    `min_interval` apart; whatever arrives in the meantime is merged too.
+    """
+
+    def __init__(self, backend=None, min_interval=NOTIFY_MIN_INTERVAL, coalesce_window=NOTIFY_COALESCE_WINDOW):
+        self._backend = backend
+        self.min_interval = min_interval
+        self.coalesce_window = coalesce_window
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_shown = 0.0
+        self.posted = 0
+        self.shown = 0
+
+    @property
+    def backend(self):
+        with self._lock:
+            if self._backend is None:
+                self._backend = PlyerBackend()
+            return self._backend
+
+    def set_backend(self, backend):
+        with self._lock:
+            self._backend = backend
+
+    def post(self, title, message, key=None):
+        """Queue a notification; posts sharing a key (the title by default) replace each other."""
+        self.posted += 1
+        self._queue.put((key or title, title, message))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                    self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the worker once it has shown what it already collected (waiting up to `timeout` for that)."""
+        thread = self._thread
+        self._queue.put(None)
+        if timeout and thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            pending = OrderedDict()
+            stopping = self._collect(item, pending)
+            for title, message in pending.values():
+                self._show(title, message)
+            if stopping:
+                break
+        with self._lock:
+            self._thread = None
+
+    def _collect(self, item, pending):
+        """Merge everything that arrives until the burst is over and the rate limit allows a toast."""
+        deadline = max(time.monotonic() + self.coalesce_window, self._last_shown + self.min_interval)
+        while True:
+            key, title, message = item
+            pending.pop(key, None)
+            pending[key] = (title, message)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if item is None:
+                return True
+
+    def _show(self, title, message):
+        self._last_shown = time.monotonic()
+        self.shown += 1
+        try:
+            self.backend.notify(title, message)
+        except Exception:
+            logger.error("Error while creating Windows 11 Toast Notification", exc_info=True)
+
+_dispatcher = NotificationDispatcher()
+
+def get_dispatcher():
+    return _dispatcher
+
+def show_toast(title, message, icon_path=None, key=None):
+    """Post a notification; returns immediately, the toast is shown by the dispatcher's worker."""
+    _dispatcher.post(title, message, key)
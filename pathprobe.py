@@ -0,0 +1,195 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import logging
+import socket
+import sys
+from collections import namedtuple
+
+from aioice import stun
+
+from candidates import is_relayed
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# Outer packet sizes probed with the don't-fragment bit set: Ethernet, PPPoE,
+# PPPoE over VLAN and the common LTE/tunnelled uplinks, down to the IPv6 minimum
+MTU_LADDER = (1500, 1492, 1480, 1472, 1460, 1440, 1428, 1420, 1400, 1380, 1360, 1340, 1300, 1280)
+
+# Every size is sent this many times at once, so a single lost probe does not lower the MTU
+PROBE_TRANSMISSIONS = 2
+PROBE_TIMEOUT = 0.5
+# Once some probe is answered, the larger ones get this many times its RTT (at least
+# PROBE_MIN_GRACE seconds) to answer too; a path that drops them costs little more than one RTT
+PROBE_GRACE_FACTOR = 3.0
+PROBE_MIN_GRACE = 0.05
+
+# IP + UDP headers around a probe, and IP + UDP + WireGuard data header around a tunnel packet
+IP_UDP_OVERHEAD = {socket.AF_INET: 28, socket.AF_INET6: 48}
+WIREGUARD_OVERHEAD = {socket.AF_INET: 60, socket.AF_INET6: 80}
+
+# MESSAGE-INTEGRITY and FINGERPRINT, appended by the STUN protocol when the request is sent
+STUN_TRAILER = 24 + 8
+# Type and length of the attribute carrying the padding
+ATTRIBUTE_HEADER = 4
+# RFC 5780 PADDING, which aioice doesn't know; registered below so requests can carry it
+PADDING_ATTRIBUTE = (0x0026, "PADDING", stun.pack_bytes, stun.unpack_bytes)
+
+# UDP mappings of carrier-grade and LTE NATs can expire after 30 seconds of silence
+# (RFC 4787 asks for 2 minutes, many don't); 25 is what WireGuard recommends
+NAT_KEEPALIVE = 25
+
+# mtu/path_mtu are None when the probe could not tell (keep WireGuard's default),
+# keepalive is None when nothing between us and the router needs keeping alive
+PathInfo = namedtuple("PathInfo", ["path_mtu", "mtu", "nat", "keepalive"])
+
+def _register_padding():
+    if PADDING_ATTRIBUTE[1] not in stun.ATTRIBUTES_BY_NAME:
+        stun.ATTRIBUTES.append(PADDING_ATTRIBUTE)
+        stun.ATTRIBUTES_BY_NAME[PADDING_ATTRIBUTE[1]] = PADDING_ATTRIBUTE
+        stun.ATTRIBUTES_BY_TYPE[PADDING_ATTRIBUTE[0]] = PADDING_ATTRIBUTE
+
+_register_padding()
+
+def _family(addr):
+    return socket.AF_INET6 if ":" in addr[0] else socket.AF_INET
+
+def _dont_fragment_option(family):
+    """(level, option, value) that makes the OS set DF instead of fragmenting, or None."""
+    if sys.platform.startswith("linux"):
+        # IP_MTU_DISCOVER / IPV6_MTU_DISCOVER = IP_PMTUDISC_PROBE: DF set, cached path MTU ignored
+        return (socket.IPPROTO_IP, 10, 3) if family == socket.AF_INET else (socket.IPPROTO_IPV6, 23, 3)
+    if sys.platform == "win32":
+        # IP_DONTFRAGMENT / IPV6_DONTFRAG
+        return (socket.IPPROTO_IP, 14, 1) if family == socket.AF_INET else (socket.IPPROTO_IPV6, 14, 1)
+    if sys.platform == "darwin":
+        # IP_DONTFRAG / IPV6_DONTFRAG
+        return (socket.IPPROTO_IP, 28, 1) if family == socket.AF_INET else (socket.IPPROTO_IPV6, 62, 1)
+    return None
+
+def set_dont_fragment(sock, family):
+    """Set DF on `sock`; returns a function that restores the previous setting, or None if unsupported."""
+    option = _dont_fragment_option(family)
+    if sock is None or option is None:
+        return None
+    level, name, value = option
+    try:
+        previous = sock.getsockopt(level, name)
+        sock.setsockopt(level, name, value)
+    except OSError:
+        logger.debug("Can't set the don't-fragment bit on %s", sock, exc_info=True)
+        return None
+    return lambda: sock.setsockopt(level, name, previous)
+
+def build_probe(connection, pair, size=None):
+    """A binding request for `pair` padded so its IP packet is `size` bytes (unpadded for None).
+
+    The padding goes into a PADDING attribute (RFC 5780); an agent that doesn't
+    know it answers with an error, which still proves the packet arrived.
+    Returns None when `size` is too small to hold the request.
+    """
+    request = connection.build_request(pair, nominate=False)
+    if size is None:
+        return request
+    unpadded = len(bytes(request)) + STUN_TRAILER + ATTRIBUTE_HEADER
+    padding = size - IP_UDP_OVERHEAD[_family(pair.remote_addr)] - unpadded
+    if padding < 0:
+        return None
+    # Attribute values are padded to 4 bytes on the wire, so keep it exact
+    request.attributes["PADDING"] = bytes(padding - padding % 4)
+    return request
+
+async def _send_probe(connection, pair, request, size):
+    """(size, mapped address) once the router answers the probe, None if it never does."""
+    try:
+        response, _ = await pair.protocol.request(
+            request,
+            pair.remote_addr,
+            integrity_key=connection.remote_password.encode("utf8"),
+            retransmissions=0)
+    except stun.TransactionFailed as e:
+        # An error response still proves the packet made it
+        return size, e.response.attributes.get("XOR-MAPPED-ADDRESS")
+    except stun.TransactionError:
+        return None
+    return size, response.attributes.get("XOR-MAPPED-ADDRESS")
+
+async def probe_path(connection, pair, ladder=MTU_LADDER, timeout=PROBE_TIMEOUT):
+    """Find the largest packet the path to the router carries unfragmented, and whether we're behind a NAT.
+
+    All sizes of `ladder` are probed at once over the pair's own socket, plus
+    an unpadded request whose XOR-MAPPED-ADDRESS tells whether the router sees
+    us at the address we send from. Relayed pairs are not size-probed (the TURN
+    framing around the probes is not ours to measure) but always get a keepalive.
+    """
+    family = _family(pair.remote_addr)
+    relayed = is_relayed(pair)
+    restore = None
+    if not relayed:
+        transport = getattr(pair.protocol, "transport", None)
+        restore = set_dont_fragment(transport.get_extra_info("socket") if transport else None, family)
+    sizes = ladder if restore is not None else ()
+
+    probes = [(None, build_probe(connection, pair))]
+    for size in sizes:
+        for _ in range(PROBE_TRANSMISSIONS):
+            request = build_probe(connection, pair, size)
+            if request is not None:
+                probes.append((size, request))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout
+    pending = {asyncio.ensure_future(_send_probe(connection, pair, request, size)) for size, request in probes}
+    largest = max(sizes, default=None)
+    answered = False
+    path_mtu = None
+    mapped = None
+    try:
+        # Done early once the largest size (or, without sizes, anything) got through
+        while pending and not (answered and path_mtu == largest):
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                result = task.result()
+                if result is None:
+                    continue
+                size, address = result
+                mapped = mapped or address
+                if size is not None and (path_mtu is None or size > path_mtu):
+                    path_mtu = size
+                if not answered:
+                    answered = True
+                    rtt = loop.time() - start
+                    deadline = min(deadline, loop.time() + max(rtt * PROBE_GRACE_FACTOR, PROBE_MIN_GRACE))
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        if restore is not None:
+            try:
+                restore()
+            except OSError:
+                pass
+
+    if mapped is None:
+        # Can't tell, assume the common case of a NAT in between
+        nat = None
+    else:
+        nat = tuple(mapped[:2]) != tuple(pair.local_addr[:2])
+    keepalive = NAT_KEEPALIVE if (relayed or nat is not False) else None
+    mtu = path_mtu - WIREGUARD_OVERHEAD[family] if path_mtu is not None else None
+    info = PathInfo(path_mtu, mtu, nat, keepalive)
+
+    logger.info("Path to %s: MTU %s (tunnel MTU %s), %s, keepalive %s", pair.remote_addr,
+                path_mtu or "unknown", mtu or "default",
+                "relayed" if relayed else {True: "behind NAT", False: "no NAT", None: "NAT unknown"}[nat],
+                "%ds" % keepalive if keepalive else "off")
+    if not answered:
+        logger.warning("No answer to the path probe, keeping the default MTU")
+    elif sizes and path_mtu is None:
+        logger.info("Only the unpadded probe was answered, the router may drop padded requests; keeping the default MTU")
+    return info
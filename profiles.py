@@ -0,0 +1,268 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+from config import PROFILES_DIR, CONFIG_PATH, TOKEN_FILE, UUID_FILE
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+DEFAULT_PROFILE = "default"
+INDEX_FILE = "index.json"
+
+# File names inside a profile's directory; the config keeps the name the
+# tunnel service derives the interface name ("teleport") from
+PROFILE_FILES = {
+    "client_hint": "client_hint",
+    "device_token": "device_token",
+    "config": "teleport.conf",
+    "endpoint": "endpoint",
+    "dns_upstream": "dns_upstream",
+}
+
+def atomic_write(path, data):
+    """Replace `path` with `data` (str or bytes) so readers see the old or the new file, never half of one.
+
+    Returns False without touching the file when it already holds exactly `data`.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+def profile_id(name):
+    """Directory-safe id for a profile name ("Office #2" -> "office-2")."""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or DEFAULT_PROFILE
+
+class Profile:
+    """One router: client hint, device token, last config, last-good endpoint and DNS server, one file each.
+
+    Fields are read on first use and cached against the file's size and mtime,
+    so a profile only ever touches its own files.
+    """
+
+    def __init__(self, store, profile_id, name):
+        self.store = store
+        self.id = profile_id
+        self.name = name
+        self.directory = os.path.join(store.directory, profile_id)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def path(self, field):
+        return os.path.join(self.directory, PROFILE_FILES[field])
+
+    @property
+    def config_path(self):
+        return self.path("config")
+
+    def get(self, field):
+        """The field's value, or None if it was never set."""
+        path = self.path(field)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._cache.pop(field, None)
+                return None
+            key = (stat.st_mtime_ns, stat.st_size)
+            cached = self._cache.get(field)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            with open(path, 'r', encoding="utf-8") as f:
+                value = f.read()
+            self._cache[field] = (key, value)
+            return value
+
+    def set(self, field, value):
+        """Store a field atomically; returns False if it already had exactly this value."""
+        path = self.path(field)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            written = atomic_write(path, value)
+            stat = os.stat(path)
+            self._cache[field] = ((stat.st_mtime_ns, stat.st_size), value)
+        if written:
+            logger.debug("Profile %s: %s updated", self.id, field)
+        return written
+
+    def has(self, field):
+        return os.path.exists(self.path(field))
+
+    def clear(self, *fields):
+        with self._lock:
+            for field in fields or PROFILE_FILES:
+                self._cache.pop(field, None)
+                try:
+                    os.remove(self.path(field))
+                except FileNotFoundError:
+                    pass
+
+    client_hint = property(lambda self: self.get("client_hint"))
+    device_token = property(lambda self: self.get("device_token"))
+    config = property(lambda self: self.get("config"))
+    endpoint = property(lambda self: self.get("endpoint"))
+    dns_upstream = property(lambda self: self.get("dns_upstream"))
+
+class ProfileStore:
+    """All router profiles, indexed by id in one small JSON file.
+
+    The index is read once; lookups are dict lookups and switching profiles
+    only rewrites the index.
+    """
+
+    def __init__(self, directory=PROFILES_DIR):
+        self.directory = directory
+        # Only the real store adopts the files of single-router versions
+        self.import_legacy = directory == PROFILES_DIR
+        self._lock = threading.RLock()
+        self._profiles = None
+        self._meta = None
+        self._active = None
+        self._index_key = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load(self):
+        """Read the index, again only if another process changed it since."""
+        try:
+            stat = os.stat(self.index_path)
+            key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        if self._profiles is not None and key == self._index_key:
+            return
+
+        if key is None:
+            os.makedirs(self.directory, exist_ok=True)
+            index = {"active": DEFAULT_PROFILE, "profiles": {DEFAULT_PROFILE: {"name": "Default"}}}
+            if self.import_legacy:
+                self._import_legacy_files()
+        else:
+            with open(self.index_path, 'r', encoding="utf-8") as f:
+                index = json.load(f)
+
+        known = self._profiles or {}
+        self._meta = index["profiles"]
+        self._profiles = {
+            pid: known.get(pid) or Profile(self, pid, meta.get("name", pid)) for pid, meta in self._meta.items()}
+        self._active = index.get("active") if index.get("active") in self._profiles else None
+        if key is None:
+            self._save()
+        else:
+            self._index_key = key
+
+    def _import_legacy_files(self):
+        """Move the single-router files of earlier versions into the default profile."""
+        legacy = {"client_hint": UUID_FILE, "device_token": TOKEN_FILE, "config": CONFIG_PATH}
+        profile_dir = os.path.join(self.directory, DEFAULT_PROFILE)
+        for field, legacy_path in legacy.items():
+            if os.path.exists(legacy_path):
+                os.makedirs(profile_dir, exist_ok=True)
+                shutil.move(legacy_path, os.path.join(profile_dir, PROFILE_FILES[field]))
+                logger.info("Moved %s into the default profile", os.path.basename(legacy_path))
+
+    def _save(self):
+        index = {"active": self._active, "profiles": self._meta}
+        atomic_write(self.index_path, json.dumps(index, indent=2, sort_keys=True))
+        stat = os.stat(self.index_path)
+        self._index_key = (stat.st_mtime_ns, stat.st_size)
+
+    def list(self):
+        with self._lock:
+            self._load()
+            return list(self._profiles.values())
+
+    def get(self, profile_id):
+        with self._lock:
+            self._load()
+            return self._profiles.get(profile_id)
+
+    def create(self, name):
+        """Add a profile (or return the existing one with the same id)."""
+        with self._lock:
+            self._load()
+            pid = profile_id(name)
+            if pid not in self._profiles:
+                self._profiles[pid] = Profile(self, pid, name)
+                self._meta[pid] = {"name": name, "created": int(time.time())}
+                os.makedirs(self._profiles[pid].directory, exist_ok=True)
+                self._save()
+            return self._profiles[pid]
+
+    def delete(self, profile_id):
+        with self._lock:
+            self._load()
+            profile = self._profiles.pop(profile_id, None)
+            if profile is None:
+                return False
+            del self._meta[profile_id]
+            if self._active == profile_id:
+                self._active = next(iter(self._profiles), None)
+            self._save()
+        shutil.rmtree(profile.directory, ignore_errors=True)
+        return True
+
+    def active(self):
+        """The profile connect/refresh work on; created on first use."""
+        with self._lock:
+            self._load()
+            if self._active is None:
+                self._active = DEFAULT_PROFILE
+                if DEFAULT_PROFILE not in self._profiles:
+                    self._profiles[DEFAULT_PROFILE] = Profile(self, DEFAULT_PROFILE, "Default")
+                    self._meta[DEFAULT_PROFILE] = {"name": "Default"}
+                self._save()
+            return self._profiles[self._active]
+
+    def switch(self, profile_id):
+        with self._lock:
+            self._load()
+            if profile_id not in self._profiles:
+                raise Exception("Unknown profile: %s" % profile_id)
+            if self._active != profile_id:
+                self._active = profile_id
+                self._save()
+            return self._profiles[profile_id]
+
+_store = None
+
+def get_profile_store():
+    global _store
+    if _store is None:
+        _store = ProfileStore()
+    return _store
+
+def set_profile_store(store):
+    global _store
+    _store = store
+    return store
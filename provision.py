@@ -0,0 +1,224 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Headless provisioning: negotiate WireGuard configs for many device tokens at once.
+
+As a library, provision(jobs) yields a ProvisionResult per job as soon as
+that job finishes; provision_stream(jobs) is the same as an async generator
+for code already running on an event loop.
+
+As a command, results are printed as JSON lines while they come in:
+
+    python provision.py --tokens tokens.txt [--concurrency 8] [--rate 4] [--output-dir DIR]
+    python provision.py --profiles all|ID,ID [--save]
+
+A tokens file has one job per line, "name token" or just "token"
+(lines starting with # are skipped). With --save, each line adds (or
+updates) the router profile of that name, which the app then offers in
+its router selector.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from collections import namedtuple
+
+from profiles import atomic_write, get_profile_store, profile_id
+from runtime import get_runtime
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE = 2.0
+JOB_TIMEOUT = 45
+
+ProvisionJob = namedtuple("ProvisionJob", ["name", "device_token", "profile_id"])
+ProvisionJob.__new__.__defaults__ = (None,)
+
+# config is None when the job failed; error_type/error then say why
+ProvisionResult = namedtuple("ProvisionResult", ["name", "profile_id", "config", "error_type", "error", "seconds"])
+
+class RateLimiter:
+    """Lets at most `rate` starts through per second, evenly spaced (0 or None: no limit)."""
+
+    def __init__(self, rate, clock=time.monotonic):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._clock = clock
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = self._clock()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def jobs_from_tokens(lines):
+    jobs = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split()
+        if len(fields) == 1:
+            jobs.append(ProvisionJob("token-%d" % number, fields[0]))
+        else:
+            jobs.append(ProvisionJob(fields[0], fields[-1]))
+    return jobs
+
+def jobs_from_profiles(profile_ids=None):
+    """Jobs for the given profiles (all of them by default) that have a device token."""
+    store = get_profile_store()
+    if profile_ids is None:
+        profiles = store.list()
+    else:
+        profiles = []
+        for pid in profile_ids:
+            profile = store.get(pid)
+            if profile is None:
+                raise Exception("Unknown profile: %s" % pid)
+            profiles.append(profile)
+
+    jobs = []
+    for profile in profiles:
+        token = profile.device_token
+        if token is None:
+            logger.warning("Profile %s has no device token, skipping it", profile.id)
+            continue
+        jobs.append(ProvisionJob(profile.name, token.strip(), profile.id))
+    return jobs
+
+def add_profiles(jobs):
+    """Store each job's device token in the profile named after it, created if needed."""
+    store = get_profile_store()
+    added = []
+    for job in jobs:
+        profile = store.get(job.profile_id) if job.profile_id else store.create(job.name)
+        profile.set("device_token", job.device_token)
+        added.append(job._replace(profile_id=profile.id))
+    return added
+
+async def _run_job(job, limiter, timeout):
+    from teleport import negotiate
+
+    await limiter.acquire()
+    start = time.perf_counter()
+    try:
+        config = await negotiate(job.device_token, timeout)
+        return ProvisionResult(job.name, job.profile_id, config, None, None, time.perf_counter() - start)
+    except Exception as e:
+        return ProvisionResult(job.name, job.profile_id, None, type(e).__name__, str(e) or repr(e),
+                               time.perf_counter() - start)
+
+async def provision_stream(jobs, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, timeout=JOB_TIMEOUT):
+    """Negotiate every job, at most `concurrency` at a time; yields results in completion order."""
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(job):
+        async with semaphore:
+            return await _run_job(job, limiter, timeout)
+
+    tasks = [asyncio.ensure_future(bounded(job)) for job in jobs]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def provision(jobs, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, timeout=JOB_TIMEOUT):
+    """Blocking generator over provision_stream, run on the network runtime."""
+    results = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for result in provision_stream(jobs, concurrency, rate, timeout):
+                results.put(result)
+        finally:
+            results.put(done)
+
+    future = get_runtime().submit(pump())
+    try:
+        while True:
+            result = results.get()
+            if result is done:
+                break
+            yield result
+        future.result()
+    finally:
+        future.cancel()
+
+def _save(result, output_dir, save_profiles):
+    if result.config is None:
+        return None
+    if save_profiles and result.profile_id:
+        # The same config (DNS cache, recorded upstream and endpoint) the app would store
+        from tunnel import store_config
+        profile = get_profile_store().get(result.profile_id)
+        store_config(result.config, profile)
+        return profile.config_path
+    if output_dir:
+        path = os.path.join(output_dir, profile_id(result.name) + ".conf")
+        atomic_write(path, result.config)
+        return path
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Negotiate WireGuard configs for many AmpliFi device tokens.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tokens", help="file with one 'name token' per line, - for stdin")
+    source.add_argument("--profiles", help="'all' or comma-separated profile ids")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="negotiations at a time")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="negotiations started per second (0: no limit)")
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="seconds per negotiation")
+    parser.add_argument("--output-dir", help="write each config to DIR/<name>.conf")
+    parser.add_argument("--save", action="store_true", help="store configs in their profiles (adding one per token)")
+    parser.add_argument("--include-config", action="store_true", help="put the config itself in the output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+
+    if args.tokens:
+        if args.tokens == "-":
+            jobs = jobs_from_tokens(sys.stdin)
+        else:
+            with open(args.tokens, 'r') as f:
+                jobs = jobs_from_tokens(f)
+        if args.save:
+            jobs = add_profiles(jobs)
+    else:
+        jobs = jobs_from_profiles(None if args.profiles == "all" else args.profiles.split(","))
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    try:
+        for result in provision(jobs, args.concurrency, args.rate, args.timeout):
+            record = {"name": result.name, "profile": result.profile_id, "ok": result.config is not None,
+                      "seconds": round(result.seconds, 3)}
+            if result.config is None:
+                failed += 1
+                record["error"] = {"type": result.error_type, "message": result.error}
+            else:
+                record["path"] = _save(result, args.output_dir, args.save)
+                if args.include_config:
+                    record["config"] = result.config
+            print(json.dumps(record), flush=True)
+    finally:
+        from teleport import shutdown
+        shutdown()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+class DeadlineExceeded(Exception):
+    """The overall time budget of an operation has been used up."""
+
+class PhaseTimeout(Exception):
+    """A single phase ran past its own budget (the attempt may be retried)."""
+
+class Deadline:
+    """A fixed point in time that every phase of an operation has to finish before."""
+
+    def __init__(self, timeout, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self.expires = clock() + timeout
+
+    def remaining(self):
+        return max(0.0, self.expires - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def budget(self, phase_budget=None):
+        """Time a phase may take: its own budget, capped by what is left overall."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Timed out after %.0fs" % self.timeout)
+        if phase_budget is None:
+            return remaining
+        return min(phase_budget, remaining)
+
+async def run_phase(name, awaitable, deadline, phase_budget=None):
+    """Await `awaitable` within its phase budget, cancelling it if it stalls."""
+    timeout = deadline.budget(phase_budget)
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if deadline.expired():
+            raise DeadlineExceeded("%s timed out (overall deadline of %.0fs reached)" % (name, deadline.timeout))
+        raise PhaseTimeout("%s timed out after %.1fs" % (name, timeout))
+
+class CircuitBreaker:
+    """Stops retrying after `threshold` failures in a row, for `cooldown` seconds.
+
+    Once the cooldown has passed a single trial attempt is let through
+    (half-open); its outcome closes the breaker again or restarts the cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=300.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self._clock() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        return self.state != "open"
+
+    def retry_in(self):
+        """Seconds until the next attempt is allowed."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - self._clock())
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = self._clock()
+
+def backoff_delays(base=0.5, cap=10.0, factor=2.0, rng=random.random):
+    """Endless "full jitter" exponential backoff: uniform in [0, min(cap, base * factor**n)]."""
+    attempt = 0
+    while True:
+        yield rng() * min(cap, base * factor ** attempt)
+        attempt += 1
+
+async def retry_async(func, deadline, retry_on=(Exception,), max_attempts=None,
+                      base_delay=0.5, max_delay=10.0, min_attempt_time=1.0):
+    """Call `func(attempt)` until it succeeds, with jittered backoff, within `deadline`.
+
+    Gives up with the last error once another backoff plus `min_attempt_time`
+    would no longer fit in the remaining budget.
+    """
+    delays = backoff_delays(base_delay, max_delay)
+    attempt = 1
+    while True:
+        try:
+            return await func(attempt)
+        except retry_on as e:
+            if max_attempts is not None and attempt >= max_attempts:
+                raise
+            delay = next(delays)
+            if deadline.remaining() < delay + min_attempt_time:
+                raise
+            logger.warning("Attempt %d failed (%s), retrying in %.1fs", attempt, e, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
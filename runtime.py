@@ -0,0 +1,84 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+class AsyncRuntime:
+    """One long-lived event loop thread that owns all aiortc and HTTP work.
+
+    Other threads (Tk, tray, workers) hand coroutines to `submit` and get a
+    concurrent.futures.Future back, or block on `run` when they are already
+    off the UI thread.
+    """
+
+    def __init__(self, name="teleport-runtime"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        return self.start()
+
+    def start(self):
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._run, args=(self._loop, ready), name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+            return self._loop
+
+    def _run(self, loop, ready):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def in_runtime_thread(self):
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Schedule `coro` on the runtime loop and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run `coro` on the runtime loop and wait for its result (never call this from the loop itself)."""
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("AsyncRuntime.run() called from the runtime thread, await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self, cleanup=None, timeout=5.0):
+        """Run the optional `cleanup` coroutine, then stop the loop thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = None
+            self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        if cleanup is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(cleanup, loop).result(timeout)
+            except Exception:
+                logger.warning("Error while shutting down the network runtime", exc_info=True)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+_runtime = AsyncRuntime()
+
+def get_runtime():
+    return _runtime
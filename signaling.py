@@ -0,0 +1,91 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+from tracing import add_bytes
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# Default HTTP timeouts (seconds) for the AmpliFi cloud API
+CONNECT_TIMEOUT = 5.0
+REQUEST_TIMEOUT = 15.0
+
+# Keep-alive pool for client.amplifi.com
+POOL_SIZE = 4
+KEEPALIVE_TIMEOUT = 60.0
+
+class SignalingClient:
+    """Pooled, keep-alive async HTTP client shared by the token, ICE config and connect requests.
+
+    The underlying aiohttp session belongs to one event loop, so it is
+    created lazily on first use and recreated if the loop has changed.
+    """
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, request_timeout=REQUEST_TIMEOUT,
+                 pool_size=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT):
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=self.request_timeout,
+                    sock_connect=self.connect_timeout
+                )
+            )
+            self._loop = loop
+        return self._session
+
+    async def post_json(self, url, payload=None, headers=None, timeout=None):
+        """POST `payload` as JSON and return (raw text, decoded JSON)."""
+        session = self._get_session()
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=self.connect_timeout)
+
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = dict(headers or {})
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+
+        async with session.post(url, data=body, headers=headers, **kwargs) as response:
+            raw = await response.read()
+            add_bytes(sent=len(body or b""), received=len(raw))
+            text = raw.decode(response.charset or "utf-8", errors="replace")
+            try:
+                return text, json.loads(text)
+            except ValueError:
+                raise Exception("Invalid response from %s (HTTP %s)" % (url, response.status))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+_client = SignalingClient()
+
+def get_client():
+    return _client
+
+def configure_client(**kwargs):
+    """Replace the shared client with different timeouts or pool size (call before connecting)."""
+    global _client
+    _client = SignalingClient(**kwargs)
+    return _client
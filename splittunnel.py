@@ -0,0 +1,115 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+"""Smallest AllowedIPs for "these networks, except those".
+
+Networks are handled as integer ranges: included and excluded ranges are
+each sorted and merged, the exclusions are subtracted in one sweep, and
+every remaining range is cut into the fewest aligned CIDR blocks. That is
+O(n log n) in the number of networks, where subtracting one network at a
+time with ipaddress.address_exclude grows with both lists.
+"""
+
+import ipaddress
+import socket
+
+FULL_TUNNEL = ("0.0.0.0/0", "::/0")
+
+_BITS = {4: 32, 6: 128}
+_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+def merge_ranges(ranges):
+    """Sorted, non-overlapping, non-adjacent [first, last] ranges covering the same addresses."""
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1][1] = last
+        else:
+            merged.append([first, last])
+    return merged
+
+def _parse_range(network):
+    """(version, first, last) of a network string ("a.b.c.d", "a.b.c.d/n", "x::/n") or ip_network."""
+    if not isinstance(network, str):
+        network = ipaddress.ip_network(network, strict=False)
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    address, _, prefix = network.strip().partition("/")
+    version = 6 if ":" in address else 4
+    bits = _BITS[version]
+    try:
+        # inet_pton instead of ipaddress: this runs once per network of possibly long lists
+        value = int.from_bytes(socket.inet_pton(_FAMILIES[version], address), "big")
+        length = int(prefix) if prefix else bits
+    except (OSError, ValueError) as e:
+        raise Exception("Invalid network %r: %s" % (network, e))
+    if not 0 <= length <= bits:
+        raise Exception("Invalid network %r: prefix length out of range" % network)
+    host_bits = bits - length
+    first = value >> host_bits << host_bits
+    return version, first, first | ((1 << host_bits) - 1)
+
+def _ranges(networks):
+    """Merged ranges of `networks` per IP version."""
+    if isinstance(networks, str):
+        networks = networks.replace(",", " ").split()
+    ranges = {4: [], 6: []}
+    for network in networks:
+        version, first, last = _parse_range(network)
+        ranges[version].append((first, last))
+    return {version: merge_ranges(version_ranges) for version, version_ranges in ranges.items()}
+
+def _format(version, start, prefix):
+    if version == 4:
+        return "%s/%d" % (socket.inet_ntop(socket.AF_INET, start.to_bytes(4, "big")), prefix)
+    return "%s/%d" % (ipaddress.IPv6Address(start), prefix)
+
+def subtract_ranges(include, exclude):
+    """`include` minus `exclude`, both as from merge_ranges; one linear sweep."""
+    result = []
+    j = 0
+    for first, last in include:
+        # Exclusions that end before this range can't touch it or any later one
+        while j < len(exclude) and exclude[j][1] < first:
+            j += 1
+        k = j
+        while first <= last and k < len(exclude) and exclude[k][0] <= last:
+            excluded_first, excluded_last = exclude[k]
+            if excluded_first > first:
+                result.append([first, excluded_first - 1])
+            first = max(first, excluded_last + 1)
+            k += 1
+        if first <= last:
+            result.append([first, last])
+    return result
+
+def range_to_cidrs(first, last, bits):
+    """The fewest CIDR blocks, as (network int, prefix length), exactly covering first..last."""
+    blocks = []
+    while first <= last:
+        # Largest block that is aligned at `first` and still fits
+        aligned = first & -first if first else 1 << bits
+        size = min(aligned, 1 << ((last - first + 1).bit_length() - 1))
+        blocks.append((first, bits - size.bit_length() + 1))
+        first += size
+    return blocks
+
+def allowed_ips(include=None, exclude=(), keep=()):
+    """AllowedIPs entries (IPv4 first) routing `include` (everything if empty) minus `exclude` into the tunnel.
+
+    `keep` is added back after the exclusions, for addresses the tunnel needs
+    to work at all (e.g. the DNS server it hands out).
+    """
+    include = _ranges(include or FULL_TUNNEL)
+    exclude = _ranges(exclude)
+    keep = _ranges(keep)
+
+    entries = []
+    for version in (4, 6):
+        remaining = subtract_ranges(include[version], exclude[version])
+        if keep[version]:
+            remaining = merge_ranges(remaining + keep[version])
+        for first, last in remaining:
+            entries.extend(_format(version, start, prefix)
+                           for start, prefix in range_to_cidrs(first, last, _BITS[version]))
+    return entries
@@ -0,0 +1,287 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import logging
+import threading
+import time
+
+from config import (SUPERVISOR_CHECK_INTERVAL, SUPERVISOR_PROCESS_CHECK_INTERVAL, SUPERVISOR_STALE_AFTER,
+                    SUPERVISOR_RETRY_BASE, SUPERVISOR_RETRY_MAX, SUPERVISOR_BREAKER_THRESHOLD,
+                    SUPERVISOR_BREAKER_COOLDOWN)
+from notifications import show_toast
+from retry import CircuitBreaker, backoff_delays
+from tracing import metrics, span
+from tunnel import (_read_active_config, activate_tunnel, disconnect_count, fast_reconnect, generate_config,
+                    take_down_tunnel, tunnel_lock)
+from tunnel_backends import get_backend
+from tunnel_status import get_status_service
+from wgconfig import parse_config
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+def _config_endpoint(config_str):
+    for name, values in parse_config(config_str):
+        if name == "peer" and values.get("endpoint"):
+            return _normalize_endpoint(values["endpoint"])
+    return None
+
+def _normalize_endpoint(endpoint):
+    host, _, port = endpoint.rpartition(":")
+    return "%s:%s" % (host.strip("[]"), port)
+
+def reconnect():
+    """Bring a dead tunnel back: the cached config first, a full renegotiation otherwise."""
+    success, msg = fast_reconnect()
+    if success:
+        return True, msg
+    success, msg = generate_config(pin=None)
+    if not success:
+        return False, msg
+    return activate_tunnel()
+
+class RecoveryCancelled(Exception):
+    pass
+
+class TunnelSupervisor:
+    """Watches the running tunnel and repairs it when its peer goes away.
+
+    One thread samples the peer's handshake age and rx/tx counters every
+    `interval` seconds. A peer is stale once traffic goes out but nothing came
+    back since a handshake older than `stale_after`. A stale peer that also
+    answers from somewhere other than the negotiated address ("roamed") is
+    renegotiated right away (its cached config can't work), a stale one tries
+    the cached config first. Both take the dead tunnel down before
+    negotiating, so the kill switch can't swallow the traffic to the cloud. A
+    moved peer that still answers is just followed, as WireGuard does. Failed
+    recoveries (including errors) back off with jitter and trip a circuit breaker.
+    Backends that start a process per stats read are sampled only every
+    `process_interval` seconds.
+
+    Every step of a recovery runs under the tunnel lock and is dropped once
+    the user disconnected since the problem was found (cancel() in this
+    process, deactivate_tunnel() in any).
+    """
+
+    def __init__(self, interval=SUPERVISOR_CHECK_INTERVAL, stale_after=SUPERVISOR_STALE_AFTER,
+                 retry_base=SUPERVISOR_RETRY_BASE, retry_max=SUPERVISOR_RETRY_MAX,
+                 breaker=None, backend=None, clock=time.time, process_interval=SUPERVISOR_PROCESS_CHECK_INTERVAL):
+        self.interval = interval
+        self.process_interval = process_interval
+        self._sampled_at = None
+        self._slow_sampling_logged = False
+        self.stale_after = stale_after
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker = breaker or CircuitBreaker(SUPERVISOR_BREAKER_THRESHOLD, SUPERVISOR_BREAKER_COOLDOWN)
+        self._backend = backend
+        self._clock = clock
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._cancels = 0
+        self._reset()
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else get_backend()
+
+    def _reset(self, config_str=None):
+        self._config = config_str
+        self._endpoint = _config_endpoint(config_str) if config_str else None
+        self._watching_since = self._clock()
+        self._last_stats = None
+        self._last_rx_at = self._watching_since
+        self._problem = None
+        self._detected_at = None
+        self._token = None
+        self._next_attempt_at = 0.0
+        self._attempts = 0
+        self._delays = backoff_delays(self.retry_base, self.retry_max)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="tunnel-supervisor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+    def cancel(self):
+        """Abandon any recovery in progress, e.g. when the user disconnects; safe from any thread."""
+        with self._lock:
+            self._cancels += 1
+
+    def _current_token(self):
+        with self._lock:
+            cancels = self._cancels
+        return cancels, disconnect_count()
+
+    def _step(self, token, func, *args, **kwargs):
+        """Run one recovery step under the tunnel lock, unless the recovery was overtaken."""
+        with tunnel_lock:
+            if self._current_token() != token:
+                raise RecoveryCancelled()
+            return func(*args, **kwargs)
+
+    def _run(self):
+        while not self._stopped.wait(self._next_wait()):
+            try:
+                self.check()
+            except Exception:
+                logger.warning("Error while supervising the tunnel", exc_info=True)
+
+    def _next_wait(self):
+        if self._problem is None:
+            return self.interval
+        until_attempt = max(self._next_attempt_at, self._clock() + self.breaker.retry_in()) - self._clock()
+        return max(0.05, min(self.interval, until_attempt))
+
+    def check(self):
+        """Take one sample and start a recovery if it is due. Returns the problem found, if any."""
+        if self._problem is not None and self._token != self._current_token():
+            logger.info("Tunnel recovery cancelled by a disconnect")
+            self._reset()
+        config_str = _read_active_config()
+        if config_str is None or not get_status_service().is_active():
+            if self._problem is None:
+                # Nothing to supervise: never brought up, or taken down on purpose
+                if self._config is not None:
+                    self._reset()
+                return None
+            # A failed recovery attempt left the tunnel down, keep trying
+            if self._clock() >= self._next_attempt_at and self.breaker.allow():
+                self._recover()
+            return self._problem
+        if config_str != self._config:
+            self._reset(config_str)
+
+        backend = self.backend
+        now = self._clock()
+        if backend.stats_from_process and self._problem is None:
+            if not self._slow_sampling_logged:
+                self._slow_sampling_logged = True
+                logger.warning("Peer stats need a %s process per read, checking the peer every %.0fs instead of %.0fs",
+                               backend.name, self.process_interval, self.interval)
+            if self._sampled_at is not None and now - self._sampled_at < self.process_interval:
+                return None
+        self._sampled_at = now
+        stats = backend.peer_stats()
+        if stats is None:
+            return None
+        problem = self._evaluate(stats, now)
+        self._last_stats = stats
+
+        if problem is None:
+            if self._problem is not None:
+                logger.info("Tunnel peer recovered by itself")
+                self._problem = None
+                self._delays = backoff_delays(self.retry_base, self.retry_max)
+            return None
+
+        if self._problem is None:
+            self._problem = problem
+            self._detected_at = now
+            self._token = self._current_token()
+            # How long the tunnel was broken before we noticed
+            broken_since = self._last_rx_at if problem == "stale" else now - self.interval
+            metrics.increment("supervisor_detections", reason=problem)
+            metrics.set_gauge("supervisor_detection_seconds", round(now - broken_since, 3))
+            logger.warning("Tunnel peer %s (endpoint %s), detected after %.1fs",
+                           problem, stats.endpoint, now - broken_since)
+            show_toast("Status Update", "Teleport connection lost, reconnecting...", key="supervisor")
+
+        if now >= self._next_attempt_at and self.breaker.allow():
+            self._recover()
+        return problem
+
+    def _evaluate(self, stats, now):
+        if stats.rx_bytes != (self._last_stats.rx_bytes if self._last_stats else None):
+            self._last_rx_at = now
+        endpoint = _normalize_endpoint(stats.endpoint) if stats.endpoint else None
+        roamed = endpoint is not None and self._endpoint is not None and endpoint != self._endpoint
+        if self._last_stats is None:
+            return None
+        handshake_age = now - max(stats.latest_handshake, self._watching_since)
+        sending = stats.tx_bytes > self._last_stats.tx_bytes
+        receiving = stats.rx_bytes > self._last_stats.rx_bytes
+        if handshake_age > self.stale_after and sending and not receiving:
+            return "roamed" if roamed else "stale"
+        if roamed and receiving:
+            # WireGuard follows a peer that moved (e.g. a NAT rewrote its port) by itself
+            logger.info("Tunnel peer moved from %s to %s and still answers, following it", self._endpoint, endpoint)
+            metrics.increment("supervisor_roams")
+            self._endpoint = endpoint
+        return None
+
+    def _reconnect(self, token, cached=True):
+        """reconnect(), one locked step at a time; without `cached`, straight to a renegotiation."""
+        if cached:
+            success, msg = self._step(token, fast_reconnect)
+            if success:
+                return True, msg
+        else:
+            # The dead tunnel (and its kill switch) must not carry the negotiation
+            self._step(token, take_down_tunnel)
+        if self._current_token() != token:
+            raise RecoveryCancelled()
+        # Negotiating doesn't touch the tunnel and takes a while, so it runs without the lock
+        success, msg = generate_config(pin=None)
+        if not success:
+            return False, msg
+        return self._step(token, activate_tunnel)
+
+    def _recover(self):
+        problem, detected_at, token = self._problem, self._detected_at, self._token
+        self._attempts += 1
+        with span("supervisor_recovery", reason=problem, breaker=self.breaker.state) as recovery_span:
+            try:
+                if self._current_token() != token:
+                    raise RecoveryCancelled()
+                # A roamed peer is stale too, so the cached config (old endpoint) is skipped
+                success, msg = self._reconnect(token, cached=problem != "roamed")
+                if self._current_token() != token:
+                    raise RecoveryCancelled()
+            except RecoveryCancelled:
+                recovery_span.set(outcome="cancelled")
+                metrics.increment("supervisor_recoveries", result="cancelled")
+                logger.info("Tunnel recovery cancelled by a disconnect")
+                self._reset()
+                return
+            except Exception as e:
+                # e.g. wireguard.exe missing: still a failed attempt that backs off
+                logger.error("Error While Recovering the Tunnel", exc_info=True)
+                success, msg = False, str(e) or repr(e)
+            recovery_span.set(outcome="recovered" if success else "failed")
+
+        if success:
+            recovered_in = self._clock() - detected_at
+            self.breaker.record_success()
+            metrics.increment("supervisor_recoveries", result="recovered")
+            metrics.set_gauge("supervisor_recovery_seconds", round(recovered_in, 3))
+            metrics.set_gauge("supervisor_breaker_open", 0)
+            logger.info("Tunnel recovered from %s peer in %.1fs", problem, recovered_in)
+            show_toast("Status Update", "Teleport reconnected after %d attempt%s" % (
+                self._attempts, "" if self._attempts == 1 else "s"), key="supervisor")
+            self._reset(_read_active_config())
+            return
+
+        self.breaker.record_failure()
+        metrics.increment("supervisor_recoveries", result="failed")
+        metrics.set_gauge("supervisor_breaker_open", 0 if self.breaker.allow() else 1)
+        if not self.breaker.allow():
+            logger.error("Tunnel recovery failed %d times in a row (%s), pausing for %.0fs",
+                         self.breaker.failures, msg, self.breaker.cooldown)
+            show_toast("Error", "Teleport could not reconnect, trying again in %.0f minutes" % (
+                self.breaker.cooldown / 60), key="supervisor")
+            return
+        delay = next(self._delays)
+        self._next_attempt_at = self._clock() + delay
+        logger.warning("Tunnel recovery failed (%s), retrying in %.1fs", msg, delay)
+
+_supervisor = TunnelSupervisor()
+
+def get_supervisor():
+    return _supervisor
@@ -4,14 +4,25 @@
 
 import asyncio
 import logging
-import requests
-import subprocess
 import uuid
 import socket
+import time
 
+import aiohttp
 from aiortc import RTCPeerConnection, RTCSessionDescription, RTCIceServer, RTCConfiguration
 from aiortc.sdp import grouplines, parse_attr
 
+from candidates import select_candidate_pair
+from config import SPLIT_TUNNEL, SPLIT_TUNNEL_INCLUDE, SPLIT_TUNNEL_EXCLUDE
+from ice_cache import IceConfigCache
+from pathprobe import probe_path
+from retry import Deadline, PhaseTimeout, retry_async, run_phase
+from runtime import get_runtime
+from signaling import get_client
+from splittunnel import allowed_ips
+from tracing import span
+from wgkeys import get_keypair
+
 ICE_STUN_SERVER = "stun:global.stun.twilio.com:3478"
 
 REQUEST_DEVICE_TOKEN_URL = "https://client.amplifi.com/api/deviceToken/mlRequestClientAccess"
@@ -21,18 +32,36 @@ SIGNALING_URL = "https://client.amplifi.com/api/deviceToken/mlClientConnect"
 # Decides the device icon in the router control panel
 DEVICE_PLATFORM = "iOS"
 
+# Overall time budgets (seconds) for get_device_token and connect_device
+TOKEN_DEADLINE = 20.0
+CONNECT_DEADLINE = 45.0
+
+# Per-phase budgets (seconds), always capped by what is left of the deadline
+PHASE_BUDGETS = {
+    "token": 10.0,
+    "ice_config": 8.0,
+    "signaling": 15.0,
+    "ice": 15.0,
+}
+
+# Failures worth another attempt; API errors (e.g. a wrong PIN) are not
+RETRYABLE_ERRORS = (PhaseTimeout, aiohttp.ClientError, OSError)
+
 logger = logging.getLogger("AmpliFi Teleport for Desktop")
 
-def _generate_wg_keys():
-    privateKey = subprocess.check_output(["wg", "genkey"],
-                                        encoding="utf8").strip()
+# mlIceConfig responses, reused until their TURN credentials expire
+iceConfigCache = IceConfigCache()
 
-    publicKeyProcess = subprocess.Popen(["wg", "pubkey"],
-                                        stdout = subprocess.PIPE,
-                                        stdin = subprocess.PIPE,
-                                        encoding="utf8")
+# Connect phases that run concurrently before the signaling request
+PARALLEL_PHASES = ("offer", "keygen", "ice_config")
 
-    publicKey = publicKeyProcess.communicate(input=privateKey)[0].strip()
+# Per-phase durations (seconds) of the most recent connect
+lastConnectTimings = {}
+
+def _generate_wg_keys():
+    # Taken from the pre-generated pool when it is running,
+    # otherwise generated in-process (no `wg` binary needed)
+    privateKey, publicKey = get_keypair()
 
     return privateKey, publicKey
 
@@ -55,14 +84,17 @@ def _add_tunnel_info(sdp, friendlyName, platform, publicKey):
         f"a=uca_acf5_amplifi_tunnel_pub_key:" + publicKey])
     return parts[0] + parts[1] + "\r\n" + info + parts[2]
 
-def _get_remote_description(localDescription, deviceToken):
-    headers = _make_request_headers(deviceToken)
+async def _get_ice_servers(deviceToken):
+    iceServers = iceConfigCache.get(deviceToken)
+    if iceServers is not None:
+        logger.debug("Using cached ICE config")
+        return iceServers
 
-    iceConfigResponse = requests.post(ICE_CONFIG_URL, headers=headers)
+    headers = _make_request_headers(deviceToken)
 
-    logger.debug("Raw ICE config response: %s" % iceConfigResponse.text)
+    rawIceConfig, iceConfig = await get_client().post_json(ICE_CONFIG_URL, headers=headers)
 
-    iceConfig = iceConfigResponse.json()
+    logger.debug("Raw ICE config response: %s", rawIceConfig)
 
     if not iceConfig["success"]:
         if iceConfig["error"]:
@@ -70,21 +102,30 @@ def _get_remote_description(localDescription, deviceToken):
         else:
             raise Exception("ICE config request failed")
 
-    iceServers = iceConfig["servers"]
+    iceConfigCache.put(deviceToken, iceConfig)
 
-    connectResponse = requests.post(
-        SIGNALING_URL,
-        json={
-            "iceServers": iceServers,
-            "offer": localDescription
-        },
-        headers=headers)
+    return iceConfig["servers"]
 
-    logger.debug("Raw connect response: %s" % connectResponse.text)
+async def _get_remote_description(localDescription, deviceToken, iceServers):
+    headers = _make_request_headers(deviceToken)
 
-    answerAndSuccess = connectResponse.json()
+    try:
+        rawConnectResponse, answerAndSuccess = await get_client().post_json(
+            SIGNALING_URL,
+            {
+                "iceServers": iceServers,
+                "offer": localDescription
+            },
+            headers=headers)
+    except Exception:
+        iceConfigCache.invalidate(deviceToken)
+        raise
+
+    logger.debug("Raw connect response: %s", rawConnectResponse)
 
     if not answerAndSuccess["success"]:
+        # The cached servers or credentials may be the reason, fetch fresh ones next time
+        iceConfigCache.invalidate(deviceToken)
         if answerAndSuccess["error"]:
             raise Exception("Connect request failed (%s)" % answerAndSuccess["error"])
         else:
@@ -93,19 +134,29 @@ def _get_remote_description(localDescription, deviceToken):
     answer = answerAndSuccess["answer"]
     return RTCSessionDescription(sdp=answer, type="answer")
 
-def _generate_wg_config(pc, remoteDescription, privateKey):
+def _get_ice_connection(pc):
     iceTransport = pc.sctp.transport.transport
     iceGatherer = iceTransport.iceGatherer
-    connection = iceGatherer._connection
+    return iceGatherer._connection
+
+def format_endpoint(ip, port):
+    """host:port as WireGuard reads it; IPv6 addresses go in brackets ("[fd00::2]:51820")."""
+    if ":" in ip:
+        return "[%s]:%s" % (ip, port)
+    return "%s:%s" % (ip, port)
 
-    logger.debug("Nominated peers: %s" % connection._nominated)
+def _generate_wg_config(pc, remoteDescription, privateKey, candidatePair=None, pathInfo=None):
+    connection = _get_ice_connection(pc)
 
-    if 1 not in connection._nominated:
-        raise Exception("No nominated candidate peer")
+    logger.debug("Nominated peers: %s", connection._nominated)
 
-    candidatePair = connection._nominated[1]
+    if candidatePair is None:
+        if 1 not in connection._nominated:
+            raise Exception("No nominated candidate peer")
 
-    logger.debug("Chosen candidate pair: %s" % candidatePair)
+        candidatePair = connection._nominated[1]
+
+    logger.debug("Chosen candidate pair: %s", candidatePair)
 
     localAddr = candidatePair.local_addr
     localPort = localAddr[1]
@@ -127,52 +178,121 @@ def _generate_wg_config(pc, remoteDescription, privateKey):
             elif attr == "uca_acf5_amplifi_tunnel_pub_key":
                 remotePublicKey = value
 
+    if SPLIT_TUNNEL:
+        # The endpoint must stay outside (or its packets would loop into the tunnel),
+        # the DNS server handed out inside whatever is excluded
+        allowedIps = ", ".join(allowed_ips(
+            SPLIT_TUNNEL_INCLUDE, list(SPLIT_TUNNEL_EXCLUDE) + [remoteIp], keep=[dnsAddress]))
+    else:
+        allowedIps = "0.0.0.0/0, ::/0" # Block untunneled traffic (kill-switch)
+
     wgConfigLines = [
         "[Interface]",
         "PrivateKey = %s" % privateKey,
         "ListenPort = %s" % localPort,
         "Address = %s/32" % interfaceAddress,
         "DNS = %s" % dnsAddress,
+    ]
+    if pathInfo is not None and pathInfo.mtu:
+        wgConfigLines.append("MTU = %d" % pathInfo.mtu)
+
+    wgConfigLines += [
         "",
         "[Peer]",
         "PublicKey = %s" % remotePublicKey,
-        "AllowedIPs = 0.0.0.0/0, ::/0", # Block untunneled traffic (kill-switch)
-        "Endpoint = %s:%s"  % (remoteIp, remotePort)
+        "AllowedIPs = %s" % allowedIps,
+        "Endpoint = %s" % format_endpoint(remoteIp, remotePort)
     ]
+    if pathInfo is not None and pathInfo.keepalive:
+        wgConfigLines.append("PersistentKeepalive = %d" % pathInfo.keepalive)
 
     return "\n".join(wgConfigLines)
 
-async def _connect_device_peer(pc, deviceToken):
+async def _timed(timings, phase, awaitable):
+    start = time.perf_counter()
+    try:
+        with span(phase, attempt=timings.get("attempt", 1)):
+            return await awaitable
+    finally:
+        timings[phase] = time.perf_counter() - start
+
+async def _gather_or_cancel(*awaitables):
+    """Like asyncio.gather, but cancels the other phases as soon as one fails."""
+    tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def _log_connect_timings(timings):
+    global lastConnectTimings
+    lastConnectTimings = dict(timings)
+
+    parallel = {phase: timings[phase] for phase in PARALLEL_PHASES if phase in timings}
+    if parallel:
+        lastConnectTimings["critical_path"] = max(parallel, key=parallel.get)
+
+    logger.info("Connect timings: %s", ", ".join(
+        "%s=%.0fms" % (phase, value * 1000) if isinstance(value, float) else "%s=%s" % (phase, value)
+        for phase, value in lastConnectTimings.items()))
+
+async def _connect_device_peer(pc, deviceToken, deadline, attempt=1):
+    timings = {"attempt": attempt}
+    connectStart = time.perf_counter()
+
     # A media channel or data channel is required
     # to create an offer, but it will not be used.
     pc.createDataChannel("chat")
 
-    await pc.setLocalDescription(await pc.createOffer())
+    async def createOffer():
+        # Resolves once local ICE candidates have been gathered
+        await pc.setLocalDescription(await pc.createOffer())
 
-    privateKey, publicKey = _generate_wg_keys()
-    deviceName = _get_device_name()
-    platform = DEVICE_PLATFORM
+    loop = asyncio.get_running_loop()
 
-    localDescription = _add_tunnel_info(
-        pc.localDescription.sdp, deviceName, platform, publicKey)
+    try:
+        # Offer creation/ICE gathering, keygen and the ICE config fetch are
+        # independent; only the signaling request needs all of their results
+        prepare = _gather_or_cancel(
+            _timed(timings, "offer", createOffer()),
+            _timed(timings, "keygen", loop.run_in_executor(None, _generate_wg_keys)),
+            _timed(timings, "ice_config", run_phase(
+                "ICE config request", _get_ice_servers(deviceToken), deadline, PHASE_BUDGETS["ice_config"])))
 
-    logger.debug("Sending local description: %s" % localDescription)
+        _, (privateKey, publicKey), iceServers = await _timed(
+            timings, "prepare", run_phase("Offer", prepare, deadline))
 
-    try:
-        remoteDescription = _get_remote_description(localDescription, deviceToken)
+        deviceName = _get_device_name()
+        platform = DEVICE_PLATFORM
 
-        logger.debug("Received remote description: %s" % remoteDescription)
+        localDescription = _add_tunnel_info(
+            pc.localDescription.sdp, deviceName, platform, publicKey)
+
+        logger.debug("Sending local description: %s", localDescription)
+
+        remoteDescription = await _timed(timings, "signaling", run_phase(
+            "Connect request", _get_remote_description(localDescription, deviceToken, iceServers),
+            deadline, PHASE_BUDGETS["signaling"]))
+
+        logger.debug("Received remote description: %s", remoteDescription)
 
-        loop = asyncio.get_event_loop()
         configFuture = loop.create_future()
 
         @pc.on("iceconnectionstatechange")
         async def on_iceconnectionstatechange():
-            logger.debug("ICE connection state is %s" % pc.iceConnectionState)
+            logger.debug("ICE connection state is %s", pc.iceConnectionState)
 
-            if pc.iceConnectionState == "completed":
+            if pc.iceConnectionState == "completed" and not configFuture.done():
                 try:
-                    wgConfig = _generate_wg_config(pc, remoteDescription, privateKey)
+                    # Prefer the fastest direct path over whichever pair got nominated
+                    connection = _get_ice_connection(pc)
+                    candidatePair = await select_candidate_pair(connection)
+                    # MTU and keepalive for this path, measured before the socket goes to WireGuard
+                    pathInfo = await _timed(timings, "path_probe", probe_path(connection, candidatePair))
+                    wgConfig = _generate_wg_config(pc, remoteDescription, privateKey, candidatePair, pathInfo)
 
                     logger.info("WireGuard config has been generated")
                     await pc.close()
@@ -182,27 +302,33 @@ async def _connect_device_peer(pc, deviceToken):
                     await pc.close()
                     configFuture.set_exception(e)
 
-        await pc.setRemoteDescription(remoteDescription)
+        async def completeIce():
+            await pc.setRemoteDescription(remoteDescription)
+            return await configFuture
 
-        return await configFuture
-    except Exception as e:
-        logger.error(e)
+        return await _timed(timings, "ice", run_phase(
+            "ICE negotiation", completeIce(), deadline, PHASE_BUDGETS["ice"]))
+    except BaseException as e:
+        logger.error("Connect attempt %d failed: %s", attempt, e)
+        iceConfigCache.invalidate(deviceToken)
         await pc.close()
+        raise
+    finally:
+        timings["total"] = time.perf_counter() - connectStart
+        _log_connect_timings(timings)
 
 def generate_client_hint():
     return str(uuid.uuid4()).upper()
 
-def get_device_token(clientHint, pin):
-    clientAccessResponse = requests.post(
+async def _request_device_token(clientHint, pin):
+    rawClientAccess, deviceTokenAndSuccess = await get_client().post_json(
         REQUEST_DEVICE_TOKEN_URL,
-        json={
-            "client_hint": clientHint 
+        {
+            "client_hint": clientHint
         },
         headers=_make_request_headers(pin))
 
-    logger.debug("Raw client access response: %s" % clientAccessResponse.text)
-
-    deviceTokenAndSuccess = clientAccessResponse.json()
+    logger.debug("Raw client access response: %s", rawClientAccess)
 
     if not deviceTokenAndSuccess["success"]:
         if deviceTokenAndSuccess["error"]:
@@ -212,17 +338,50 @@ def get_device_token(clientHint, pin):
 
     return deviceTokenAndSuccess["client_id"]
 
-def connect_device(deviceToken):
-    stun = RTCIceServer(urls=ICE_STUN_SERVER)
-    config = RTCConfiguration([stun])
-    pc = RTCPeerConnection(config)
-
-    coro = _connect_device_peer(pc, deviceToken)
-
-    loop = asyncio.get_event_loop()
-    try:
-        return loop.run_until_complete(coro)  
-    except KeyboardInterrupt:
-        pass
-    finally:
-        loop.run_until_complete(pc.close())
+async def _get_device_token(clientHint, pin, deadline):
+    async def attemptRequest(attempt):
+        with span("token", attempt=attempt):
+            return await run_phase("Client access request",
+                _request_device_token(clientHint, pin), deadline, PHASE_BUDGETS["token"])
+
+    return await retry_async(attemptRequest, deadline, retry_on=RETRYABLE_ERRORS)
+
+def submit_get_device_token(clientHint, pin, timeout=TOKEN_DEADLINE):
+    """Request a device token on the network runtime, returns a concurrent.futures.Future."""
+    return get_runtime().submit(_get_device_token(clientHint, pin, Deadline(timeout)))
+
+def get_device_token(clientHint, pin, timeout=TOKEN_DEADLINE):
+    return submit_get_device_token(clientHint, pin, timeout).result()
+
+async def _connect_device(deviceToken, deadline):
+    async def attemptConnect(attempt):
+        # A peer connection cannot be reused, every attempt starts from scratch
+        iceServers = [RTCIceServer(urls=ICE_STUN_SERVER)] if ICE_STUN_SERVER else []
+        pc = RTCPeerConnection(RTCConfiguration(iceServers))
+        try:
+            with span("connect", attempt=attempt):
+                return await _connect_device_peer(pc, deviceToken, deadline, attempt)
+        finally:
+            await pc.close()
+
+    return await retry_async(attemptConnect, deadline, retry_on=RETRYABLE_ERRORS)
+
+async def negotiate(deviceToken, timeout=CONNECT_DEADLINE):
+    """Negotiate a session and return its WireGuard config, for code already on the network runtime."""
+    return await _connect_device(deviceToken, Deadline(timeout))
+
+def submit_connect_device(deviceToken, timeout=CONNECT_DEADLINE):
+    """Start a connect on the network runtime, returns a concurrent.futures.Future of the config."""
+    return get_runtime().submit(negotiate(deviceToken, timeout))
+
+def connect_device(deviceToken, timeout=CONNECT_DEADLINE):
+    """Negotiate a session with the router and return its WireGuard config.
+
+    Blocks the calling thread (not the network runtime) and gives up with an
+    exception once `timeout` seconds have passed; it never returns None.
+    """
+    return get_runtime().run(_connect_device(deviceToken, Deadline(timeout)))
+
+def shutdown():
+    """Close pooled connections and stop the network runtime."""
+    get_runtime().stop(get_client().close())
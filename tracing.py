@@ -0,0 +1,320 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import atexit
+import bisect
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# Upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "teleport"
+
+# Completed spans waiting for the span log writer; a full queue drops them
+SPAN_QUEUE_SIZE = 10000
+
+_enabled = False
+_current_span = contextvars.ContextVar("teleport_current_span", default=None)
+
+class _NoopSpan:
+    """Returned by span() while tracing is off, so instrumented code costs one flag check."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def add_bytes(self, sent=0, received=0):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "bytes_sent", "bytes_received", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.duration = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs.setdefault("outcome", "cancelled" if exc_type.__name__ == "CancelledError" else "error")
+            self.attrs.setdefault("error", str(exc) or exc_type.__name__)
+        else:
+            self.attrs.setdefault("outcome", "ok")
+        metrics.record_span(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_bytes(self, sent=0, received=0):
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+    def to_dict(self):
+        return dict(self.attrs, span=self.name, duration_ms=round(self.duration * 1000, 3),
+                    bytes_sent=self.bytes_sent, bytes_received=self.bytes_received,
+                    timestamp=round(time.time(), 3))
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+class SpanWriter:
+    """Appends span records to a JSON lines file from one background thread.
+
+    Spans end on the network runtime's loop, so they only enqueue here, like
+    log records do (see logsetup.py); a full queue drops the record.
+    """
+
+    def __init__(self, path, queue_size=SPAN_QUEUE_SIZE):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="span-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            records = [record]
+            # Write whatever piled up in one go
+            while True:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write(records)
+                    return
+                records.append(record)
+            self._write(records)
+
+    def _write(self, records):
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(record, default=str) + "\n" for record in records)
+        except OSError:
+            logger.warning("Could not write spans to %s", self.path, exc_info=True)
+
+    def stop(self, timeout=5.0):
+        """Write out what is queued and end the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped:
+            logger.warning("%d spans were not written because the span queue was full", self.dropped)
+
+class Metrics:
+    """In-memory span histograms, counters and gauges."""
+
+    def __init__(self, recent=200):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.recent = deque(maxlen=recent)
+        self.span_writer = None
+        self._lock = threading.Lock()
+
+    def record_span(self, span):
+        key = (span.name, span.attrs["outcome"])
+        record = span.to_dict()
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(span.duration)
+            self._add(self.counters, ("span_bytes_sent", (("span", span.name),)), span.bytes_sent)
+            self._add(self.counters, ("span_bytes_received", (("span", span.name),)), span.bytes_received)
+            self.recent.append(record)
+        writer = self.span_writer
+        if writer is not None:
+            writer.put(record)
+
+    def _add(self, table, key, value):
+        table[key] = table.get(key, 0) + value
+
+    def increment(self, name, value=1, **labels):
+        with self._lock:
+            self._add(self.counters, (name, tuple(sorted(labels.items()))), value)
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.recent.clear()
+
+    def drain(self):
+        """Everything recorded so far, as plain data (e.g. for another process's merge()), and start over."""
+        with self._lock:
+            drained = ({key: (list(histogram.counts), histogram.total, histogram.count)
+                        for key, histogram in self.histograms.items()},
+                       dict(self.counters), dict(self.gauges), list(self.recent))
+            self.histograms.clear()
+            self.counters.clear()
+            self.gauges.clear()
+            self.recent.clear()
+        return drained
+
+    def merge(self, drained):
+        """Add what another process's drain() returned."""
+        histograms, counters, gauges, recent = drained
+        with self._lock:
+            for key, (counts, total, count) in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.total += total
+                histogram.count += count
+            for key, value in counters.items():
+                self._add(self.counters, key, value)
+            self.gauges.update(gauges)
+            self.recent.extend(recent)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            if self.histograms:
+                name = METRIC_PREFIX + "_span_duration_seconds"
+                lines.append("# TYPE %s histogram" % name)
+                for (span_name, outcome), histogram in sorted(self.histograms.items()):
+                    labels = 'span="%s",outcome="%s"' % (span_name, outcome)
+                    cumulative = 0
+                    for bound, count in zip(HISTOGRAM_BUCKETS, histogram.counts):
+                        cumulative += count
+                        lines.append('%s_bucket{%s,le="%g"} %d' % (name, labels, bound, cumulative))
+                    lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram.count))
+                    lines.append("%s_sum{%s} %.6f" % (name, labels, histogram.total))
+                    lines.append("%s_count{%s} %d" % (name, labels, histogram.count))
+            for kind, table in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({key[0] for key in table}):
+                    suffix = "_total" if kind == "counter" else ""
+                    lines.append("# TYPE %s_%s%s %s" % (METRIC_PREFIX, name, suffix, kind))
+                    for (metric, labels), value in sorted(table.items()):
+                        if metric == name:
+                            label_text = ",".join('%s="%s"' % item for item in labels)
+                            lines.append("%s_%s%s{%s} %s" % (METRIC_PREFIX, name, suffix, label_text, value))
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def span(name, **attrs):
+    """Time a phase: `with span("signaling", attempt=2) as s: ...`."""
+    if not _enabled:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+def add_bytes(sent=0, received=0):
+    """Add byte counts to the innermost open span, if any."""
+    if _enabled:
+        current = _current_span.get()
+        if current is not None:
+            current.add_bytes(sent, received)
+
+def is_enabled():
+    return _enabled
+
+def enable(span_log=None):
+    """Turn tracing on; completed spans are appended to `span_log` (JSON lines) if given."""
+    global _enabled
+    previous = metrics.span_writer
+    metrics.span_writer = SpanWriter(span_log) if span_log else None
+    if previous is not None:
+        previous.stop()
+    elif metrics.span_writer is not None:
+        # Also in worker processes, which have no other shutdown hook for it
+        atexit.register(_stop_span_writer)
+    _enabled = True
+
+def disable():
+    """Turn tracing off and write out the spans still queued for the span log."""
+    global _enabled
+    _enabled = False
+    _stop_span_writer()
+
+def _stop_span_writer():
+    writer, metrics.span_writer = metrics.span_writer, None
+    if writer is not None:
+        writer.stop()
+
+def write_metrics(path):
+    """Dump the current metrics to a file in Prometheus text format."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(metrics.render_prometheus())
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve the metrics at http://host:port/metrics from a daemon thread."""
+    # Only needed when the exporter is on, keep it out of startup
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info("Metrics available at http://%s:%s/metrics", host, server.server_address[1])
+    return server
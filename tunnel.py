@@ -1,71 +1,477 @@
 # Copyright (c) 2026 Jeff Nedley
 # Licensed under the MIT License (see LICENSE for details)
 
+import functools
+import socket
 import subprocess
-import time
 import logging
 import os
+import sys
+import threading
+import time
 
-from config import WG_EXE, CONFIG_PATH, TOKEN_FILE, UUID_FILE
-from teleport import connect_device, get_device_token, generate_client_hint
+from config import ACTIVE_CONFIG_PATH, DISCONNECT_COUNT_PATH, DNS_CACHE_ADDRESS, DNS_CACHE_ENABLED, TUNNEL_LOCK_PATH
+from dnscache import use_dns_cache
+from profiles import atomic_write, get_profile_store
+from tracing import metrics, span
+from tunnel_backends import get_backend
+from tunnel_status import get_status_service
+from wgconfig import change_scope, has_kill_switch, parse_config, strip_config
 
 logger = logging.getLogger("AmpliFi Teleport for Desktop")
 
+# How long deactivate_tunnel waits for the service to report stopped
+DEACTIVATE_TIMEOUT = 8.0
+
+# How long the cached config gets to complete a WireGuard handshake before renegotiating
+FAST_RECONNECT_TIMEOUT = 3.0
+HANDSHAKE_POLL_INTERVAL = 0.25
+
+# How long a freshly swapped-in peer gets to complete its handshake before rolling back,
+# and how closely that is watched (it bounds the measured outage window)
+SWITCH_HANDSHAKE_TIMEOUT = 5.0
+SWITCH_POLL_INTERVAL = 0.05
+
+# A running tunnel whose last handshake is younger than this is considered alive
+# (WireGuard re-handshakes every 2 minutes while traffic flows)
+HANDSHAKE_FRESHNESS = 180
+
+def _lock_file(f):
+    if sys.platform == "win32":
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after 10 seconds; the other process is still changing the tunnel
+                continue
+    import fcntl
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+def _unlock_file(f):
+    if sys.platform == "win32":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        return
+    import fcntl
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class TunnelLock:
+    """Serialises changes to the tunnel between threads and between processes.
+
+    Reentrant within a thread; the first level also takes an OS lock on
+    `path`, so the tray (supervisor) and the window process take turns.
+    """
+
+    def __init__(self, path=TUNNEL_LOCK_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+b")
+                _lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                _unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+tunnel_lock = TunnelLock()
+
+def _locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with tunnel_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+def disconnect_count():
+    """How many times the user disconnected; any process can compare it before touching the tunnel."""
+    try:
+        with open(DISCONNECT_COUNT_PATH, 'r') as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def _negotiate_config(pin=None, profile_id=None):
+    """Get a device token (from the PIN or the profile's stored one) and negotiate a new WireGuard config."""
+    # WebRTC (aiortc, aiohttp) is only loaded once a connect needs it
+    from teleport import connect_device, get_device_token, generate_client_hint
+    store = get_profile_store()
+    profile = store.get(profile_id) if profile_id else store.active()
+    if profile is None:
+        raise Exception("Unknown profile: %s" % profile_id)
+    if pin:
+        client_hint = profile.client_hint
+        if client_hint is None:
+            client_hint = generate_client_hint()
+            profile.set("client_hint", client_hint)
+        device_token = get_device_token(client_hint.strip(), pin)
+        profile.set("device_token", device_token)
+    else:
+        device_token = profile.device_token
+        if device_token is None:
+            raise Exception("No previous token found. Please enter a new PIN.")
+        device_token = device_token.strip()
+    config_str = connect_device(device_token)
+    if not config_str:
+        raise Exception("No configuration received from the router.")
+    return config_str
+
+# Worker pool that runs negotiations in another process (see workers.py); None runs them here
+_negotiator = None
+
+def use_negotiator(pool):
+    global _negotiator
+    _negotiator = pool
+
+def _run_negotiation(pin=None):
+    profile = get_profile_store().active()
+    if _negotiator is None:
+        config_str = _negotiate_config(pin, profile.id)
+    else:
+        config_str = _negotiator.run(_negotiate_config, pin, profile.id)
+    return prepare_config(config_str, profile)
+
+def prepare_config(config_str, profile):
+    """Turn the router's config into the one the app installs for `profile` (local DNS cache, upstream recorded)."""
+    if DNS_CACHE_ENABLED:
+        if has_kill_switch(config_str):
+            # The kill switch would let DNS reach only 127.53.0.1, so the cache could never forward
+            logger.warning("DNS cache needs SPLIT_TUNNEL (without a /0 route), keeping the router's DNS")
+        else:
+            # The tunnel asks the local cache, which forwards to the router's DNS server
+            config_str, servers = use_dns_cache(config_str, DNS_CACHE_ADDRESS)
+            if servers:
+                profile.set("dns_upstream", servers[0])
+    return config_str
+
+def _write_config(config_str, profile=None):
+    """Store the config in the (active) profile; an identical config is not rewritten."""
+    with span("config_write") as write_span:
+        written = (profile or get_profile_store().active()).set("config", config_str)
+        write_span.set(written=written)
+        if written:
+            write_span.add_bytes(sent=len(config_str))
+    return written
+
+def _record_good_endpoint(config_str, profile=None):
+    for name, values in parse_config(config_str):
+        if name == "peer" and values.get("endpoint"):
+            (profile or get_profile_store().active()).set("endpoint", values["endpoint"])
+            return
+
+def store_config(config_str, profile):
+    """Store a config negotiated elsewhere (e.g. provision.py) in `profile` exactly as generate_config would."""
+    config_str = prepare_config(config_str, profile)
+    _write_config(config_str, profile)
+    _record_good_endpoint(config_str, profile)
+    return config_str
+
 def generate_config(pin=None):
     """Generate configuration for Wireguard tunnel to Amplifi Teleport"""
     try:
-        if pin:
-            if os.path.exists(UUID_FILE):
-                with open(UUID_FILE, 'r') as f:
-                    client_hint = f.read().strip()
-            else:
-                client_hint = generate_client_hint()
-                with open(UUID_FILE, 'w') as f:
-                    f.write(client_hint)
-            device_token = get_device_token(client_hint, pin)
-            with open(TOKEN_FILE, 'w') as f:
-                f.write(device_token)
-        else:
-            if not os.path.exists(TOKEN_FILE):
-                raise Exception("No previous token found. Please enter a new PIN.")
-            with open(TOKEN_FILE, 'r') as f:
-                device_token = f.read().strip()
-        config_str = connect_device(device_token)
-        with open(CONFIG_PATH, 'w') as f:
-            f.write(config_str)
-        
+        config_str = _run_negotiation(pin)
+        if not _write_config(config_str):
+            logger.info("Router sent the configuration already stored")
+        # It just completed ICE checks, so its endpoint is known to answer
+        _record_good_endpoint(config_str)
+
         return True, config_str
     except Exception as e:
         logger.error("Error While Creating a New Configuration", exc_info=True)
         return False, str(e)
 
+def _read_active_config():
+    if not os.path.exists(ACTIVE_CONFIG_PATH):
+        return None
+    with open(ACTIVE_CONFIG_PATH, 'r') as f:
+        return f.read()
+
+def _record_active_config(config_str):
+    atomic_write(ACTIVE_CONFIG_PATH, config_str)
+
+def _clear_active_config():
+    if os.path.exists(ACTIVE_CONFIG_PATH):
+        os.remove(ACTIVE_CONFIG_PATH)
+
+@_locked
 def activate_tunnel():
-    """Activate (or update) the tunnel: uninstall if exists, then install new."""
-    if not os.path.exists(CONFIG_PATH):
+    """Activate (or update) the tunnel.
+
+    Peer-only changes (endpoint, keys, listen port) are applied to the running
+    tunnel in place; interface-level changes uninstall and reinstall the service.
+    """
+    profile = get_profile_store().active()
+    config_str = profile.config
+    if config_str is None:
         return False, "No config found. Generate one first."
     try:
-        subprocess.run([WG_EXE, '/uninstalltunnelservice', 'teleport'], capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        subprocess.run([WG_EXE, '/installtunnelservice', CONFIG_PATH], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+        backend = get_backend()
+
+        running_config = _read_active_config()
+        if running_config is not None and get_status_service().is_active():
+            scope = change_scope(running_config, config_str)
+            if scope is None:
+                logger.info("Tunnel already running this configuration")
+                return True, "Tunnel activated!"
+            if scope == "peer":
+                try:
+                    with span("tunnel_sync", backend=backend.name):
+                        backend.sync(strip_config(config_str))
+                    _record_active_config(config_str)
+                    logger.info("Applied peer changes to the running tunnel")
+                    return True, "Tunnel updated!"
+                except (subprocess.CalledProcessError, OSError):
+                    logger.warning("Live update failed, reinstalling the tunnel", exc_info=True)
+
+        with span("tunnel_uninstall", backend=backend.name):
+            backend.uninstall(check=False)
+        _clear_active_config()
+        with span("tunnel_install", backend=backend.name):
+            backend.install(profile.config_path)
+        _record_active_config(config_str)
+        get_status_service().refresh()
         return True, "Tunnel activated!"
     except subprocess.CalledProcessError as e:
         logger.error("Error While Activating Tunnel Connection", exc_info=True)
         return False, f"Activation failed: {e.stderr.decode()}"
 
+def _config_dns(config_str):
+    for name, values in parse_config(config_str):
+        if name == "interface" and values.get("dns"):
+            return values["dns"].split(",")[0].strip()
+    return None
+
+def _dns_server(config_str):
+    """The DNS server the config's tunnel reaches, past the local cache if it uses one."""
+    dns_address = _config_dns(config_str)
+    if dns_address == DNS_CACHE_ADDRESS:
+        return get_profile_store().active().dns_upstream
+    return dns_address
+
+def dns_upstream():
+    """Where the DNS cache forwards to for the running tunnel, None if its config doesn't use the cache."""
+    running_config = _read_active_config()
+    if running_config is None or _config_dns(running_config) != DNS_CACHE_ADDRESS:
+        return None
+    return get_profile_store().active().dns_upstream
+
+def _nudge_tunnel(config_str):
+    """Send one datagram into the tunnel so WireGuard starts a handshake right away."""
+    dns_address = _dns_server(config_str)
+    if not dns_address:
+        return
+    try:
+        with socket.socket(socket.AF_INET6 if ":" in dns_address else socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b"\0", (dns_address, 53))
+    except OSError:
+        logger.debug("Could not send handshake trigger to %s", dns_address, exc_info=True)
+
+def wait_for_handshake(since, timeout, poll_interval=HANDSHAKE_POLL_INTERVAL):
+    """Wait until the tunnel's peer completed a handshake at or after unix time `since`."""
+    backend = get_backend()
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = backend.peer_stats()
+        if stats is not None and stats.latest_handshake >= int(since):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll_interval)
+
+@_locked
+def fast_reconnect(timeout=FAST_RECONNECT_TIMEOUT):
+    """Bring the tunnel up from the cached config if its peer still answers.
+
+    Succeeds only once a WireGuard handshake completes within `timeout`;
+    otherwise the tunnel is taken down again so a full renegotiation can
+    reach the AmpliFi cloud, and (False, reason) is returned.
+    """
+    config_str = get_profile_store().active().config
+    if config_str is None:
+        return False, "No cached config"
+
+    with span("fast_reconnect") as reconnect_span:
+
+        started = time.time()
+        was_active = get_status_service().refresh()
+        success, msg = activate_tunnel()
+        if not success:
+            reconnect_span.set(outcome="miss")
+            return _record_fast_reconnect(False), msg
+
+        # A tunnel that was already up counts if its last handshake is recent
+        since = started - HANDSHAKE_FRESHNESS if was_active else started
+        _nudge_tunnel(config_str)
+        if wait_for_handshake(since, timeout):
+            reconnect_span.set(outcome="hit")
+            _record_good_endpoint(config_str)
+            return _record_fast_reconnect(True), "Tunnel activated!"
+
+        reconnect_span.set(outcome="miss")
+        logger.info("Cached config got no handshake within %.1fs, renegotiating", timeout)
+        take_down_tunnel()
+        return _record_fast_reconnect(False), "Cached config is no longer valid"
+
+@_locked
+def take_down_tunnel():
+    """Remove a dead tunnel so a renegotiation can reach the AmpliFi cloud; not a user disconnect."""
+    get_backend().uninstall(check=False)
+    _clear_active_config()
+    get_status_service().refresh()
+
+def _record_fast_reconnect(hit):
+    metrics.increment("fast_reconnect", result="hit" if hit else "miss")
+    hits = metrics.counter("fast_reconnect", result="hit")
+    misses = metrics.counter("fast_reconnect", result="miss")
+    logger.info("Fast reconnect %s (hit ratio %d/%d)", "hit" if hit else "miss", hits, hits + misses)
+    return hit
+
+def refresh_tunnel(timeout=SWITCH_HANDSHAKE_TIMEOUT, proceed=None):
+    """Refresh the session without dropping a working tunnel (make-before-break).
+
+    The new session is negotiated while the old tunnel keeps carrying traffic.
+    If only peer settings changed, the new peer is swapped in with one
+    `wg syncconf` and kept only once it completes a handshake; otherwise
+    the previous peer is put back. Interface-level changes need a reinstall,
+    which is likewise kept only after a handshake and otherwise undone by
+    reinstalling the previous config. `proceed`, if given, is asked with the tunnel lock held
+    right before the tunnel changes; False abandons the refresh. Returns (success, message).
+    """
+    running_config = _read_active_config()
+    if running_config is None or not get_status_service().refresh():
+        success, msg = generate_config(pin=None)
+        if not success:
+            return False, msg
+        with tunnel_lock:
+            if proceed is not None and not proceed():
+                return False, "Refresh cancelled"
+            return activate_tunnel()
+
+    try:
+        new_config = _run_negotiation()
+    except Exception as e:
+        logger.error("Error While Refreshing Configuration, keeping the current tunnel", exc_info=True)
+        return False, str(e)
+
+    # Negotiating takes a while and holds no lock; switch only if nobody changed the tunnel meanwhile
+    with tunnel_lock:
+        if proceed is not None and not proceed():
+            return False, "Refresh cancelled"
+        if _read_active_config() != running_config:
+            return False, "Tunnel changed while refreshing, kept it as it is"
+        return _switch_session(running_config, new_config, timeout)
+
+def _switch_session(running_config, new_config, timeout):
+    scope = change_scope(running_config, new_config)
+    if scope is None:
+        _write_config(new_config)
+        return activate_tunnel()
+    if scope == "interface":
+        return _reinstall_session(running_config, new_config, timeout)
+
+    backend = get_backend()
+    with span("tunnel_switch", backend=backend.name) as switch_span:
+        switched_at = time.time()
+        switch_start = time.perf_counter()
+        try:
+            backend.sync(strip_config(new_config))
+        except (subprocess.CalledProcessError, OSError):
+            switch_span.set(outcome="error")
+            logger.error("Error While Switching to the New Session", exc_info=True)
+            return False, "Refresh failed, kept the previous tunnel"
+
+        _nudge_tunnel(new_config)
+        if wait_for_handshake(switched_at, timeout, SWITCH_POLL_INTERVAL):
+            outage = time.perf_counter() - switch_start
+            switch_span.set(outcome="switched", outage_ms=round(outage * 1000, 1))
+            metrics.set_gauge("refresh_outage_seconds", round(outage, 4))
+            metrics.increment("refresh", result="switched")
+            _write_config(new_config)
+            _record_active_config(new_config)
+            _record_good_endpoint(new_config)
+            logger.info("Switched to the new session, outage window %.0fms", outage * 1000)
+            return True, "Tunnel refreshed!"
+
+        switch_span.set(outcome="rolled_back")
+        metrics.increment("refresh", result="rolled_back")
+        logger.warning("New session got no handshake within %.1fs, rolling back", timeout)
+        try:
+            backend.sync(strip_config(running_config))
+            _nudge_tunnel(running_config)
+        except (subprocess.CalledProcessError, OSError):
+            logger.error("Error While Rolling Back to the Previous Session", exc_info=True)
+            return False, "Refresh failed and the previous tunnel could not be restored"
+        return False, "Refresh failed, kept the previous tunnel"
+
+def _reinstall_session(running_config, new_config, timeout):
+    """Reinstall the tunnel with `new_config`; back to `running_config` unless the new peer answers."""
+    with span("tunnel_reinstall") as reinstall_span:
+        _write_config(new_config)
+        installed_at = time.time()
+        try:
+            success, msg = activate_tunnel()
+        except OSError as e:
+            success, msg = False, str(e)
+        if success:
+            _nudge_tunnel(new_config)
+            if wait_for_handshake(installed_at, timeout, SWITCH_POLL_INTERVAL):
+                reinstall_span.set(outcome="switched")
+                metrics.increment("refresh", result="reinstalled")
+                _record_good_endpoint(new_config)
+                logger.info("Reinstalled the tunnel for the new session")
+                return True, "Tunnel refreshed!"
+            logger.warning("New session got no handshake within %.1fs after the reinstall, rolling back", timeout)
+        else:
+            logger.warning("Reinstall for the new session failed (%s), rolling back", msg)
+
+        reinstall_span.set(outcome="rolled_back")
+        metrics.increment("refresh", result="rolled_back")
+        _write_config(running_config)
+        restored, restore_msg = activate_tunnel()
+        if not restored:
+            logger.error("Could not reinstall the previous tunnel: %s", restore_msg)
+            return False, "Refresh failed and the previous tunnel could not be restored"
+        _nudge_tunnel(running_config)
+        return False, "Refresh failed, kept the previous tunnel"
+
+@_locked
 def deactivate_tunnel():
     """Uninstall the Wireguard tunnel to deactivate the Amplifi Teleport connection."""
+    # Counted first, so a recovery waiting for the lock sees it was overtaken
+    atomic_write(DISCONNECT_COUNT_PATH, str(disconnect_count() + 1))
     try:
-        subprocess.run([WG_EXE, '/uninstalltunnelservice', 'teleport'], check=True, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        
-        max_wait = 8.0
-        poll_interval = 0.8
-        elapsed = 0.0
-        while elapsed < max_wait:
-            if not is_tunnel_active():
-                logger.info("Tunnel successfully deactivated")
-                return True, "Tunnel deactivated!"
-            time.sleep(poll_interval)
-            elapsed += poll_interval
-        
+        backend = get_backend()
+        with span("tunnel_uninstall", backend=backend.name):
+            backend.uninstall()
+        _clear_active_config()
+
+        if get_status_service().wait_for_state(False, DEACTIVATE_TIMEOUT):
+            logger.info("Tunnel successfully deactivated")
+            return True, "Tunnel deactivated!"
+
         return True, "Tunnel deactivation requested (status may take a moment to update)"
     except subprocess.CalledProcessError as e:
         logger.error("Error While Deactivating Tunnel Connection", exc_info=True)
@@ -74,38 +480,9 @@ def deactivate_tunnel():
         return False, f"Deactivation failed: {e.stderr.decode()}"
 
 def is_tunnel_active(retries=3, delay=1.0):
-    """Check if the 'teleport' tunnel service is running."""
-    for attempt in range(retries):
-        try:
-            result = subprocess.run(
-                ['sc', 'query', 'WireGuardTunnel$teleport'],
-                capture_output=True,
-                text=True,
-                timeout=5, 
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            output = result.stdout.lower()
-            
-            logger.debug("WireGaurd Query output: %s", output)
-
-            if result.returncode == 0:
-                if 'running' in output:
-                    logger.info("Teleport Tunnel is active")
-                    return True
-                if 'stopped' in output or '1  stopped' in output:
-                    logger.info("Teleport Tunnel is stopped")
-                    return False
-                return False
-
-            return False
-
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            logger.warning("Error while checking for active tunnel", exc_info=True)
-            return False
-        except Exception as e:
-            logger.warning("Error while checking for active tunnel", exc_info=True)
-            return False
-
-        time.sleep(delay)
+    """Check if the 'teleport' tunnel service is running.
 
-    return False
\ No newline at end of file
+    Reads the state cached by the tunnel status service; `retries` and `delay`
+    are kept for existing callers and no longer used.
+    """
+    return get_status_service().is_active()
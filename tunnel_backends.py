@@ -0,0 +1,388 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import logging
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from config import WG_EXE, WG_CLI, WG_NT_DLL
+
+try:
+    import win32service
+except ImportError:
+    win32service = None
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+TUNNEL_NAME = "teleport"
+
+# Windows error code returned when the tunnel service is not installed
+ERROR_SERVICE_DOES_NOT_EXIST = 1060
+
+# Live counters of the tunnel's peer; latest_handshake is a unix time, 0 when there was none
+PeerStats = namedtuple("PeerStats", ["endpoint", "latest_handshake", "rx_bytes", "tx_bytes"])
+
+def parse_dump(output):
+    """PeerStats of the first peer in `wg show <interface> dump` output, or None."""
+    lines = output.strip().splitlines()
+    for line in lines[1:]:
+        fields = line.split("\t")
+        if len(fields) >= 7:
+            endpoint = None if fields[2] == "(none)" else fields[2]
+            return PeerStats(endpoint, int(fields[4]), int(fields[5]), int(fields[6]))
+    return None
+
+def parse_uapi(output):
+    """PeerStats of the first peer in a WireGuard UAPI `get=1` reply, or None."""
+    peer = None
+    for line in output.splitlines():
+        key, _, value = line.partition("=")
+        if key == "public_key":
+            if peer is not None:
+                break
+            peer = {}
+        elif peer is not None:
+            peer[key] = value
+    if peer is None:
+        return None
+    return PeerStats(peer.get("endpoint") or None, int(peer.get("last_handshake_time_sec", 0)),
+                     int(peer.get("rx_bytes", 0)), int(peer.get("tx_bytes", 0)))
+
+def _read_uapi(stream):
+    """Send a UAPI `get` over an open pipe/socket file and return the reply up to the blank line."""
+    stream.write(b"get=1\n\n")
+    stream.flush()
+    lines = []
+    for raw_line in stream:
+        line = raw_line.decode().rstrip("\n")
+        if not line:
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+# Layout of what wireguard-nt's WireGuardGetConfiguration returns: a WIREGUARD_INTERFACE,
+# then per peer a WIREGUARD_PEER followed by its WIREGUARD_ALLOWED_IPs (all 8-byte aligned)
+NT_INTERFACE_SIZE = 80
+NT_INTERFACE_PEERS_COUNT = 72
+NT_PEER_SIZE = 136
+NT_PEER_FLAGS = 0
+NT_PEER_ENDPOINT = 76
+NT_PEER_TX_BYTES = 104
+NT_PEER_RX_BYTES = 112
+NT_PEER_LAST_HANDSHAKE = 120
+NT_PEER_ALLOWED_IPS_COUNT = 128
+NT_ALLOWED_IP_SIZE = 24
+NT_PEER_HAS_ENDPOINT = 1 << 3
+NT_AF_INET = 2
+NT_AF_INET6 = 23
+ERROR_MORE_DATA = 234
+# LastHandshake counts 100ns intervals since 1601-01-01
+FILETIME_UNIX_EPOCH = 116444736000000000
+
+def parse_nt_configuration(data):
+    """PeerStats of the first peer in a WireGuardGetConfiguration buffer, or None."""
+    if len(data) < NT_INTERFACE_SIZE + NT_PEER_SIZE:
+        return None
+    peers_count = struct.unpack_from("<I", data, NT_INTERFACE_PEERS_COUNT)[0]
+    if peers_count == 0:
+        return None
+    peer = NT_INTERFACE_SIZE
+    flags = struct.unpack_from("<I", data, peer + NT_PEER_FLAGS)[0]
+    endpoint = None
+    if flags & NT_PEER_HAS_ENDPOINT:
+        # SOCKADDR_INET: family, port (network order), then the IPv4 address or flow info + IPv6 address
+        sockaddr = peer + NT_PEER_ENDPOINT
+        family = struct.unpack_from("<H", data, sockaddr)[0]
+        port = struct.unpack_from("!H", data, sockaddr + 2)[0]
+        if family == NT_AF_INET:
+            endpoint = "%s:%d" % (socket.inet_ntop(socket.AF_INET, data[sockaddr + 4:sockaddr + 8]), port)
+        elif family == NT_AF_INET6:
+            endpoint = "[%s]:%d" % (socket.inet_ntop(socket.AF_INET6, data[sockaddr + 8:sockaddr + 24]), port)
+    tx_bytes, rx_bytes, last_handshake = struct.unpack_from("<QQQ", data, peer + NT_PEER_TX_BYTES)
+    latest_handshake = (last_handshake - FILETIME_UNIX_EPOCH) // 10**7 if last_handshake else 0
+    return PeerStats(endpoint, max(0, latest_handshake), rx_bytes, tx_bytes)
+
+class WireGuardNT:
+    """Reads an adapter's configuration from the wireguard-nt driver through wireguard.dll (ctypes)."""
+
+    def __init__(self, path=WG_NT_DLL):
+        import ctypes
+        from ctypes import wintypes
+        self._ctypes = ctypes
+        self._dll = ctypes.WinDLL(path, use_last_error=True)
+        self._dll.WireGuardOpenAdapter.argtypes = [wintypes.LPCWSTR]
+        self._dll.WireGuardOpenAdapter.restype = ctypes.c_void_p
+        self._dll.WireGuardCloseAdapter.argtypes = [ctypes.c_void_p]
+        self._dll.WireGuardCloseAdapter.restype = None
+        self._dll.WireGuardGetConfiguration.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(wintypes.DWORD)]
+        self._dll.WireGuardGetConfiguration.restype = wintypes.BOOL
+        self._size = 4096
+
+    def configuration(self, name):
+        """The raw configuration buffer of adapter `name`, or None if there is no such adapter."""
+        ctypes = self._ctypes
+        adapter = self._dll.WireGuardOpenAdapter(name)
+        if not adapter:
+            return None
+        try:
+            while True:
+                buffer = ctypes.create_string_buffer(self._size)
+                size = ctypes.c_ulong(self._size)
+                if self._dll.WireGuardGetConfiguration(adapter, buffer, ctypes.byref(size)):
+                    return buffer.raw[:size.value]
+                error = ctypes.get_last_error()
+                if error != ERROR_MORE_DATA:
+                    raise OSError(error, "WireGuardGetConfiguration failed")
+                self._size = max(size.value, self._size * 2)
+        finally:
+            self._dll.WireGuardCloseAdapter(adapter)
+
+def _sync_with(run, wg_cli, stripped_config):
+    fd, path = tempfile.mkstemp(suffix=".conf")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(stripped_config)
+        run([wg_cli, 'syncconf', TUNNEL_NAME, path], check=True)
+    finally:
+        os.remove(path)
+
+class WindowsServiceBackend:
+    """The WireGuard for Windows tunnel service (`wireguard.exe /installtunnelservice`)."""
+
+    name = "windows"
+
+    def __init__(self):
+        self._driver = None
+        self._fallback_logged = False
+        self._sc_fallback_logged = False
+
+    def _run(self, args, **kwargs):
+        return subprocess.run(args, capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW, **kwargs)
+
+    def install(self, config_path):
+        self._run([WG_EXE, '/installtunnelservice', config_path], check=True)
+
+    def uninstall(self, check=True):
+        self._run([WG_EXE, '/uninstalltunnelservice', TUNNEL_NAME], check=check)
+
+    def sync(self, stripped_config):
+        """Apply peer-level settings to the running interface, like `wg syncconf`."""
+        _sync_with(self._run, WG_CLI, stripped_config)
+
+    def _load_driver(self):
+        if self._driver is None:
+            try:
+                self._driver = WireGuardNT()
+            except OSError:
+                self._driver = False
+                self._log_fallback()
+        return self._driver
+
+    @property
+    def stats_from_process(self):
+        """True when every peer_stats() call runs wg.exe (no wireguard.dll)."""
+        return not self._load_driver()
+
+    def peer_stats(self):
+        """Read from the wireguard-nt driver through wireguard.dll; without it, one wg.exe run per call."""
+        if self._load_driver():
+            try:
+                data = self._driver.configuration(TUNNEL_NAME)
+                return parse_nt_configuration(data) if data is not None else None
+            except OSError:
+                self._log_fallback()
+        result = self._run([WG_CLI, 'show', TUNNEL_NAME, 'dump'], text=True, timeout=5)
+        if result.returncode != 0:
+            return None
+        return parse_dump(result.stdout)
+
+    def _log_fallback(self):
+        if not self._fallback_logged:
+            self._fallback_logged = True
+            logger.warning("Can't read the tunnel from the WireGuard driver (%s), reading peer stats "
+                           "with wg.exe instead", WG_NT_DLL, exc_info=True)
+
+    def is_active(self):
+        if win32service is not None:
+            return self._query_service()
+
+        if not self._sc_fallback_logged:
+            self._sc_fallback_logged = True
+            logger.warning("pywin32 is not installed, running `sc query` for every tunnel status check")
+        result = self._run(['sc', 'query', 'WireGuardTunnel$' + TUNNEL_NAME], text=True, timeout=5)
+        output = result.stdout.lower()
+
+        logger.debug("WireGaurd Query output: %s", output)
+
+        return result.returncode == 0 and 'running' in output
+
+    def _query_service(self):
+        """Ask the service manager directly instead of spawning `sc query`."""
+        manager = win32service.OpenSCManager(None, None, win32service.SC_MANAGER_CONNECT)
+        try:
+            try:
+                service = win32service.OpenService(manager, 'WireGuardTunnel$' + TUNNEL_NAME,
+                                                   win32service.SERVICE_QUERY_STATUS)
+            except win32service.error as e:
+                if e.winerror == ERROR_SERVICE_DOES_NOT_EXIST:
+                    return False
+                raise
+            try:
+                return win32service.QueryServiceStatus(service)[1] == win32service.SERVICE_RUNNING
+            finally:
+                win32service.CloseServiceHandle(service)
+        finally:
+            win32service.CloseServiceHandle(manager)
+
+class LinuxBackend:
+    """wg-quick on Linux; the interface name comes from the config file name (teleport.conf)."""
+
+    name = "linux"
+
+    def __init__(self, wg_quick="wg-quick", wg_cli="wg"):
+        self.wg_quick = wg_quick
+        self.wg_cli = wg_cli
+        self.uapi_socket = "/var/run/wireguard/%s.sock" % TUNNEL_NAME
+        self.config_path = None
+
+    def _run(self, args, **kwargs):
+        return subprocess.run(args, capture_output=True, **kwargs)
+
+    def install(self, config_path):
+        self._run([self.wg_quick, 'up', config_path], check=True)
+        self.config_path = config_path
+
+    def uninstall(self, check=True):
+        if not self.is_active():
+            if check:
+                raise subprocess.CalledProcessError(1, "wg-quick down", stderr=b"Tunnel not found")
+            return
+        if self.config_path is not None:
+            self._run([self.wg_quick, 'down', self.config_path], check=check)
+        else:
+            self._run(['ip', 'link', 'delete', 'dev', TUNNEL_NAME], check=check)
+        self.config_path = None
+
+    def sync(self, stripped_config):
+        _sync_with(self._run, self.wg_cli, stripped_config)
+
+    @property
+    def stats_from_process(self):
+        """True when peer_stats() runs `wg` (kernel module) instead of asking the UAPI socket."""
+        return not os.path.exists(self.uapi_socket)
+
+    def peer_stats(self):
+        # Userspace implementations (wireguard-go, boringtun) answer on a UAPI socket;
+        # the kernel module only talks netlink, so that case still goes through `wg`
+        if os.path.exists(self.uapi_socket):
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(5)
+                    sock.connect(self.uapi_socket)
+                    with sock.makefile('rwb') as stream:
+                        return parse_uapi(_read_uapi(stream))
+            except OSError:
+                logger.debug("UAPI socket unavailable, falling back to wg", exc_info=True)
+        result = self._run([self.wg_cli, 'show', TUNNEL_NAME, 'dump'], text=True, timeout=5)
+        if result.returncode != 0:
+            return None
+        return parse_dump(result.stdout)
+
+    def is_active(self):
+        # Reading sysfs is enough here, no process per check
+        return os.path.exists(os.path.join("/sys/class/net", TUNNEL_NAME))
+
+class FakeBackend:
+    """In-memory tunnel for benchmarks and tests; records every call it receives."""
+
+    name = "fake"
+    stats_from_process = False
+
+    def __init__(self, install_delay=0.0, uninstall_delay=0.0, sync_delay=0.0, handshake_delay=0.0):
+        self.install_delay = install_delay
+        self.uninstall_delay = uninstall_delay
+        self.sync_delay = sync_delay
+        self.handshake_delay = handshake_delay
+        # Whether the configured peer answers handshakes (a stale cached session does not)
+        self.peer_reachable = True
+        self.endpoint = None
+        self.handshake_at = 0
+        self.rx_bytes = 0
+        self.tx_bytes = 0
+        self.active = False
+        self.config = None
+        self.synced_config = None
+        self.calls = []
+        self._stop = threading.Event()
+
+    def install(self, config_path):
+        self.calls.append(("install", config_path))
+        if self.active:
+            raise subprocess.CalledProcessError(1, "install", stderr=b"Tunnel already installed")
+        with open(config_path, 'r') as f:
+            self.config = f.read()
+        self._stop.wait(self.install_delay)
+        self.active = True
+        self._start_session(self.config)
+
+    def uninstall(self, check=True):
+        self.calls.append(("uninstall",))
+        if not self.active:
+            if check:
+                raise subprocess.CalledProcessError(1, "uninstall", stderr=b"Tunnel not found")
+            return
+        self._stop.wait(self.uninstall_delay)
+        self.active = False
+        self.config = None
+        self.synced_config = None
+
+    def sync(self, stripped_config):
+        self.calls.append(("sync",))
+        if not self.active:
+            raise subprocess.CalledProcessError(1, "syncconf", stderr=b"Unable to access interface: No such device")
+        self._stop.wait(self.sync_delay)
+        self.synced_config = stripped_config
+        self._start_session(stripped_config)
+
+    def _start_session(self, config):
+        self.endpoint = None
+        for line in config.splitlines():
+            if line.replace(" ", "").lower().startswith("endpoint="):
+                self.endpoint = line.split("=", 1)[1].strip()
+        self.handshake_at = time.time() + self.handshake_delay if self.peer_reachable else 0
+
+    def peer_stats(self):
+        self.calls.append(("peer_stats",))
+        if not self.active:
+            return None
+        latest_handshake = self.handshake_at if 0 < self.handshake_at <= time.time() else 0
+        return PeerStats(self.endpoint, latest_handshake, self.rx_bytes, self.tx_bytes)
+
+    def is_active(self):
+        self.calls.append(("is_active",))
+        return self.active
+
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if sys.platform == "win32":
+            _backend = WindowsServiceBackend()
+        elif sys.platform.startswith("linux"):
+            _backend = LinuxBackend()
+        else:
+            _backend = FakeBackend()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+    return backend
@@ -0,0 +1,129 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import logging
+import threading
+import time
+
+from tunnel_backends import get_backend
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# How often the watcher probes the backend, normally and while someone waits for a change
+POLL_INTERVAL = 3.0
+FAST_POLL_INTERVAL = 0.2
+
+class TunnelStatusService:
+    """Single owner of the tunnel state.
+
+    One watcher thread probes the backend and pushes changes to subscribers;
+    everyone else reads the cached value instead of probing themselves.
+    """
+
+    def __init__(self, backend=None, interval=POLL_INTERVAL, fast_interval=FAST_POLL_INTERVAL):
+        self._backend = backend
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self._active = None
+        self._subscribers = []
+        self._waiters = 0
+        self._condition = threading.Condition()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else get_backend()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._watch, name="tunnel-status", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call `callback(active)` on every state change (from the watcher thread). Returns an unsubscribe function."""
+        with self._condition:
+            self._subscribers.append(callback)
+        def unsubscribe():
+            with self._condition:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def is_active(self):
+        """The cached tunnel state; probes once if nothing is known yet."""
+        if self._active is None:
+            return self.refresh()
+        return self._active
+
+    def refresh(self):
+        """Probe the backend now, e.g. right after installing or removing the tunnel."""
+        try:
+            active = bool(self.backend.is_active())
+        except Exception:
+            logger.warning("Error while checking for active tunnel", exc_info=True)
+            active = False
+        self._update(active)
+        return active
+
+    def wait_for_state(self, active, timeout):
+        """Block until the tunnel is (in)active or `timeout` seconds pass; returns whether it got there."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._waiters += 1
+        self._wake.set()
+        try:
+            if self.refresh() == active:
+                return True
+            with self._condition:
+                while self._active != active:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    if self._thread is None:
+                        # Nobody is watching, probe from here instead
+                        self._condition.release()
+                        try:
+                            time.sleep(min(self.fast_interval, remaining))
+                            self.refresh()
+                        finally:
+                            self._condition.acquire()
+                    else:
+                        self._condition.wait(remaining)
+                return True
+        finally:
+            with self._condition:
+                self._waiters -= 1
+
+    def _update(self, active):
+        with self._condition:
+            changed = active != self._active
+            self._active = active
+            subscribers = list(self._subscribers) if changed else []
+            self._condition.notify_all()
+        if changed:
+            logger.info("Teleport Tunnel is %s", "active" if active else "stopped")
+        for callback in subscribers:
+            try:
+                callback(active)
+            except Exception:
+                logger.warning("Error in tunnel status subscriber", exc_info=True)
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            self.refresh()
+            self._wake.wait(self.fast_interval if self._waiters else self.interval)
+            self._wake.clear()
+
+_service = TunnelStatusService()
+
+def get_status_service():
+    return _service
@@ -1,19 +1,98 @@
 # Copyright (c) 2026 Jeff Nedley
 # Licensed under the MIT License (see LICENSE for details)
 
-import os
-import time
+import itertools
+import queue
 import logging
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import customtkinter as ctk
 
-from config import TOKEN_FILE, UUID_FILE, CONFIG_PATH, ICON_PATH
-from tunnel import generate_config, activate_tunnel, deactivate_tunnel, is_tunnel_active
-from notifications import show_toast
+from config import ICON_PATH, WORKER_IDLE_TIMEOUT
+from dnscache import get_dns_cache
+from profiles import get_profile_store
+from tunnel import generate_config, activate_tunnel, deactivate_tunnel, is_tunnel_active, fast_reconnect, refresh_tunnel, use_negotiator
+from notifications import get_dispatcher, show_toast
+from runtime import get_runtime
+from tunnel_status import get_status_service
+from supervisor import get_supervisor
 
 logger = logging.getLogger("AmpliFi Teleport for Desktop")
 
+# Connect/disconnect/delete run here, one at a time, never on the Tk thread
+_action_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ui-action")
+
+# How often the window picks up finished actions and tunnel state changes
+EVENT_POLL_MS = 50
+
+# Last entry of the router selector, asks for a name and adds a profile
+ADD_PROFILE_OPTION = "Add Router..."
+
+# Pipe to the tray process when the window runs in its own process (see run_window_process)
+_tray = None
+_tray_lock = threading.Lock()
+
+def _tell_tray(*message):
+    with _tray_lock:
+        try:
+            _tray.send(message)
+        except (OSError, EOFError):
+            logger.warning("Lost the connection to the tray process", exc_info=True)
+
+class TrayNegotiator:
+    """Runs this process's negotiations in the tray's negotiator, which keeps keys, HTTP connections and ICE config warm."""
+
+    def __init__(self):
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, timeout=None):
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        try:
+            _tell_tray("negotiate", request_id, func, args)
+            return future.result(timeout)
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def resolve(self, request_id, result, error):
+        with self._lock:
+            future = self._pending.get(request_id)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def fail_all(self):
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            if not future.done():
+                future.set_exception(Exception("Lost the connection to the tray process"))
+
+_tray_negotiator = TrayNegotiator()
+
+class TrayNotificationBackend:
+    """Shows this process's notifications through the tray, which coalesces them with its own."""
+
+    def notify(self, title, message):
+        _tell_tray("toast", title, message)
+
+def _cancel_supervisor():
+    """Taking the tunnel down on purpose must not look like an outage to repair."""
+    if _tray is not None:
+        _tell_tray("cancel_supervisor")
+    else:
+        get_supervisor().cancel()
+
 def custom_pin_dialog():
     """Custom PIN input dialog with centered label"""
     dialog = ctk.CTkToplevel()
@@ -170,51 +249,78 @@ def custom_confirm_dialog(title, message):
     confirm_dialog.wait_window()
     return result[0]
 
-def open_options_window(icon=None, item=None):
-    """Opens a modern CustomTkinter window with control buttons."""
-    ctk.set_appearance_mode("dark")
-    ctk.set_default_color_theme("blue")
-
-    root = ctk.CTk()
-    root.title("AmpliFi Teleport for Desktop")
-    root.geometry("350x320")
-    root.resizable(False, False)
-    root.configure(bg="#181818")
-    root.iconbitmap(ICON_PATH)
-    
-    root.update_idletasks()
-    width = root.winfo_width()
-    height = root.winfo_height()
-    x = (root.winfo_screenwidth() // 2) - (width // 2)
-    y = (root.winfo_screenheight() // 2) - (height // 2)
-    root.geometry(f"{width}x{height}+{x}+{y}")
-
-    header_frame = ctk.CTkFrame(root, fg_color="#1a9aff", corner_radius=0)
-    header_frame.pack(fill="x", pady=(0, 10))
-
-    header_label = ctk.CTkLabel(
-        header_frame,
-        text="AmpliFi Teleport for Desktop",
-        font=("Arial", 18, "bold"),
-        text_color="white"
-    )
-    header_label.pack(pady=12)
-
-    content_frame = ctk.CTkFrame(root, fg_color="transparent")
-    content_frame.pack(fill="both", expand=True, padx=20, pady=10)
-    
-    ctk.CTkLabel(
-        root,
-        text="Version 1.0.0",
-        font=("Arial", 10),
-        text_color="#888888"
-    ).pack(side="bottom", pady=(0, 10))
-
-    def refresh_buttons():
-        for widget in content_frame.winfo_children():
-            widget.destroy()
-
-        tunnel_active = is_tunnel_active(retries=4, delay=0.8)
+class ControlWindow:
+    """The control window, built once and then only shown, hidden and updated in place."""
+
+    def __init__(self, icon=None):
+        self.icon = icon
+
+        ctk.set_appearance_mode("dark")
+        ctk.set_default_color_theme("blue")
+
+        root = self.root = ctk.CTk()
+        root.title("AmpliFi Teleport for Desktop")
+        root.geometry("350x420")
+        root.resizable(False, False)
+        root.configure(bg="#181818")
+        root.iconbitmap(ICON_PATH)
+        
+        root.update_idletasks()
+        width = root.winfo_width()
+        height = root.winfo_height()
+        x = (root.winfo_screenwidth() // 2) - (width // 2)
+        y = (root.winfo_screenheight() // 2) - (height // 2)
+        root.geometry(f"{width}x{height}+{x}+{y}")
+
+        header_frame = ctk.CTkFrame(root, fg_color="#1a9aff", corner_radius=0)
+        header_frame.pack(fill="x", pady=(0, 10))
+
+        header_label = ctk.CTkLabel(
+            header_frame,
+            text="AmpliFi Teleport for Desktop",
+            font=("Arial", 18, "bold"),
+            text_color="white"
+        )
+        header_label.pack(pady=12)
+
+        self.status_label = ctk.CTkLabel(
+            root,
+            text="",
+            font=("Arial", 12),
+            text_color="#888888",
+            wraplength=300
+        )
+        self.status_label.pack()
+
+        # Router profiles: the selected one is what Connect, Refresh and Delete work on
+        self.profile_menu = ctk.CTkOptionMenu(
+            root,
+            values=[ADD_PROFILE_OPTION],
+            width=280,
+            fg_color="#2d2d2d",
+            button_color="#2d2d2d",
+            button_hover_color="#444444",
+            command=self.profile_selected
+        )
+        self.profile_menu.pack(pady=(10, 0))
+        self.endpoint_label = ctk.CTkLabel(
+            root,
+            text="",
+            font=("Arial", 10),
+            text_color="#888888"
+        )
+        self.endpoint_label.pack()
+        self._profile_ids = {}
+
+        content_frame = ctk.CTkFrame(root, fg_color="transparent")
+        content_frame.pack(fill="both", expand=True, padx=20, pady=10)
+        
+        ctk.CTkLabel(
+            root,
+            text="Version 1.0.0",
+            font=("Arial", 10),
+            text_color="#888888"
+        ).pack(side="bottom", pady=(0, 10))
 
         button_style = {
             "width": 280,
@@ -224,61 +330,348 @@ def open_options_window(icon=None, item=None):
             "font": ("Arial", 14, "bold")
         }
 
-        if not tunnel_active:
-            ctk.CTkButton(
-                content_frame,
-                text="Connect",
-                fg_color="#1a9aff",
-                hover_color="#0d6efd",
-                command=lambda: action_and_refresh(on_connect),
-                **button_style
-            ).pack(pady=10)
-
-        if tunnel_active:
-            ctk.CTkButton(
-                content_frame,
-                text="Disconnect",
-                fg_color="#1a9aff",
-                hover_color="#0d6efd",
-                command=lambda: action_and_refresh(on_disconnect),
-                **button_style
-            ).pack(pady=10)
-
-        if os.path.exists(TOKEN_FILE) or os.path.exists(UUID_FILE) or os.path.exists(CONFIG_PATH):
-            ctk.CTkButton(
-                content_frame,
-                text="Delete Existing Configuration",
-                fg_color="#1a9aff",
-                hover_color="#0d6efd",
-                command=lambda: action_and_refresh(on_delete_config),
-                **button_style
-            ).pack(pady=10)
-
-        ctk.CTkButton(
+        self.connect_button = ctk.CTkButton(
+            content_frame,
+            text="Connect",
+            fg_color="#1a9aff",
+            hover_color="#0d6efd",
+            command=self.connect_clicked,
+            **button_style
+        )
+        self.disconnect_button = ctk.CTkButton(
+            content_frame,
+            text="Disconnect",
+            fg_color="#1a9aff",
+            hover_color="#0d6efd",
+            command=lambda: self.start_action("Disconnecting...", lambda: on_disconnect(icon=None, item=None)),
+            **button_style
+        )
+        self.delete_button = ctk.CTkButton(
+            content_frame,
+            text="Delete Existing Configuration",
+            fg_color="#1a9aff",
+            hover_color="#0d6efd",
+            command=self.delete_clicked,
+            **button_style
+        )
+        self.quit_button = ctk.CTkButton(
             content_frame,
             text="Quit",
             fg_color="#e74c3c",
             hover_color="#c0392b",
-            command=lambda: [sys.exit(0)],
+            command=lambda: quit_application(self.icon),
             **button_style
-        ).pack(pady=10)
+        )
+        self.action_buttons = (self.connect_button, self.disconnect_button, self.delete_button)
+
+        # Results of background actions, tunnel state changes and show requests
+        # from other threads, drained on the Tk thread; while the window is
+        # hidden draining pauses until something other than a status change comes in
+        self.events = queue.Queue()
+        self.busy = False
+        self.closing = False
+        self.hidden = False
+        self._layout = None
+        self._retire_job = None
+        self._drain_job = None
+        self._paused = False
+        self._events_lock = threading.Lock()
+
+        self._unsubscribe = get_status_service().subscribe(lambda active: self._post("status", active))
+
+        root.protocol("WM_DELETE_WINDOW", self.hide)
+
+        self.refresh_buttons()
+        self._drain_events()
+
+    def set_status(self, text, color="#888888"):
+        self.status_label.configure(text=text, text_color=color)
+
+    def refresh_buttons(self):
+        """Show the buttons that fit the current state; widgets are re-packed only when that changes."""
+        tunnel_active = is_tunnel_active()
+        profile = get_profile_store().active()
+        has_config = profile.has("device_token") or profile.has("client_hint") or profile.has("config")
+        # An added router can be deleted even before it ever connected
+        has_config = has_config or len(get_profile_store().list()) > 1
+
+        visible = [self.disconnect_button if tunnel_active else self.connect_button]
+        if has_config:
+            visible.append(self.delete_button)
+        visible.append(self.quit_button)
+
+        if visible != self._layout:
+            for button in (self.connect_button, self.disconnect_button, self.delete_button, self.quit_button):
+                button.pack_forget()
+            for button in visible:
+                button.pack(pady=10)
+            self._layout = visible
+
+        state = "disabled" if self.busy else "normal"
+        for button in self.action_buttons:
+            button.configure(state=state)
+        self.profile_menu.configure(state=state)
+        self.refresh_profiles(profile)
+
+    def refresh_profiles(self, active=None):
+        """Fill the router selector and show the active router's last-good endpoint."""
+        store = get_profile_store()
+        active = active or store.active()
+        self._profile_ids = {profile.name: profile.id for profile in store.list()}
+        values = list(self._profile_ids) + [ADD_PROFILE_OPTION]
+        if values != self.profile_menu.cget("values"):
+            self.profile_menu.configure(values=values)
+        self.profile_menu.set(active.name)
+        endpoint = active.endpoint
+        self.endpoint_label.configure(text=f"Last endpoint: {endpoint}" if endpoint else "Not connected yet")
+
+    def profile_selected(self, choice):
+        if self.busy:
+            self.refresh_profiles()
+            return
+        store = get_profile_store()
+        if choice == ADD_PROFILE_OPTION:
+            name = ctk.CTkInputDialog(text="Name of the router", title="Add Router").get_input()
+            if not name or not name.strip():
+                self.refresh_profiles()
+                return
+            target = store.create(name.strip()).id
+        else:
+            target = self._profile_ids.get(choice)
+        if target is None or target == store.active().id:
+            self.refresh_profiles()
+            return
+        self.start_action("Switching router...", lambda: switch_profile(target))
+
+    def show(self):
+        """Bring the window up (Tk thread only, see request_show)."""
+        if self._retire_job is not None:
+            self.root.after_cancel(self._retire_job)
+            self._retire_job = None
+        self.closing = False
+        self.hidden = False
+        if not self.busy:
+            # Status changes were only queued while hidden
+            self.refresh_buttons()
+        self.root.deiconify()
+        self.root.lift()
+        self.root.focus_force()
+        self.report_shown()
+
+    def report_shown(self):
+        """Tell the tray once the window is up and idle (window process only)."""
+        if _tray is not None:
+            self.root.after_idle(lambda: _tell_tray("shown"))
+
+    def _post(self, kind, value=None):
+        """Queue an event for the Tk thread, waking the paused event loop unless it is only a status change."""
+        with self._events_lock:
+            self.events.put((kind, value))
+            wake = self._paused and kind != "status"
+            if wake:
+                self._paused = False
+        if wake:
+            try:
+                # From other threads, tkinter hands this to the Tk thread's main loop
+                self._drain_job = self.root.after(0, self._drain_events)
+            except RuntimeError:
+                logger.warning("Could not wake the control window for %s", kind, exc_info=True)
+
+    def request_show(self):
+        """Thread-safe show, e.g. from the tray icon's thread."""
+        self._post("show")
+
+    def request_quit(self):
+        """Thread-safe end of the Tk main loop."""
+        self._post("quit")
+
+    def request_hide(self):
+        self._post("hide")
+
+    def hide(self):
+        self.hidden = True
+        self.root.withdraw()
+        if _tray is not None and self._retire_job is None:
+            # A hidden window process stays ready for the next open, for a while
+            self._retire_job = self.root.after(int(WORKER_IDLE_TIMEOUT * 1000), self._retire)
+
+    def _retire(self):
+        """End the window process (once a running action is done) after it was hidden for WORKER_IDLE_TIMEOUT."""
+        self._retire_job = None
+        self.closing = True
+        if not self.busy:
+            self.request_quit()
+
+    def run(self):
+        self.root.mainloop()
+
+    def connect_clicked(self):
+        if self.busy:
+            return
+        if get_profile_store().active().has("device_token"):
+            self.start_action("Connecting...", lambda: on_connect(icon=None, item=None))
+            return
+        # Dialogs belong to the Tk thread, only the network work goes to the worker
+        pin = custom_pin_dialog()
+        if not pin or pin.strip() == "":
+            self.set_status("No PIN entered.")
+            return
+        self.start_action("Connecting...", lambda: connect_with_pin(pin, and_activate=True))
 
-    def action_and_refresh(action_func):
-        success, msg = action_func(icon=None, item=None)
+    def delete_clicked(self):
+        if self.busy:
+            return
+        if custom_confirm_dialog("Confirm Deletion", _delete_question()):
+            self.start_action("Deleting configuration...", delete_config)
 
-        time.sleep(1.5)
+    def start_action(self, label, work):
+        """Run `work` on the action worker; clicks while an action is running are ignored."""
+        if self.busy:
+            return
+        self.busy = True
+        self.set_status(label)
+        self.refresh_buttons()
+        future = _action_executor.submit(work)
+        future.add_done_callback(lambda f: self._post("done", f))
+
+    def finish_action(self, future):
+        self.busy = False
+        try:
+            result = future.result()
+            success, msg = result if result else (False, "Action cancelled")
+        except Exception as e:
+            logger.error("Error While Running Action", exc_info=True)
+            success, msg = False, str(e)
+        self.set_status(msg, "#888888" if success else "#e74c3c")
+        self.refresh_buttons()
+        if self.closing:
+            self.request_quit()
+
+    def destroy(self):
+        """Tear the window down and stop listening for tunnel state changes."""
+        self._unsubscribe()
+        if self._drain_job is not None:
+            self.root.after_cancel(self._drain_job)
+            self._drain_job = None
+        self.root.destroy()
+
+    def _drain_events(self):
+        if self._drain_job is not None:
+            # Called directly while a poll was scheduled: this call replaces it
+            self.root.after_cancel(self._drain_job)
+            self._drain_job = None
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "done":
+                self.finish_action(value)
+            elif kind == "status" and not self.busy:
+                self.refresh_buttons()
+            elif kind == "show":
+                self.show()
+            elif kind == "hide":
+                self.hide()
+            elif kind == "quit":
+                self.destroy()
+                return
+        with self._events_lock:
+            if self.hidden and self.events.empty():
+                self._paused = True
+                return
+        self._drain_job = self.root.after(EVENT_POLL_MS, self._drain_events)
+
+_window = None
+
+def open_options_window(icon=None, item=None, on_ready=None):
+    """Opens the control window.
+
+    The first call builds the window and runs the Tk main loop on the calling
+    thread, which must be the main thread; later calls (from any thread, e.g.
+    the tray) just show it again. on_ready(window) runs before the main loop.
+    """
+    global _window
+    if _window is not None:
+        _window.request_show()
+        return
+    _window = ControlWindow(icon)
+    if on_ready is not None:
+        on_ready(_window)
+    _window.run()
+
+def run_window_process(tray_conn):
+    """Entry point of the window process started by the tray (workers.WindowProcess)."""
+    global _tray, _window
+    _tray = tray_conn
+    get_dispatcher().set_backend(TrayNotificationBackend())
+    # The tray rate-limits toasts itself
+    get_dispatcher().min_interval = 0
+    use_negotiator(_tray_negotiator)
+    get_status_service().start()
+
+    _window = ControlWindow()
+    _window.report_shown()
+    threading.Thread(target=_read_tray, args=(_window,), name="tray-pipe", daemon=True).start()
+    try:
+        _window.run()
+    finally:
+        _action_executor.shutdown(wait=True)
+        get_dispatcher().stop(timeout=2.0)
+        get_status_service().stop()
+        tray_conn.close()
+
+def _read_tray(window):
+    while True:
+        try:
+            kind, *args = _tray.recv()
+        except (EOFError, OSError):
+            # The tray is gone, so is the app
+            _tray_negotiator.fail_all()
+            window.request_quit()
+            return
+        if kind == "negotiated":
+            _tray_negotiator.resolve(*args)
+        elif kind == "show":
+            window.request_show()
+        elif kind == "hide":
+            window.request_hide()
+        elif kind == "quit":
+            window.request_quit()
+            return
 
-        refresh_buttons()
+def quit_application(icon=None, item=None):
+    """Stop networking, the tray icon and the window; safe to call from any thread."""
+    if _tray is not None:
+        # The tray owns everything else and will tell this window to close
+        _tell_tray("quit")
+        return
+    get_supervisor().stop()
+    get_dispatcher().stop()
+    get_dns_cache().stop()
+    teleport = sys.modules.get("teleport")
+    if teleport is not None:
+        teleport.shutdown()
+    else:
+        # Nothing ever connected, so there are no pooled connections to close
+        get_runtime().stop()
+    if icon is not None:
+        icon.stop()
+    if _window is not None:
+        _window.request_quit()
+    elif threading.current_thread() is threading.main_thread():
+        sys.exit(0)
+    # Otherwise the main thread is still building the window and ends it once built
 
-    refresh_buttons()
-    root.mainloop()
-    
-    
 def show_pin_dialog(and_activate=True):
     pin = custom_pin_dialog()
     if not pin or pin.strip() == "":
         return False, "No PIN entered."
 
+    return connect_with_pin(pin, and_activate)
+
+def connect_with_pin(pin, and_activate=True):
+    """Generate a config from a PIN (and activate it); safe to run off the Tk thread."""
     success, msg = generate_config(pin)
     if not success:
         return False, msg
@@ -295,9 +688,19 @@ def show_pin_dialog(and_activate=True):
         return True, "Config generated successfully"
 
 def on_refresh_config(icon, item):
-    if not os.path.exists(TOKEN_FILE):
+    if not get_profile_store().active().has("device_token"):
         show_toast("Error", "No previous configuration. Enter a PIN first.")
         return
+    if is_tunnel_active():
+        # Negotiate the new session while the current tunnel keeps working
+        success, msg = refresh_tunnel()
+        show_toast("Status Update", "Teleport refreshed!" if success else f"Refresh failed: {msg}")
+        return success, msg
+    # Try the cached config first, a full WebRTC renegotiation only if its peer is gone
+    fast_success, fast_msg = fast_reconnect()
+    if fast_success:
+        show_toast("Status Update", "Teleport connected!")
+        return fast_success, fast_msg
     success, msg = generate_config(pin=None)
     if success:
         act_success, act_msg = activate_tunnel()
@@ -309,7 +712,7 @@ def on_refresh_config(icon, item):
         return success, msg
 
 def on_connect(icon, item):
-    if not os.path.exists(TOKEN_FILE):
+    if not get_profile_store().active().has("device_token"):
         try:
             show_pin_dialog(and_activate=True)
             return True, "Successfully Created New Connection"
@@ -320,6 +723,7 @@ def on_connect(icon, item):
         return on_refresh_config(icon=None, item=None)
 
 def on_disconnect(icon, item):
+    _cancel_supervisor()
     if not is_tunnel_active():
         show_toast("Error", "No Teleport Tunnel is active")
         return False, "No Teleport Tunnel is active"
@@ -328,20 +732,51 @@ def on_disconnect(icon, item):
         show_toast("Status Update", "Teleport disconnected!")
         return success, msg
 
+def switch_profile(profile_id):
+    """Make another router the active one, taking down the current router's tunnel; safe to run off the Tk thread."""
+    store = get_profile_store()
+    if is_tunnel_active():
+        _cancel_supervisor()
+        success, msg = deactivate_tunnel()
+        if not success:
+            return False, msg
+    profile = store.switch(profile_id)
+    logger.info("Switched to profile %s", profile.id)
+    if profile.has("device_token"):
+        return True, f"Switched to {profile.name}"
+    return True, f"Switched to {profile.name}, click Connect to enter its PIN"
+
+def _delete_question():
+    store = get_profile_store()
+    if len(store.list()) > 1:
+        return f"Delete router {store.active().name} and its Teleport configuration?"
+    return "Delete previous Teleport configuration?"
+
 def on_delete_config(icon, item):
-    if custom_confirm_dialog("Confirm Deletion", "Delete previous Teleport configuration?"):
-        try:
-            logger.debug("Disregard following deactivation error if any")
-            deactivate_tunnel()
-            if os.path.exists(TOKEN_FILE):
-                os.remove(TOKEN_FILE)
-            if os.path.exists(UUID_FILE):
-                os.remove(UUID_FILE)
-            if os.path.exists(CONFIG_PATH):
-                os.remove(CONFIG_PATH)
-            show_toast("Config Update", "Existing configuration deleted!")
-            return True, "Configuration Deleted"
-        except Exception as e:
-            logger.error("Error While Deleting Existing Configuration", exc_info=True)
-            show_toast("Error", f"Deletion failed: {str(e)}")
-            return False, "Error while deleting configuration"
\ No newline at end of file
+    if custom_confirm_dialog("Confirm Deletion", _delete_question()):
+        return delete_config()
+
+def delete_config():
+    """Remove the tunnel and the selected router's configuration; safe to run off the Tk thread.
+
+    With several routers the profile itself goes and the next one becomes
+    active; the last one is kept, only emptied.
+    """
+    try:
+        logger.debug("Disregard following deactivation error if any")
+        _cancel_supervisor()
+        deactivate_tunnel()
+        store = get_profile_store()
+        profile = store.active()
+        if len(store.list()) > 1:
+            store.delete(profile.id)
+            logger.info("Deleted profile %s", profile.id)
+            show_toast("Config Update", f"Router {profile.name} deleted!")
+            return True, f"Deleted {profile.name}, now using {store.active().name}"
+        profile.clear()
+        show_toast("Config Update", "Existing configuration deleted!")
+        return True, "Configuration Deleted"
+    except Exception as e:
+        logger.error("Error While Deleting Existing Configuration", exc_info=True)
+        show_toast("Error", f"Deletion failed: {str(e)}")
+        return False, "Error while deleting configuration"
@@ -0,0 +1,95 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+# Keys understood by `wg setconf`/`wg syncconf`; everything else in an
+# [Interface] section (Address, DNS, MTU, Table, Pre/PostUp, ...) is applied
+# by the tunnel service when it brings the interface up.
+WG_INTERFACE_KEYS = {"privatekey", "listenport", "fwmark"}
+
+# Peer keys that also decide the interface routes, so changing them needs a reinstall
+ROUTE_PEER_KEYS = {"allowedips"}
+
+# Interface keys a running tunnel can keep its old value of: a probed MTU that
+# differs between sessions takes effect at the next reinstall instead of forcing one
+DEFERRED_INTERFACE_KEYS = {"mtu"}
+
+def parse_config(text):
+    """Split a WireGuard config into [(section, {key: value})], keys lower-cased."""
+    sections = []
+    for raw_line in text.splitlines():
+        line = raw_line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            sections.append((line[1:-1].strip().lower(), {}))
+        elif "=" in line and sections:
+            key, value = line.split("=", 1)
+            sections[-1][1][key.strip().lower()] = " ".join(value.split())
+    return sections
+
+def _split(sections):
+    interface = {}
+    peers = {}
+    for name, values in sections:
+        if name == "interface":
+            interface.update(values)
+        elif name == "peer":
+            peers[values.get("publickey")] = values
+    return interface, peers
+
+def change_scope(old_text, new_text):
+    """How a tunnel running `old_text` has to change to run `new_text`.
+
+    Returns None when nothing changed, "peer" when `wg syncconf` can apply
+    the change live (endpoint, keys, listen port, keepalive; an MTU change
+    waits for the next reinstall) and "interface" when the tunnel service has
+    to be reinstalled.
+    """
+    old_interface, old_peers = _split(parse_config(old_text))
+    new_interface, new_peers = _split(parse_config(new_text))
+
+    def service_keys(interface):
+        return {key: value for key, value in interface.items()
+                if key not in WG_INTERFACE_KEYS and key not in DEFERRED_INTERFACE_KEYS}
+
+    def routes(peers):
+        return sorted(
+            tuple(",".join(sorted(part.strip() for part in peer.get(key, "").split(",")))
+                  for key in sorted(ROUTE_PEER_KEYS))
+            for peer in peers.values())
+
+    if service_keys(old_interface) != service_keys(new_interface) or routes(old_peers) != routes(new_peers):
+        return "interface"
+    if old_interface != new_interface or old_peers != new_peers:
+        return "peer"
+    return None
+
+def strip_config(text):
+    """Keep only what `wg syncconf` accepts, like `wg-quick strip`."""
+    lines = []
+    section = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip().lower()
+            lines.append(line)
+        elif "=" in line and section == "interface":
+            if line.split("=", 1)[0].strip().lower() in WG_INTERFACE_KEYS:
+                lines.append(line)
+        elif line:
+            lines.append(line)
+        else:
+            lines.append("")
+    return "\n".join(lines)
+
+def has_kill_switch(text):
+    """Whether WireGuard for Windows blocks untunneled traffic for this config.
+
+    It does for a single peer routing 0.0.0.0/0 or ::/0, and then also lets
+    DNS (port 53) reach only the config's own DNS servers.
+    """
+    _, peers = _split(parse_config(text))
+    if len(peers) != 1:
+        return False
+    routes = {part.strip() for peer in peers.values() for part in peer.get("allowedips", "").split(",")}
+    return bool(routes & {"0.0.0.0/0", "::/0"})
@@ -0,0 +1,94 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import base64
+import logging
+import queue
+import threading
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+def generate_keypair():
+    """Generate a WireGuard (Curve25519) keypair in-process, same output as `wg genkey | wg pubkey`."""
+    raw = bytearray(X25519PrivateKey.generate().private_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PrivateFormat.Raw,
+        encryption_algorithm=serialization.NoEncryption()
+    ))
+
+    # Clamp the scalar the way `wg genkey` does
+    raw[0] &= 248
+    raw[31] = (raw[31] & 127) | 64
+
+    private_key = X25519PrivateKey.from_private_bytes(bytes(raw))
+    public_raw = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+
+    return base64.b64encode(bytes(raw)).decode("ascii"), base64.b64encode(public_raw).decode("ascii")
+
+class KeyPool:
+    """Keeps a few fresh keypairs ready so a connect never waits on keygen.
+
+    Every keypair is handed out exactly once; a background thread refills the pool.
+    """
+
+    def __init__(self, size=2):
+        self.size = size
+        self._keys = queue.Queue(maxsize=size)
+        self._wanted = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._wanted.set()
+        self._thread = threading.Thread(target=self._fill, name="wg-key-pool", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wanted.set()
+
+    def get(self):
+        """Return a ready keypair, or generate one inline if the pool is empty."""
+        try:
+            keypair = self._keys.get_nowait()
+        except queue.Empty:
+            logger.debug("Key pool empty, generating keypair inline")
+            keypair = generate_keypair()
+        self._wanted.set()
+        return keypair
+
+    def _fill(self):
+        while not self._stopped.is_set():
+            self._wanted.wait()
+            self._wanted.clear()
+            while not self._stopped.is_set() and not self._keys.full():
+                try:
+                    self._keys.put_nowait(generate_keypair())
+                except queue.Full:
+                    break
+                except Exception:
+                    logger.warning("Error while pre-generating WireGuard keys", exc_info=True)
+                    break
+
+_pool = None
+
+def start_key_pool(size=2):
+    """Start the shared background key pool (optional; keygen falls back to inline)."""
+    global _pool
+    if _pool is None and size > 0:
+        _pool = KeyPool(size).start()
+    return _pool
+
+def get_keypair():
+    if _pool is not None:
+        return _pool.get()
+    return generate_keypair()
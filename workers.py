@@ -0,0 +1,244 @@
+# Copyright (c) 2026 Jeff Nedley
+# Licensed under the MIT License (see LICENSE for details)
+
+import importlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import tracing
+from config import KEY_POOL_SIZE, TRACE_FILE, TRACING_ENABLED, WORKER_IDLE_TIMEOUT
+from logsetup import forward_logging, get_child_log_queue
+
+logger = logging.getLogger("AmpliFi Teleport for Desktop")
+
+# Fresh interpreters on every platform, as on Windows; nothing heavy is inherited from the tray
+_context = multiprocessing.get_context("spawn")
+
+def _init_worker(log_queue, initializer, initargs):
+    forward_logging(log_queue)
+    if initializer is not None:
+        initializer(*initargs)
+
+def _call(func, args):
+    """Run a job in the worker; its metrics travel back with the result and are merged by the caller."""
+    try:
+        return func(*args), None, tracing.metrics.drain()
+    except Exception as e:
+        return None, e, tracing.metrics.drain()
+
+def _init_negotiator(tracing_enabled, trace_file, key_pool_size):
+    if tracing_enabled:
+        tracing.enable(trace_file)
+    # Negotiations take their keys from here instead of generating them on the spot
+    from wgkeys import start_key_pool
+    start_key_pool(key_pool_size)
+
+def _warm_up():
+    """Load WebRTC ahead of the first negotiation."""
+    importlib.import_module("teleport")
+
+def _run_entry_point(log_queue, module_name, function_name, args):
+    forward_logging(log_queue)
+    getattr(importlib.import_module(module_name), function_name)(*args)
+
+class WorkerPool:
+    """A worker process that is started on the first job and exits after `idle_timeout` seconds without one.
+
+    Only the worker imports what the jobs need, so the calling process stays
+    small. While `keep_warm(True)` is in effect it doesn't exit when idle.
+    Metrics recorded by jobs are merged into this process's metrics.
+    """
+
+    def __init__(self, name, idle_timeout=WORKER_IDLE_TIMEOUT, initializer=None, initargs=()):
+        self.name = name
+        self.idle_timeout = idle_timeout
+        self.initializer = initializer
+        self.initargs = initargs
+        self.started = 0
+        self._executor = None
+        self._pending = 0
+        self._idle_timer = None
+        self._warm = False
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self._executor is not None
+
+    def keep_warm(self, warm, warm_up=_warm_up):
+        """Keep the worker running (started now, with `warm_up` run in it) until keep_warm(False)."""
+        with self._lock:
+            self._warm = warm
+        if warm:
+            self.submit(warm_up).add_done_callback(self._warm_up_done)
+        else:
+            with self._lock:
+                self._schedule_retirement()
+
+    def _warm_up_done(self, future):
+        if future.exception() is not None:
+            logger.warning("Error while warming up the %s worker", self.name, exc_info=future.exception())
+
+    def submit(self, func, *args):
+        """Run the module-level function `func(*args)` in the worker; returns a concurrent.futures.Future."""
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=_context, initializer=_init_worker,
+                    initargs=(get_child_log_queue(), self.initializer, self.initargs))
+                self.started += 1
+                logger.debug("Started %s worker process", self.name)
+            self._pending += 1
+            job = self._executor.submit(_call, func, args)
+        future = Future()
+        job.add_done_callback(lambda done: self._job_done(done, future))
+        return future
+
+    def run(self, func, *args, timeout=None):
+        return self.submit(func, *args).result(timeout)
+
+    def _job_done(self, job, future):
+        with self._lock:
+            self._pending -= 1
+            self._schedule_retirement()
+        if job.cancelled():
+            future.cancel()
+            return
+        if job.exception() is not None:
+            # The worker itself died (or the job could not be pickled)
+            future.set_exception(job.exception())
+            return
+        result, error, drained = job.result()
+        tracing.metrics.merge(drained)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _schedule_retirement(self):
+        if self._pending == 0 and self._executor is not None and not self._warm and self._idle_timer is None:
+            self._idle_timer = threading.Timer(self.idle_timeout, self._retire_if_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _retire_if_idle(self):
+        with self._lock:
+            self._idle_timer = None
+            if self._pending or self._executor is None or self._warm:
+                return
+            executor, self._executor, self._idle_timer = self._executor, None, None
+        executor.shutdown(wait=True)
+        logger.debug("Stopped idle %s worker process", self.name)
+
+    def shutdown(self):
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            executor, self._executor, self._idle_timer = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+class WindowProcess:
+    """The control window, running in its own process.
+
+    Talks to the tray over a pipe: the tray sends ("show",), ("hide",) and
+    ("quit",), the window sends ("shown",) once it is up and the messages in
+    `handlers` (e.g. ("toast", title, text)), which are called on a reader
+    thread here. Closing the window only hides it; the process exits after
+    WORKER_IDLE_TIMEOUT seconds hidden, so reopening soon after is instant.
+    """
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+        self.started = 0
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        # Set when the window reports it is shown, cleared by show()
+        self.shown = threading.Event()
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def show(self):
+        with self._lock:
+            self.shown.clear()
+            if self.alive:
+                self._send(("show",))
+                return
+            self._conn, child_conn = _context.Pipe()
+            self._process = _context.Process(
+                target=_run_entry_point, name="teleport-window", daemon=True,
+                args=(get_child_log_queue(), "ui", "run_window_process", (child_conn,)))
+            self._process.start()
+            child_conn.close()
+            self.started += 1
+            threading.Thread(target=self._read, args=(self._conn,), name="window-pipe", daemon=True).start()
+
+    def hide(self):
+        if self.alive:
+            self._send(("hide",))
+
+    def send(self, *message):
+        """Send a message to the window, if it is open; safe from any thread."""
+        if self._conn is not None:
+            self._send(message)
+
+    def _send(self, message):
+        with self._send_lock:
+            try:
+                self._conn.send(message)
+            except (OSError, EOFError):
+                logger.debug("Control window process is gone", exc_info=True)
+
+    def _read(self, conn):
+        while True:
+            try:
+                kind, *args = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "shown":
+                self.shown.set()
+                continue
+            handler = self.handlers.get(kind)
+            if handler is None:
+                logger.warning("Unknown message from the control window: %s", kind)
+                continue
+            try:
+                handler(*args)
+            except Exception:
+                logger.warning("Error while handling %s from the control window", kind, exc_info=True)
+        conn.close()
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            process = self._process
+            if process is None:
+                return
+            if process.is_alive():
+                self._send(("quit",))
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+            self._process = None
+
+_negotiator = None
+
+def get_negotiator():
+    """The worker that runs WebRTC negotiations (aiortc, aiohttp and friends load only there).
+
+    It owns the key pool, the pooled HTTP client and the ICE config cache, so
+    the tray keeps it warm while the tunnel is up (see main.start_worker_mode).
+    """
+    global _negotiator
+    if _negotiator is None:
+        _negotiator = WorkerPool("negotiator", initializer=_init_negotiator,
+                                 initargs=(TRACING_ENABLED, TRACE_FILE, KEY_POOL_SIZE))
+    return _negotiator